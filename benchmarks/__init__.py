@@ -0,0 +1,68 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Benchmarks of the fontlib package (airspeed velocity_).
+
+Run the suite by::
+
+    $ asv run
+    $ asv run --bench css   # only benchmarks matching regular expression 'css'
+
+To run the benchmarks of the working tree in the current python environment,
+without creating a build environment, use::
+
+    $ asv run --python=same --quick
+
+The benchmarks are using synthetic corpora (:py:mod:`benchmarks.corpus`) and
+the local HTTP server :py:class:`benchmarks.httpd.GoogleFontsStandIn`; no
+network is needed.
+
+.. _airspeed velocity: https://asv.readthedocs.io
+
+"""
+
+import tempfile
+
+from fspath import FSPath
+
+from fontlib import db
+from fontlib import event
+from fontlib.config import init_cfg
+from fontlib.config import get_cfg
+
+def init_fontlib(event_cls=event.Event):
+    """Init a fontlib environment with a temporary workspace and a in-memory DB.
+
+    Returns the :py:class:`fontlib.config.Config` object, the workspace is
+    ``[DEFAULT]workspace``.
+
+    """
+    workspace = FSPath(tempfile.mkdtemp(prefix='fontlib-bench-'))
+    init_cfg()
+    cfg = get_cfg()
+    cfg.set('DEFAULT', 'workspace', str(workspace))
+    cfg.set('DEFAULT', 'fontlib_db', 'sqlite:///:memory:')
+    if not event.dispatcher_inited():
+        # the dispatcher is inited once per process (by the first setup)
+        event.init_dispatcher(event_cls)
+    db.fontlib_init(cfg)
+    return cfg
+
+class FontlibScope:
+    """A transactional scope (:py:func:`fontlib.db.fontlib_scope`) that is
+    opened in ``setup`` and closed in ``teardown`` of a benchmark."""
+
+    def __init__(self):
+        self._scope = db.fontlib_scope()
+
+    def __enter__(self):
+        return self._scope.__enter__()
+
+    def __exit__(self, *exc):
+        return self._scope.__exit__(*exc)
+
+    def open(self):
+        """open scope"""
+        return self.__enter__()
+
+    def close(self):
+        """close scope (commit)"""
+        self.__exit__(None, None, None)
@@ -0,0 +1,49 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Benchmarks of :py:func:`fontlib.css.get_css_at_rules`"""
+
+from fontlib.css import get_css_at_rules
+from fontlib.css import FontFaceRule
+
+from . import init_fontlib
+from .corpus import write_css_corpus
+from .httpd import GoogleFontsStandIn
+
+class GetCSSAtRules:
+    """Parse ``@font-face`` rules from large stylesheets"""
+
+    params = [[1000, 10000, 100000], [0.0, 1.0]]
+    param_names = ['n_faces', 'noise']
+    timeout = 600
+
+    def setup(self, n_faces, noise):
+        cfg = init_fontlib()
+        css_file = cfg.getpath('DEFAULT', 'workspace') / f'corpus-{n_faces}-{noise}.css'
+        write_css_corpus(css_file, n_faces, noise=noise)
+        self.css_url = 'file:' + css_file
+
+    def time_get_css_at_rules(self, n_faces, noise):
+        get_css_at_rules(self.css_url, FontFaceRule)
+
+    def peakmem_get_css_at_rules(self, n_faces, noise):
+        get_css_at_rules(self.css_url, FontFaceRule)
+
+    def track_faces(self, n_faces, noise):
+        return len(get_css_at_rules(self.css_url, FontFaceRule))
+
+
+class GetCSSAtRulesHTTP:
+    """Parse ``@font-face`` rules from a (local) HTTP server"""
+
+    params = [1, 10, 100]
+    param_names = ['n_families']
+
+    def setup(self, n_families):
+        init_fontlib()
+        self.server = GoogleFontsStandIn(n_families=n_families).start()
+        self.css_url = self.server.css_url(*self.server.families)
+
+    def teardown(self, n_families):
+        self.server.stop()
+
+    def time_get_css_at_rules(self, n_families):
+        get_css_at_rules(self.css_url, FontFaceRule)
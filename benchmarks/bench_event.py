@@ -0,0 +1,25 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Benchmarks of the event dispatching (:py:mod:`fontlib.event`)"""
+
+from fontlib import event
+
+def _observer(*args, **kwargs):
+    pass
+
+class EmitEvent:
+    """:py:func:`fontlib.event.emit` with a number of observers"""
+
+    params = [['Event', 'AsyncThreadEvent'], [0, 1, 10]]
+    param_names = ['event_cls', 'observers']
+
+    def setup(self, event_cls, observers):
+        self.event = getattr(event, event_cls)('bench.emit')
+        for _ in range(observers):
+            self.event += _observer
+
+    def time_emit(self, event_cls, observers):
+        self.event('hello', name='world')
+
+    def time_emit_1000(self, event_cls, observers):
+        for i in range(1000):
+            self.event(i, 0, 1000)
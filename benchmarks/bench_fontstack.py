@@ -0,0 +1,73 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Benchmarks of :py:class:`fontlib.fontstack.FontStack`"""
+
+from fontlib.api import FontStack
+from fontlib.font import Font
+from fontlib.font import FontSrcFormat
+
+from . import init_fontlib
+from . import FontlibScope
+from .corpus import ep_corpus
+
+def _fonts(n_faces):
+    for name, file_name in ep_corpus(n_faces).items():
+        font = Font('file:' + file_name, name=name)
+        font.src_formats.append(FontSrcFormat(src_format='woff2'))
+        yield font
+
+class AddFont:
+    """Bulk :py:meth:`FontStack.add_font` into an empty workspace"""
+
+    params = [1000, 10000]
+    param_names = ['n_faces']
+    number = 1
+    repeat = 5
+    timeout = 600
+
+    def setup(self, n_faces):
+        cfg = init_fontlib()
+        self.stack = FontStack.get_fontstack(cfg)
+        self.fonts = list(_fonts(n_faces))
+        self.scope = FontlibScope()
+        self.scope.open()
+
+    def teardown(self, n_faces):
+        self.scope.close()
+
+    def time_add_font(self, n_faces):
+        for font in self.fonts:
+            self.stack.add_font(font)
+
+
+class ListFonts:
+    """:py:meth:`FontStack.list_fonts` lookups in a populated workspace"""
+
+    params = [1000, 10000]
+    param_names = ['n_faces']
+    timeout = 600
+
+    def setup(self, n_faces):
+        cfg = init_fontlib()
+        self.stack = FontStack.get_fontstack(cfg)
+        with FontlibScope():
+            for font in _fonts(n_faces):
+                self.stack.add_font(font)
+        self.names = sorted(ep_corpus(n_faces))
+        self.scope = FontlibScope()
+        self.scope.open()
+
+    def teardown(self, n_faces):
+        self.scope.close()
+
+    def time_list_all(self, n_faces):
+        for _ in self.stack.list_fonts():
+            pass
+
+    def time_lookup_name(self, n_faces):
+        name = self.names[len(self.names) // 2]
+        for _ in self.stack.list_fonts(name):
+            pass
+
+    def time_lookup_unknown(self, n_faces):
+        for _ in self.stack.list_fonts('unknown font family'):
+            pass
@@ -0,0 +1,63 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Benchmarks of :py:meth:`fontlib.urlcache.URLCache.cache_url`"""
+
+from fontlib.api import FontStack
+from fontlib.font import Font
+from fontlib.font import FontSrcFormat
+
+from . import init_fontlib
+from . import FontlibScope
+from .httpd import GoogleFontsStandIn
+
+class CacheURLMiss:
+    """Cache miss of :py:class:`fontlib.urlcache.SimpleURLCache`"""
+
+    params = [['file', 'http'], [20000, 1000000]]
+    param_names = ['scheme', 'blob_size']
+    number = 1
+    repeat = 20
+
+    def setup(self, scheme, blob_size):
+        cfg = init_fontlib()
+        workspace = cfg.getpath('DEFAULT', 'workspace')
+        self.server = None
+
+        if scheme == 'file':
+            fname = workspace / 'blob.woff2'
+            with open(fname, 'wb') as f:
+                f.write(b'\0' * blob_size)
+            self.origin = 'file:' + fname
+        else:
+            self.server = GoogleFontsStandIn(blob_size=blob_size).start()
+            self.origin = self.server.url + '/s/standin/v1/blob.woff2'
+
+        self.stack = FontStack.get_fontstack(cfg)
+        self.scope = FontlibScope()
+        self.scope.open()
+        font = Font(self.origin, name='bench')
+        font.src_formats.append(FontSrcFormat(src_format='woff2'))
+        self.stack.add_font(font)
+
+        self.warm_up()
+
+    def warm_up(self):
+        """BLOB is registered in the DB, but not in the cache"""
+
+    def teardown(self, scheme, blob_size):
+        self.scope.close()
+        if self.server is not None:
+            self.server.stop()
+
+    def time_cache_url(self, scheme, blob_size):
+        self.stack.cache.cache_url(self.origin)
+
+
+class CacheURLHit(CacheURLMiss):
+    """Cache hit of :py:class:`fontlib.urlcache.SimpleURLCache`"""
+
+    number = 10
+    repeat = 5
+
+    def warm_up(self):
+        """BLOB is registered in the DB and cached"""
+        self.stack.cache.cache_url(self.origin)
@@ -0,0 +1,137 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Generator of synthetic font corpora.
+
+The generated corpora are deterministic (seeded), so benchmark numbers are
+reproducible.  The stylesheets mimic the CSS served by ``fonts.googleapis.com``
+(one ``@font-face`` rule per family, style, weight and unicode subset),
+optionally interspersed with other (*noise*) rules like in a real life
+stylesheet.
+
+"""
+
+__all__ = [
+    'SUBSETS'
+    , 'family_names'
+    , 'font_face_rule'
+    , 'css_corpus'
+    , 'write_css_corpus'
+    , 'ep_corpus'
+]
+
+import random
+import hashlib
+
+SUBSETS = {
+    # subset name: unicode-range
+    'latin':        'U+0000-00FF, U+0131, U+0152-0153, U+02BB-02BC, U+02C6, U+02DA, U+02DC, U+2000-206F'
+    , 'latin-ext':  'U+0100-024F, U+0259, U+1E00-1EFF, U+2020, U+20A0-20AB, U+20AD-20CF, U+2113'
+    , 'cyrillic':   'U+0400-045F, U+0490-0491, U+04B0-04B1, U+2116'
+    , 'greek':      'U+0370-03FF'
+    , 'vietnamese': 'U+0102-0103, U+0110-0111, U+0128-0129, U+0168-0169, U+01A0-01A1, U+01AF-01B0, U+1EA0-1EF9'
+}
+"""Unicode subsets used in the synthetic stylesheets"""
+
+STYLES = ['normal', 'italic']
+WEIGHTS = [100, 200, 300, 400, 500, 600, 700, 800, 900]
+
+_SYLLABLES = [
+    'ro', 'bo', 'to', 'sla', 'lib', 're', 'bar', 'co', 'de', 'sans', 'se', 'rif',
+    'mo', 'no', 'lec', 'ker', 'li', 'staa', 'tli', 'ches', 'cu', 'te', 'fon',
+    'ca', 'la', 'dea', 'ama', 'tic', 'han', 'ken', 'gro', 'tesk',
+]
+
+def family_names(n_families, seed=42):
+    """Returns a list of ``n_families`` unique (synthetic) font-family names."""
+    rnd = random.Random(seed)
+    names = set()
+    while len(names) < n_families:
+        words = []
+        for _ in range(rnd.randint(1, 3)):
+            word = ''.join(rnd.choice(_SYLLABLES) for _ in range(rnd.randint(2, 3)))
+            words.append(word.capitalize())
+        names.add(' '.join(words))
+    return sorted(names)
+
+def _blob_id(*args):
+    return hashlib.sha1('|'.join(str(x) for x in args).encode('utf-8')).hexdigest()[:30]
+
+def font_face_rule(
+        family, url, style='normal', weight=400, src_format='woff2'
+        , unicode_range=None, subset=None):
+    """Returns a string with a (google like) ``@font-face`` rule."""
+    lines = []
+    if subset:
+        lines.append(f"/* {subset} */")
+    lines.append("@font-face {")
+    lines.append(f"  font-family: '{family}';")
+    lines.append(f"  font-style: {style};")
+    lines.append(f"  font-weight: {weight};")
+    lines.append(f"  src: url({url}) format('{src_format}');")
+    if unicode_range:
+        lines.append(f"  unicode-range: {unicode_range};")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+def css_corpus(
+        n_faces, url_base='https://fonts.gstatic.com/s', src_format='woff2'
+        , noise=0.0, seed=42):
+    """Returns a stylesheet (str) with ``n_faces`` ``@font-face`` rules.
+
+    :param int n_faces: number of ``@font-face`` rules in the stylesheet
+    :param str url_base: base URL of the ``src: url(..)`` declarations
+    :param str src_format: value of the ``format(..)`` hint
+    :param float noise: ratio of additional (not ``@font-face``) rules
+    :param int seed: seed of the random generator
+
+    """
+    rnd = random.Random(seed)
+    ext = {'truetype': 'ttf'}.get(src_format, src_format)
+    families = family_names(max(1, n_faces // 20), seed=seed)
+    subsets = list(SUBSETS.items())
+
+    chunks = []
+    i = 0
+    while i < n_faces:
+        family = families[i % len(families)]
+        style = STYLES[(i // len(subsets)) % len(STYLES)]
+        weight = WEIGHTS[(i // (len(subsets) * len(STYLES))) % len(WEIGHTS)]
+        subset, unicode_range = subsets[i % len(subsets)]
+        slug = family.replace(' ', '').lower()
+        url = f"{url_base}/{slug}/v1/{_blob_id(family, style, weight, subset, i)}.{ext}"
+        chunks.append(font_face_rule(
+            family, url, style=style, weight=weight, src_format=src_format
+            , unicode_range=unicode_range, subset=subset))
+        if noise and rnd.random() < noise:
+            chunks.append(
+                f".{slug}-{i} {{ font-family: '{family}', sans-serif;"
+                f" font-weight: {weight}; color: #{rnd.randrange(0xffffff):06x}; }}\n")
+        i += 1
+    return "".join(chunks)
+
+def write_css_corpus(fname, n_faces, **kwargs):
+    """Write :py:func:`css_corpus` into file ``fname``, returns ``fname``."""
+    with open(fname, 'w', encoding='utf-8') as f:
+        f.write(css_corpus(n_faces, **kwargs))
+    return fname
+
+def ep_corpus(n_faces, folder=None, blob_size=0, seed=42):
+    """Returns a (entry point like) dictionary with ``n_faces`` ``name: file_name`` items.
+
+    This is the same kind of dictionary a python font package exposes in its
+    ``fonts_*`` entry point.  If ``folder`` is given, a BLOB with ``blob_size``
+    bytes is written for each face (files are reused if they exist).
+
+    """
+    families = family_names(n_faces, seed=seed)
+    ret_val = {}
+    payload = b'\0' * blob_size
+    for i, name in enumerate(families):
+        slug = name.replace(' ', '')
+        file_name = f"/nonexistent/{slug}-{i}.woff2"
+        if folder is not None:
+            file_name = folder / f"{slug}-{i}.woff2"
+            if not file_name.EXISTS:
+                with open(file_name, 'wb') as f:
+                    f.write(payload)
+        ret_val[name] = str(file_name)
+    return ret_val
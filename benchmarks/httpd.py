@@ -0,0 +1,189 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Local HTTP server that mimics ``fonts.googleapis.com`` and ``fonts.gstatic.com``
+
+The :py:class:`GoogleFontsStandIn` answers the same kind of requests fontlib
+sends to the google fonts infrastructure:
+
+``/css?family=A|B:400,700``
+  Stylesheet with ``@font-face`` rules of the families.  Like google does, the
+  format of the font resources depends on the ``User-Agent`` (see
+  :py:obj:`fontlib.googlefont.GOOGLE_USER_AGENTS`).
+
+``/s/<family>/v1/<id>.<ext>``
+  The font resource (BLOB) with ``blob_size`` bytes.
+
+``/metadata/fonts``
+  JSON document with ``familyMetadataList`` of all families.
+
+Responses carry an ``ETag`` and ``If-None-Match`` is answered with ``304``.
+Usage::
+
+    with GoogleFontsStandIn(n_families=1000, latency=0.01) as server:
+        css_url = server.css_url('Roboto Slab')
+        ...
+
+"""
+
+__all__ = ['GoogleFontsStandIn']
+
+import json
+import time
+import hashlib
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer
+from http.server import BaseHTTPRequestHandler
+
+from .corpus import SUBSETS
+from .corpus import STYLES
+from .corpus import font_face_rule
+from .corpus import family_names
+
+CATEGORIES = ['Sans Serif', 'Serif', 'Display', 'Handwriting', 'Monospace']
+
+def _ua_format(user_agent):
+    if 'Android 2' in user_agent:
+        return 'truetype', 'ttf'
+    if 'iPad' in user_agent:
+        return 'svg', 'svg'
+    return 'woff2', 'woff2'
+
+class _Handler(BaseHTTPRequestHandler):
+
+    server_version = 'fontlib-standin/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        standin = self.server.standin
+        standin.requests += 1
+        if standin.latency:
+            time.sleep(standin.latency)
+
+        url = urllib.parse.urlsplit(self.path)
+        if url.path in ('/css', '/css2'):
+            query = urllib.parse.parse_qs(url.query)
+            families = []
+            for value in query.get('family', []):
+                families.extend(value.split('|'))
+            body = standin.css(families, self.headers.get('User-Agent', ''))
+            self._reply(body.encode('utf-8'), 'text/css; charset=utf-8')
+        elif url.path.startswith('/s/'):
+            ext = url.path.rsplit('.', 1)[-1]
+            self._reply(standin.blob(url.path), f'font/{ext}')
+        elif url.path == '/metadata/fonts':
+            self._reply(standin.metadata(), 'application/json; charset=utf-8')
+        else:
+            self.send_error(404)
+
+    def _reply(self, body, content_type):
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class GoogleFontsStandIn:
+    """Stand-in for google's font servers, running in a daemon thread.
+
+    :param int n_families: number of families in ``/metadata/fonts``
+    :param int weights: number of font weights per style in the stylesheets
+    :param int blob_size: size of the font resources (BLOBs) in bytes
+    :param float latency: latency (seconds) added to each response
+
+    """
+
+    def __init__(self, n_families=100, weights=3, blob_size=20000, latency=0.0):
+        self.families = family_names(n_families)
+        self.weights = weights
+        self.blob_size = blob_size
+        self.latency = latency
+        self.requests = 0
+        self.httpd = None
+        self.thread = None
+        self._metadata = None
+
+    @property
+    def url(self):
+        """Base URL of the server (``http://127.0.0.1:<port>``)"""
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def css_url(self, *families):
+        """URL of a stylesheet with the ``@font-face`` rules of ``families``"""
+        return self.url + '/css?family=' + '|'.join(
+            urllib.parse.quote(family) for family in families)
+
+    def css(self, families, user_agent=''):
+        """Stylesheet (str) with the ``@font-face`` rules of ``families``"""
+        src_format, ext = _ua_format(user_agent)
+        chunks = []
+        for family in families:
+            family = family.split(':')[0]
+            slug = family.replace(' ', '').lower()
+            for style in STYLES:
+                for weight in range(100, 100 * (self.weights + 1), 100):
+                    for subset, unicode_range in SUBSETS.items():
+                        blob_id = hashlib.sha1(
+                            f'{family}|{style}|{weight}|{subset}|{ext}'.encode('utf-8')
+                        ).hexdigest()[:30]
+                        chunks.append(font_face_rule(
+                            family, f'{self.url}/s/{slug}/v1/{blob_id}.{ext}'
+                            , style=style, weight=weight, src_format=src_format
+                            , unicode_range=unicode_range, subset=subset))
+        return ''.join(chunks)
+
+    def blob(self, path):
+        """Deterministic BLOB (bytes) of the font resource at ``path``"""
+        seed = hashlib.sha1(path.encode('utf-8')).digest()
+        return (seed * (self.blob_size // len(seed) + 1))[:self.blob_size]
+
+    def metadata(self):
+        """JSON document (bytes) like the one from ``fonts.google.com/metadata/fonts``"""
+        if self._metadata is None:
+            family_list = []
+            for i, family in enumerate(self.families):
+                family_list.append({
+                    'family': family
+                    , 'category': CATEGORIES[i % len(CATEGORIES)]
+                    , 'isNoto': family.startswith('No')
+                    , 'popularity': i + 1
+                    , 'subsets': list(SUBSETS)
+                    , 'fonts': {
+                        f'{w}{s}': {} for w in range(100, 100 * (self.weights + 1), 100)
+                        for s in ('', 'i') }
+                })
+            self._metadata = json.dumps({'familyMetadataList': family_list}).encode('utf-8')
+        return self._metadata
+
+    def start(self):
+        """Start server in a daemon thread."""
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.standin = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop server."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
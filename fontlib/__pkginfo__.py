@@ -33,8 +33,6 @@ Further read:
 
 """
 
-from setuptools import find_packages
-
 package = 'fontlib'
 version = '20230220'
 
@@ -61,7 +59,11 @@ project_urls = {
     , 'Issue tracker'    : issues
 }
 
-packages = find_packages(exclude=['docs', 'tests'])
+def get_packages():
+    """Python packages of the distribution (setuptools is only imported when
+    the packages are needed by ``setup.py``)"""
+    from setuptools import find_packages  # pylint: disable=import-outside-toplevel
+    return find_packages(exclude=['docs', 'tests'])
 
 # https://setuptools.readthedocs.io/en/latest/setuptools.html#including-data-files
 package_data = {
@@ -129,8 +131,21 @@ install_requires = [
 install_requires.sort()
 install_requires_txt = "\n".join(install_requires)
 
+# optional: async DB layer (fontlib.asyncdb)
+async_requires = [
+    'aiosqlite'
+    , 'greenlet'
+]
+async_requires.sort()
+
+# optional: brotli variants of generated stylesheets (fontlib.utils.write_precompressed)
+compress_requires = [
+    'brotli'
+]
+
 test_requires = [
     'pylint'
+    , 'pytest'
     ]
 test_requires.sort()
 test_requires_txt = "\n".join(test_requires)
@@ -150,6 +165,7 @@ develop_requires = [
     , 'psycopg2-binary'
     , 'twine'
     , 'argcomplete'
+    , 'asv'
 ]
 develop_requires.sort()
 develop_requires_txt = "\n".join(develop_requires)
@@ -0,0 +1,166 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Asynchronous variant of application's database (:py:mod:`.db`).
+
+Based on the asyncio extension of SQLAlchemy (SQLAlchemy-asyncio_), the DB
+is accessed by an async driver (e.g. aiosqlite_ for SQLite) and the event loop
+does not block on the DB::
+
+    from fontlib import asyncdb
+
+    async def main(cfg):
+        await asyncdb.fontlib_init(cfg)
+        async with asyncdb.fontlib_scope() as session:
+            ...
+
+The async DB layer is an optional feature, install the requirements by::
+
+    pip install fontlib[async]
+
+.. _SQLAlchemy-asyncio: https://docs.sqlalchemy.org/orm/extensions/asyncio.html
+.. _aiosqlite: https://github.com/omnilib/aiosqlite
+
+"""
+
+__all__ = [
+    'ASYNC_DRIVERS'
+    , 'FONTLIB_ASYNC_ENGINE'
+    , 'FONTLIB_ASYNC_SESSIONMAKER'
+    , 'async_connector'
+    , 'fontlib_init'
+    , 'fontlib_scope'
+    , 'fontlib_session'
+    , 'run_sync'
+]
+
+import logging
+import contextvars
+from contextlib import asynccontextmanager
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from .db import active_session
+from .db import engine_options
+from .db import init_schema
+from .db import init_sqlite_pragmas
+
+log = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite'
+    , 'postgresql': 'postgresql+asyncpg'
+    , 'mysql': 'mysql+aiomysql'
+}
+"""Async drivers of the dialects (see :py:func:`async_connector`)"""
+
+FONTLIB_ASYNC_ENGINE = None
+"""Async engine of DB ``fontlib``.
+
+The engine is inited by :py:func:`fontlib_init`
+
+"""
+
+FONTLIB_ASYNC_SESSIONMAKER = None
+"""Sessionmaker of :py:class:`sqlalchemy.ext.asyncio.AsyncSession` objects
+
+The sessionmaker is inited by :py:func:`fontlib_init`
+
+"""
+
+_ACTIVE_SESSION = contextvars.ContextVar('fontlib_async_active_session', default=None)
+
+def async_connector(connector):
+    """Returns the URL of ``connector`` with an async driver (see
+    :py:obj:`ASYNC_DRIVERS`), e.g. ``sqlite:///fontlib.db`` is mapped to
+    ``sqlite+aiosqlite:///fontlib.db``.  A connector of an unknown dialect or
+    with an async driver is returned unchanged."""
+    scheme, rest = connector.split(':', 1)
+    dialect, _, driver = scheme.partition('+')
+    async_scheme = ASYNC_DRIVERS.get(dialect)
+    if async_scheme is None or (driver and driver in async_scheme):
+        return connector
+    return async_scheme + ':' + rest
+
+async def fontlib_init(config):
+    """Init async DB engine configured in config.ini ``[DEFAULT]:fontlib_db``
+
+    1. Create a async engine connected to ``[DEFAULT]:fontlib_db`` (see
+       :py:func:`async_connector`) in :py:obj:`FONTLIB_ASYNC_ENGINE`, the
+       engine is tuned by the options of section ``[db]`` (see
+       :py:func:`.db.engine_options` and :py:func:`.db.sqlite_pragmas`).
+
+    2. Create DB schema (see :py:func:`.db.init_schema`)
+
+    3. Create a session maker in :py:obj:`FONTLIB_ASYNC_SESSIONMAKER`
+
+    """
+    global FONTLIB_ASYNC_ENGINE, FONTLIB_ASYNC_SESSIONMAKER  # pylint: disable=global-statement
+
+    fontlib_connector = async_connector(
+        config.get('DEFAULT', 'fontlib_db', fallback='sqlite:///:memory:'))
+    log.debug("fontlib_init: create async engine connected to DB: %s", fontlib_connector)
+    FONTLIB_ASYNC_ENGINE = create_async_engine(
+        fontlib_connector, **engine_options(config, fontlib_connector))
+    init_sqlite_pragmas(FONTLIB_ASYNC_ENGINE.sync_engine, config)
+
+    async with FONTLIB_ASYNC_ENGINE.begin() as conn:
+        await conn.run_sync(init_schema)
+
+    # objects are used after commit, don't expire them (an expired attribute
+    # would need an implicit IO)
+    FONTLIB_ASYNC_SESSIONMAKER = async_sessionmaker(
+        FONTLIB_ASYNC_ENGINE, expire_on_commit=False)
+    log.debug("fontlib_init: OK")
+
+@asynccontextmanager
+async def fontlib_scope():
+    """Provide a (new) transactional scope of a async session.
+
+    The counterpart of :py:func:`.db.fontlib_scope` for asyncio applications::
+
+        async with asyncdb.fontlib_scope() as session:
+            ...
+
+    The active session is local to the context (asyncio task), use
+    :py:func:`fontlib_session` to get the active session.
+
+    .. hint::
+
+       A :py:class:`sqlalchemy.ext.asyncio.AsyncSession` must not be used by
+       concurrent tasks, each task (e.g. of a :py:func:`asyncio.gather`) opens
+       its own scope.
+    """
+    log.debug("fontlib_scope: START async transactional scope")
+    session = FONTLIB_ASYNC_SESSIONMAKER()
+    token = _ACTIVE_SESSION.set(session)
+    try:
+        yield session
+        log.debug("fontlib_scope: COMMIT async transactional scope")
+        await session.commit()
+
+    except:
+        log.debug("fontlib_scope: ROLLBACK async transactional scope")
+        await session.rollback()
+        raise
+
+    finally:
+        log.debug("fontlib_scope: CLOSE async transactional scope")
+        await session.close()
+        _ACTIVE_SESSION.reset(token)
+
+def fontlib_session():
+    """Returns current active async session (see :py:func:`fontlib_scope`)"""
+    return _ACTIVE_SESSION.get()
+
+async def run_sync(func, *args, **kwargs):
+    """Call the synchronous function ``func`` in the active async session.
+
+    While ``func`` is called, the synchronous session of the active async
+    session is the active session of :py:func:`.db.fontlib_session`.  By this,
+    the implementations based on :py:mod:`.db` (e.g. the URL cache) can be used
+    in an async context, the IO of the DB is still async.
+    """
+    def call(session):
+        with active_session(session):
+            return func(*args, **kwargs)
+    return await fontlib_session().run_sync(call)
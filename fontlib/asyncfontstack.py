@@ -0,0 +1,157 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Implementation of class :py:class:`AsyncFontStack`.
+
+"""
+
+__all__ = ['AsyncFontStack']
+
+import asyncio
+import logging
+from urllib.parse import urlparse
+
+import fspath
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from . import event
+from .asyncdb import fontlib_session
+from .asyncdb import run_sync
+from .font import Font
+from .fontstack import FontStack
+from .ingest import IngestPipeline
+from .sources import register_source
+from .urlcache import URLBlob
+from .urlcache import NoCache
+from .urlcache import fetch_url
+
+log = logging.getLogger(__name__)
+
+class AsyncFontStack:
+    """The asyncio counterpart of :py:class:`.fontstack.FontStack`.
+
+    The DB is accessed in the async session of the active
+    :py:func:`.asyncdb.fontlib_scope`, network and file IO is done in threads
+    (:py:func:`asyncio.to_thread`), the event loop never blocks::
+
+        stack = AsyncFontStack.get_fontstack(cfg)
+        async with asyncdb.fontlib_scope():
+            await stack.load_css('https://fonts.googleapis.com/css?family=Cute+Font')
+            async for font in stack.list_fonts('Cute Font'):
+                await stack.save_font(font, '/tmp/' + font.id)
+
+    :param stack: :py:class:`.fontstack.FontStack` object, the caches of the
+        stack are used.
+
+    """
+
+    def __init__(self, stack=None):
+        self.stack = stack or FontStack()
+
+    @property
+    def cache(self):
+        """URL cache of the stack"""
+        return self.stack.cache
+
+    @property
+    def css_cache(self):
+        """CSS cache of the stack"""
+        return self.stack.css_cache
+
+    @classmethod
+    def get_fontstack(cls, config):
+        """Get fonstack instance by configuration <config> (see
+        :py:meth:`.fontstack.FontStack.get_fontstack`)."""
+        return cls(FontStack.get_fontstack(config))
+
+    async def add_font(self, font):
+        """Add :py:class:`.font.Font` object to *this* stack (see
+        :py:meth:`.fontstack.FontStack.add_font`)."""
+        await run_sync(self.stack.add_font, font)
+
+    async def save_font(self, font, dest_file):
+        """Save BLOB of :py:class:`.font.Font` into file <dest_file>
+
+        If the BLOB is not yet cached, it is downloaded into the cache (see
+        :py:meth:`.urlcache.URLCache.save_url`).  Different to the synchronous
+        :py:meth:`.fontstack.FontStack.save_font`, no ``urlcache.download.tick``
+        events are released.
+
+        :param font.Font font: font instance
+        :param fspath.fspath.FSPath dest_file: Filename of the destination
+        """
+        cache = self.cache
+        if isinstance(cache, NoCache):
+            await asyncio.to_thread(cache.save_url, font.origin, dest_file)
+            return
+
+        blob = await run_sync(cache.add_url, font.origin)
+        cache_file = cache.fname_by_blob(blob)
+        exists = await asyncio.to_thread(lambda: cache_file.EXISTS)
+        if not exists:
+            url = urlparse(blob.origin)
+            if url.scheme == 'file':
+                log.debug("BLOB [%s] caching from local filesystem: %s", blob.id, blob.origin)
+                await asyncio.to_thread(fspath.FSPath(url.path).copyfile, cache_file)
+            else:
+                log.debug("BLOB [%s] caching from remote: %s", blob.id, blob.origin)
+                await asyncio.to_thread(fetch_url, blob.origin, cache_file, cache.CHUNKSIZE)
+        if not exists or blob.state != URLBlob.STATE_CACHED:
+            await run_sync(cache.update_db, blob)
+        await asyncio.to_thread(cache_file.copyfile, dest_file)
+
+    async def load_css(self, css_url):
+        """Add :py:class:`.font.Font` objects from `@font-face`_ rules (see
+        :py:meth:`.fontstack.FontStack.load_css`).
+
+        The CSS is revalidated in the CSS cache or fetched and parsed in a
+        thread (see :py:meth:`.ingest.IngestPipeline.fetch_css_source`), the
+        parsed rules are stored in the CSS cache in the same thread (see
+        :py:meth:`.csscache.CSSCache.store`).  Only the DB is accessed in the
+        async session.
+        """
+        pipeline = IngestPipeline(self.stack, parse_processes=0)
+
+        def fetch_css(state):
+            rules, state, fetched = pipeline.fetch_css_source(css_url, state)
+            if fetched:
+                self.css_cache.store(css_url, state, rules)
+                # the rules are stored, the state needs to be updated in the DB
+                state['dirty'] = True
+            return rules, state, False
+
+        def write_css(rules, state, fetched):
+            fonts = pipeline.write_css_source(css_url, rules, state, fetched)
+            register_source(css_url, fonts)
+
+        state = await run_sync(self.css_cache.lookup, css_url)
+        result = await asyncio.to_thread(fetch_css, state)
+        await run_sync(write_css, *result)
+
+    async def load_entry_point(self, ep_name):
+        """Add :py:class:`.font.Font` objects from ``ep_name`` (see
+        :py:meth:`.fontstack.FontStack.load_entry_point`)."""
+        fonts = await asyncio.to_thread(
+            lambda: list(Font.from_entry_point(ep_name, self.stack.ep_index)))
+        event.emit('FontStack.load_entry_point', ep_name)
+        for font in fonts:
+            await self.add_font(font)
+
+    async def list_fonts(self, name=None):
+        """Return async generator of :py:class:`.font.Font` objects selected by
+        ``name``.
+
+        The aliases, formats and the BLOB of the fonts are loaded eager, no
+        attribute of the fonts needs an implicit IO.
+
+        :param name:
+            Name of the font
+        """
+        session = fontlib_session()
+        stmt = select(Font).options(
+            selectinload(Font.aliases)
+            , selectinload(Font.src_formats)
+            , selectinload(Font.blob).selectinload(URLBlob.font)
+        )
+        for font in await session.scalars(stmt):
+            if name is None or font.match_name(name):
+                yield font
@@ -0,0 +1,141 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Read-only micro-benchmarks of a workspace.
+
+The benchmarks in this module measure the workspace *as it is*; nothing is
+added to or removed from the database or the cache.  They are used by the
+command ``fontlib bench`` to compare workspaces on different nodes and storage
+backends.  For benchmarks with synthetic data see folder ``benchmarks`` in the
+fontlib repository.
+
+"""
+
+__all__ = ['timings', 'workspace_bench', 'workspace_stats']
+
+import os
+import time
+import statistics
+import logging
+
+from sqlalchemy import create_engine
+from sqlalchemy import func
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from .db import fontlib_session
+from .font import Font
+from .font import FontAlias
+from .urlcache import URLBlob
+
+log = logging.getLogger(__name__)
+
+def timings(func, repeat=10):  # pylint: disable=redefined-outer-name
+    """Call ``func()`` ``repeat`` times and return a dict with the timings (ms)."""
+    values = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        values.append((time.perf_counter() - start) * 1000)
+    return {
+        'n':        repeat
+        , 'min':    round(min(values), 3)
+        , 'median': round(statistics.median(values), 3)
+        , 'mean':   round(statistics.mean(values), 3)
+        , 'max':    round(max(values), 3)
+    }
+
+def _folder_size(folder):
+    count = size = 0
+    if folder is None or not folder.EXISTS:
+        return count, size
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False):
+                count += 1
+                size += entry.stat(follow_symlinks=False).st_size
+    return count, size
+
+def workspace_stats(config, stack):
+    """Return size statistics of DB and cache of a workspace.
+
+    Needs an active session (see :py:func:`.db.fontlib_scope`).
+
+    """
+    session = fontlib_session()
+    fontlib_db = config.get('DEFAULT', 'fontlib_db', fallback='sqlite:///:memory:')
+    db_stats = {'url': fontlib_db}
+
+    engine = session.get_bind()
+    if engine.url.get_backend_name() == 'sqlite' and engine.url.database not in (None, '', ':memory:'):
+        db_file = engine.url.database
+        db_stats['file'] = db_file
+        db_stats['bytes'] = os.path.getsize(db_file) if os.path.exists(db_file) else 0
+
+    db_stats['fonts'] = session.query(func.count(Font.id)).scalar()  # pylint: disable=not-callable
+    db_stats['aliases'] = session.query(func.count(FontAlias.id)).scalar()  # pylint: disable=not-callable
+    db_stats['blobs'] = dict(
+        session.query(URLBlob.state, func.count(URLBlob.id)).group_by(URLBlob.state).all())  # pylint: disable=not-callable
+
+    cache_stats = {'class': type(stack.cache).__name__}
+    root = getattr(stack.cache, 'root', None)
+    if root is not None:
+        cache_stats['root'] = str(root)
+        cache_stats['files'], cache_stats['bytes'] = _folder_size(root)
+
+    return {'db': db_stats, 'cache': cache_stats}
+
+def workspace_bench(config, stack, name=None, repeat=10):
+    """Run read-only micro-benchmarks on a workspace.
+
+    Needs an active session (see :py:func:`.db.fontlib_scope`).
+
+    :param config: :py:class:`.config.Config` object of the workspace
+    :param stack: :py:class:`.fontstack.FontStack` object of the workspace
+    :param str name: font name used in the lookup benchmark (default: name of
+        the first font in the workspace)
+    :param int repeat: how often each benchmark is repeated
+
+    :return: dictionary with timings (ms) and workspace statistics
+    """
+    session = fontlib_session()
+    fontlib_db = config.get('DEFAULT', 'fontlib_db', fallback='sqlite:///:memory:')
+    results = {}
+
+    def db_open():
+        engine = create_engine(fontlib_db)
+        with engine.connect() as conn:
+            conn.execute(text('SELECT count(*) FROM font')).scalar()
+        engine.dispose()
+
+    if make_url(fontlib_db).database in (None, '', ':memory:'):
+        # a new engine opens a new (empty) in-memory DB
+        results['db_open'] = 'n/a (in-memory DB)'
+    else:
+        log.debug("bench: DB open time")
+        results['db_open'] = timings(db_open, repeat)
+
+    log.debug("bench: list all fonts")
+    results['list'] = timings(lambda: list(stack.list_fonts()), repeat)
+
+    if name is None:
+        font = session.query(Font).first()
+        name = font.name if font else None
+    if name is not None:
+        log.debug("bench: lookup font name %s", name)
+        results['lookup'] = timings(lambda: list(stack.list_fonts(name)), repeat)
+        results['lookup']['name'] = name
+
+    blob = session.query(URLBlob).filter(URLBlob.state == URLBlob.STATE_CACHED).first()
+    if blob is not None:
+        origin = blob.origin
+
+        def cache_hit():
+            session.expire_all()
+            cache_file = stack.cache.fname_by_blob(stack.cache.get_blob_obj(origin))
+            with open(cache_file, 'rb') as f:
+                f.read()
+
+        log.debug("bench: cache hit of %s", origin)
+        results['cache_hit'] = timings(cache_hit, repeat)
+        results['cache_hit']['origin'] = origin
+
+    return {'timings': results, 'stats': workspace_stats(config, stack)}
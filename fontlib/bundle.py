@@ -0,0 +1,304 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Static bundle of font families, e.g. to deploy the fonts on a CDN.
+
+The command::
+
+  fontlib bundle 'Roboto Slab' 'DejaVu Sans Mono' ./static
+
+writes the fonts of the families, a stylesheet and a manifest into a folder
+(see :py:func:`bundle_fonts`)::
+
+  ./static/fonts/<hash>.woff2        the font files
+  ./static/fonts.<hash>.css          @font-face rules (+ .gz and .br variants)
+  ./static/manifest.json             manifest of the bundle
+
+The name of a font file and of the stylesheet is derived from the hash (SHA256)
+of its content, a changed content gets a new name.  All files except the
+manifest can be served with ``Cache-Control: immutable``.  The manifest
+(:py:obj:`MANIFEST_FILE`) names the stylesheet and lists the fonts::
+
+  {
+    "families": ["DejaVu Sans Mono"],
+    "formats": null,
+    "css": "fonts.5d41402abc4b2a76.css",
+    "fonts": [
+      {
+        "id": "DOOeL-PgmNVDhijSTOiVVA",
+        "family": "DejaVu Sans Mono",
+        "format": "woff2",
+        "unicode_range": null,
+        "descriptors": {"font-style": "normal", "font-weight": "normal"},
+        "origin": "file:/.../DejaVuSansMono.woff2",
+        "file": "fonts/2c26b46b68ffc68f.woff2",
+        "sha256": "2c26b46b68ffc68ff99b453c1d30413413422d706483bfa0f98a5e886266e7ae",
+        "size": 134188,
+        "mtime_ns": 1676887200000000000
+      }
+    ]
+  }
+
+The fonts are taken from the URL cache (BLOBs which are not yet cached are
+downloaded into the cache) or from the local file of a ``file:`` origin.  The
+files are hardlinked into the bundle (:py:func:`os.link`), if this is not
+possible (e.g. the bundle is on a different file system) they are copied.  The
+fonts are hashed and linked (copied) in a thread pool (``[ingest] fetch
+workers``).
+
+On a re-run, a font whose source file has the same size and modification time
+as recorded in the manifest (and whose file is still in the bundle) is neither
+hashed nor copied again.  A stylesheet or manifest with unchanged content is
+not rewritten (see :py:func:`.utils.write_file`).  Files of older bundles are
+not removed, a client which has an older stylesheet still gets its fonts.
+
+"""
+
+__all__ = ['MANIFEST_FILE', 'FONTS_FOLDER', 'file_hash', 'link_file', 'bundle_fonts']
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import logging
+import concurrent.futures
+from urllib.parse import urlparse
+
+from .css import font_face_css
+from .urlcache import URLBlob
+from .urlcache import NoCache
+from .urlcache import fetch_url
+from .db import fontlib_session
+from .utils import write_file
+from .utils import write_precompressed
+
+log = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+"""File name of the manifest in the bundle"""
+
+FONTS_FOLDER = 'fonts'
+"""Folder of the font files in the bundle"""
+
+# number of hex digits of the hash in the file names
+_HASH_LENGTH = 16
+
+def file_hash(fname, chunksize=1048576):
+    """Returns the SHA256 hex digest of the content of file ``fname``."""
+    _ = hashlib.sha256()
+    with open(fname, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunksize), b''):
+            _.update(chunk)
+    return _.hexdigest()
+
+def link_file(src, dest):
+    """Hardlink file ``src`` to ``dest``, copy the file if a link is not
+    possible.  An existing ``dest`` is replaced atomically.
+
+    The file is linked (copied) to a temporary file with a unique name in the
+    folder of ``dest`` (:py:func:`tempfile.mkstemp`), concurrent calls with the
+    same ``dest`` (e.g. fonts with identical content) don't interfere.
+
+    :return: ``'linked'`` or ``'copied'``
+    """
+    dest = str(dest)
+    fd, tmp_file = tempfile.mkstemp(
+        dir=os.path.dirname(dest) or '.', prefix='.' + os.path.basename(dest) + '.', suffix='.tmp')
+    os.close(fd)
+    try:
+        # os.link needs a name which does not exist
+        os.remove(tmp_file)
+        try:
+            os.link(src, tmp_file)
+            how = 'linked'
+        except OSError:
+            shutil.copyfile(src, tmp_file)
+            how = 'copied'
+        os.replace(tmp_file, dest)
+    finally:
+        # os.replace does nothing if both names are links of the same file
+        if os.path.lexists(tmp_file):
+            os.remove(tmp_file)
+    return how
+
+def _load_manifest(fname):
+    try:
+        with open(fname, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as exc:
+        log.warning("bundle: manifest %s ignored: %s", fname, exc)
+        return {}
+    return {entry['id']: entry for entry in manifest.get('fonts', [])}
+
+def _bundle_font(job, dest, prev):
+    """Bundle the font of ``job`` into folder ``dest``, runs in a thread of the
+    pool.  Returns tuple ``(<entry>, <how>, <downloaded bytes>)``, the entry
+    has the file name, hash, size and modification time of the font."""
+    src = job['src']
+    downloaded = 0
+    tmp_file = None
+
+    if (prev is not None and prev['origin'] == job['origin']
+            and os.path.exists(os.path.join(dest, prev['file']))):
+        if src is None:
+            # no URL cache: a remote font is not downloaded again
+            return prev, 'unchanged', 0
+        try:
+            stat = os.stat(src)
+        except FileNotFoundError:
+            stat = None
+        if stat is not None and (prev['size'], prev['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+            return prev, 'unchanged', 0
+
+    if src is None:
+        tmp_file = os.path.join(dest, FONTS_FOLDER, job['id'] + '.download')
+        downloaded = fetch_url(job['origin'], tmp_file)
+        src = tmp_file
+    elif not os.path.exists(src):
+        downloaded = fetch_url(job['origin'], src)
+
+    try:
+        stat = os.stat(src)
+        sha256 = file_hash(src)
+        fname = FONTS_FOLDER + '/' + sha256[:_HASH_LENGTH] + job['suffix']
+        dest_file = os.path.join(dest, fname)
+        if os.path.exists(dest_file):
+            how = 'unchanged'
+        else:
+            how = link_file(src, dest_file)
+    finally:
+        if tmp_file is not None and os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+    entry = {
+        'file': fname
+        , 'sha256': sha256
+        , 'size': stat.st_size
+        , 'mtime_ns': stat.st_mtime_ns
+    }
+    return entry, how, downloaded
+
+def bundle_fonts(config, stack, families, dest, formats=None, url_base='', workers=None):
+    """Write the fonts of the font ``families`` into a static bundle in folder
+    ``dest`` (see :py:mod:`.bundle`).
+
+    Needs an active session (see :py:func:`.db.fontlib_scope`).
+
+    :param stack: :py:class:`.fontstack.FontStack` object, the fonts are taken
+        from its URL cache
+    :param families: list of font family names (or aliases)
+    :param dest: folder of the bundle
+    :param formats: list of formats (e.g. ``['woff2', 'woff']``), most
+        preferred first, fonts in other formats are not bundled (default: all
+        formats)
+    :param str url_base: prepended to the file names of the fonts in the
+        stylesheet (default: relative to the stylesheet)
+    :param int workers: size of the thread pool (default: ``[ingest] fetch
+        workers``)
+    :return: dictionary with statistics
+    """
+    # pylint: disable=too-many-locals
+    if workers is None:
+        workers = config.getint('ingest', 'fetch workers', fallback=8)
+    dest = str(dest)
+    os.makedirs(os.path.join(dest, FONTS_FOLDER), exist_ok=True)
+    manifest_file = os.path.join(dest, MANIFEST_FILE)
+    previous = _load_manifest(manifest_file)
+
+    start = time.time()
+    # one job for each font, a font can be in different families (aliases)
+    jobs = {}
+    members = []
+    for family, font in stack.family_fonts(families):
+        fmt = (font.format or '').split(',')[0]
+        if formats is not None and fmt not in formats:
+            continue
+        members.append((family, font.id))
+        if font.id in jobs:
+            continue
+        url = urlparse(font.origin)
+        src = None
+        if url.scheme == 'file':
+            src = url.path
+        elif not isinstance(stack.cache, NoCache):
+            src = str(stack.cache.fname_by_blob(stack.cache.add_url(font.origin)))
+        jobs[font.id] = {
+            'id': font.id
+            , 'format': font.format
+            , 'unicode_range': font.unicode_range
+            , 'descriptors': font.descriptors()
+            , 'origin': font.origin
+            , 'suffix': font.suffix
+            , 'src': src
+            , 'cached': url.scheme != 'file' and src is not None
+        }
+
+    stats = {
+        'families': len(families), 'fonts': len(jobs)
+        , 'linked': 0, 'copied': 0, 'unchanged': 0, 'failed': 0, 'downloaded': 0}
+    entries = {}
+    cached = []
+    with concurrent.futures.ThreadPoolExecutor(
+            max(1, workers), thread_name_prefix='fontlib-bundle') as pool:
+        futures = {
+            pool.submit(_bundle_font, job, dest, previous.get(job['id'])): job
+            for job in jobs.values() }
+        for future in concurrent.futures.as_completed(futures):
+            job = futures[future]
+            try:
+                entry, how, downloaded = future.result()
+            except Exception as exc:  # pylint: disable=broad-except
+                log.error("bundle: font %s (%s) failed: %s", job['id'], job['origin'], exc)
+                stats['failed'] += 1
+                continue
+            stats[how] += 1
+            if downloaded:
+                stats['downloaded'] += 1
+                if job['cached']:
+                    cached.append({'origin': job['origin'], 'state': URLBlob.STATE_CACHED})
+            entries[job['id']] = entry
+
+    if cached:
+        fontlib_session().bulk_update_mappings(URLBlob, cached)
+
+    fonts = []
+    for family, font_id in members:
+        if font_id not in entries:
+            continue
+        job, entry = jobs[font_id], entries[font_id]
+        fonts.append({
+            'id': font_id
+            , 'family': family
+            , 'format': job['format']
+            , 'unicode_range': job['unicode_range']
+            , 'descriptors': job['descriptors']
+            , 'origin': job['origin']
+            , 'file': entry['file']
+            , 'sha256': entry['sha256']
+            , 'size': entry['size']
+            , 'mtime_ns': entry['mtime_ns']
+        })
+    css = font_face_css(
+        ((entry['family'], url_base + entry['file'], entry['format'], entry['unicode_range']
+          , entry['descriptors'])
+         for entry in fonts)
+        , formats).encode('utf-8')
+    css_name = 'fonts.' + hashlib.sha256(css).hexdigest()[:_HASH_LENGTH] + '.css'
+    stats['css'] = css_name
+    stats['written'] = write_precompressed(os.path.join(dest, css_name), css)
+
+    manifest = {
+        'families': list(families)
+        , 'formats': None if formats is None else list(formats)
+        , 'css': css_name
+        , 'fonts': fonts
+    }
+    if write_file(manifest_file, json.dumps(manifest, indent=2).encode('utf-8')):
+        stats['written'][manifest_file] = os.path.getsize(manifest_file)
+
+    stats['bytes'] = sum(entry['size'] for entry in fonts)
+    stats['seconds'] = round(time.time() - start, 3)
+    log.info("bundle: %s", stats)
+    return stats
@@ -0,0 +1,251 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Compiled, read-only index of the fonts in a workspace.
+
+Lookups through the ORM need SQLAlchemy, a session and a object for each row,
+while the catalog of a workspace rarely changes.  The command::
+
+  fontlib workspace compile
+
+writes an immutable index file (default: ``<workspace>/catalog.idx``, see
+:py:func:`compile_catalog`).  The :py:class:`Catalog` reader maps the file into
+memory (:py:mod:`mmap`) and answers :py:meth:`.fontstack.FontStack.list_fonts`
+like queries by a binary search, without importing SQLAlchemy.  Processes
+which read the same index share the pages of the file::
+
+    from fontlib.catalog import Catalog
+
+    with Catalog('~/.fontlib/catalog.idx') as catalog:
+        for font in catalog.list_fonts('DejaVu Sans Mono'):
+            print(font.id, font.format, font.blob_path)
+
+Layout of the file (little endian)::
+
+  header   magic, number of fonts, offset of the fonts, number of names,
+           offset of the names, compile time
+  fonts    fixed size records sorted by font ID, a record has references
+           (offset, length) into the strings for: id, name, origin, format,
+           unicode range, aliases, BLOB state and BLOB path
+  names    (offset, length, font index) of the names and aliases, sorted by
+           the UTF-8 bytes of the name
+  strings  UTF-8 encoded strings
+
+A new index replaces the old file atomically, a reader which has mapped the
+old file is not affected.
+
+"""
+
+__all__ = ['CATALOG_FILE', 'CatalogFont', 'Catalog', 'compile_catalog']
+
+import os
+import mmap
+import time
+import struct
+import logging
+import collections
+
+log = logging.getLogger(__name__)
+
+CATALOG_FILE = 'catalog.idx'
+"""Default file name of the index in the workspace"""
+
+_MAGIC = b'FLCAT\x00\x00\x01'
+_HEADER = struct.Struct('<8sIIIId')
+_FIELDS = (
+    'id', 'name', 'origin', 'format', 'unicode_range', 'aliases', 'blob_state', 'blob_path')
+_RECORD = struct.Struct('<' + 'II' * len(_FIELDS))
+_NAME = struct.Struct('<III')
+_ALIAS_SEP = '\n'
+
+CatalogFont = collections.namedtuple('CatalogFont', _FIELDS)
+CatalogFont.__doc__ = """A font from the :py:class:`Catalog` (``aliases`` is a tuple of names)"""
+
+
+class Catalog:
+    """Reader of a compiled index (see :py:func:`compile_catalog`).
+
+    :param str fname: file name of the index
+    """
+
+    def __init__(self, fname):
+        self.fname = os.path.expanduser(fname)
+        with open(self.fname, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.n_fonts, self._fonts, self.n_names, self._names, self.compiled = (
+            _HEADER.unpack_from(self._mm, 0))
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError(f"{fname} is not a fontlib catalog")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.n_fonts
+
+    def close(self):
+        """Release the mapped file"""
+        self._mm.close()
+
+    def _bytes(self, offset, length):
+        return self._mm[offset:offset + length]
+
+    def _font(self, index):
+        refs = _RECORD.unpack_from(self._mm, self._fonts + index * _RECORD.size)
+        values = [self._bytes(refs[i], refs[i+1]).decode('utf-8') for i in range(0, len(refs), 2)]
+        values[5] = tuple(values[5].split(_ALIAS_SEP)) if values[5] else ()
+        return CatalogFont(*values)
+
+    def _font_id(self, index):
+        offset, length = struct.unpack_from('<II', self._mm, self._fonts + index * _RECORD.size)
+        return self._bytes(offset, length)
+
+    def _name(self, index):
+        offset, length, font_index = _NAME.unpack_from(self._mm, self._names + index * _NAME.size)
+        return self._bytes(offset, length), font_index
+
+    @staticmethod
+    def _bisect(key, get, count):
+        low, high = 0, count
+        while low < high:
+            mid = (low + high) // 2
+            if get(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def get(self, font_id):
+        """Return :py:class:`CatalogFont` with ID ``font_id`` or ``None``"""
+        key = font_id.encode('utf-8')
+        index = self._bisect(key, self._font_id, self.n_fonts)
+        if index < self.n_fonts and self._font_id(index) == key:
+            return self._font(index)
+        return None
+
+    def list_fonts(self, name=None):
+        """Return generator of :py:class:`CatalogFont` objects selected by
+        ``name`` (font name or alias), ordered by the font ID.
+
+        :param name:
+            Name of the font
+        """
+        if name is None:
+            for index in range(self.n_fonts):
+                yield self._font(index)
+            return
+
+        key = name.encode('utf-8')
+        index = self._bisect(key, lambda i: self._name(i)[0], self.n_names)
+        seen = set()
+        while index < self.n_names:
+            value, font_index = self._name(index)
+            if value != key:
+                break
+            if font_index not in seen:
+                seen.add(font_index)
+                yield self._font(font_index)
+            index += 1
+
+    def names(self):
+        """Return sorted list of the font names and aliases in the catalog"""
+        ret_val = []
+        for index in range(self.n_names):
+            name = self._name(index)[0].decode('utf-8')
+            if not ret_val or ret_val[-1] != name:
+                ret_val.append(name)
+        return ret_val
+
+
+def compile_catalog(config, stack, dest=None):
+    """Compile the fonts of the workspace into an index file.
+
+    Needs an active session (see :py:func:`.db.fontlib_scope`).
+
+    :param config: :py:class:`.config.Config` object of the workspace
+    :param stack: :py:class:`.fontstack.FontStack` object of the workspace, the
+        BLOB path of a font is the file in the URL cache of the stack (or the
+        local file of a ``file:`` URL)
+    :param str dest: file name of the index (default:
+        ``<workspace>/catalog.idx``)
+    :return: dictionary with statistics of the index
+    """
+    # the reader of the catalog does not need SQLAlchemy, import the DB
+    # layer only when a catalog is compiled
+    # pylint: disable=import-outside-toplevel, too-many-locals
+    from urllib.parse import urlparse
+    from sqlalchemy.orm import selectinload
+    from .db import fontlib_session
+    from .font import Font
+    from .urlcache import URLBlob
+
+    if dest is None:
+        dest = config.getpath('DEFAULT', 'workspace') / CATALOG_FILE
+    dest = os.path.expanduser(dest)
+
+    strings = {}
+    chunks = []
+    offset = [0]
+
+    def ref(value):
+        value = (value or '').encode('utf-8')
+        if value not in strings:
+            strings[value] = offset[0]
+            chunks.append(value)
+            offset[0] += len(value)
+        return strings[value], len(value)
+
+    session = fontlib_session()
+    query = session.query(Font).options(
+        selectinload(Font.aliases), selectinload(Font.src_formats), selectinload(Font.blob))
+    fonts = sorted(query, key=lambda font: font.id.encode('utf-8'))
+
+    records = []
+    names = []
+    for index, font in enumerate(fonts):
+        blob = font.blob
+        state = blob.state if blob is not None else None
+        blob_path = None
+        if state == URLBlob.STATE_CACHED:
+            blob_path = stack.cache.fname_by_blob(blob)
+        elif state == URLBlob.STATE_LOCAL or font.origin.startswith('file:'):
+            blob_path = urlparse(font.origin).path
+        aliases = sorted(alias.alias_name for alias in font.aliases)
+        values = (
+            font.id, font.name, font.origin, font.format, font.unicode_range
+            , _ALIAS_SEP.join(aliases), state, blob_path)
+        records.append([x for value in values for x in ref(value)])
+        for name in set([font.name] + aliases):
+            if name:
+                ref(name)
+                names.append((name.encode('utf-8'), index))
+
+    names.sort()
+    fonts_offset = _HEADER.size
+    names_offset = fonts_offset + len(records) * _RECORD.size
+    strings_offset = names_offset + len(names) * _NAME.size
+
+    tmp_file = dest + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(_HEADER.pack(
+            _MAGIC, len(records), fonts_offset, len(names), names_offset, time.time()))
+        for record in records:
+            # string offsets are relative to the start of the strings
+            f.write(_RECORD.pack(*[
+                x + strings_offset if i % 2 == 0 else x for i, x in enumerate(record)]))
+        for name, index in names:
+            f.write(_NAME.pack(strings[name] + strings_offset, len(name), index))
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp_file, dest)
+
+    stats = {
+        'file': dest
+        , 'fonts': len(records)
+        , 'names': len(names)
+        , 'bytes': os.path.getsize(dest)
+    }
+    log.info("catalog: compiled %(fonts)s fonts into %(file)s (%(bytes)s bytes)", stats)
+    return stats
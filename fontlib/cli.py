@@ -13,6 +13,10 @@ common options:
 
 - ``-c / --config``: :origin:`fontlib/config.ini` (see :ref:`config`)
 - ``-w / --workspace``: place where application persists its data
+- ``--transport``: ``live``, ``record`` or ``replay`` HTTP requests (see
+  :py:mod:`fontlib.transport`)
+- ``--profile``: profile the command, ``--profile-mode``: ``cpu`` or ``mem``
+  (see :py:mod:`fontlib.profiling`)
 
 fontstack options:
 
@@ -28,10 +32,12 @@ For a more detailed help to one of the sub commands type::
 
 import re
 import sys
+import json
 import configparser
 import logging.config
 import platform
 import urllib.parse
+import importlib.util
 
 from fspath import CLI
 from fspath import FSPath
@@ -40,28 +46,42 @@ from fspath.progressbar import humanizeBytes
 from fspath.progressbar import progressbar
 
 from . import __pkginfo__
-from . import db
 from . import event
-from . import googlefont
-
-from .api import FontStack
-from .api import BUILTINS # pylint: disable=unused-import
-from .api import URLBlob
 
+from .catalog import compile_catalog
 from .config import init_cfg
 from .config import get_cfg
 from .config import DEFAULT_INI
+from .config import BUILTINS
 from .log import DEFAULT_LOG_INI
 from .log import FONTLIB_LOGGER
 from .log import init_log
-
-_development = True  # pylint: disable=invalid-name
-
-try:
-    from sqlalchemy import MetaData
-    from sqlalchemy_schemadisplay import create_schema_graph
-except ImportError as exc:
-    _development = False  # pylint: disable=invalid-name
+from .profiling import PROFILE_MODES
+from .profiling import profile_call
+from .transport import TRANSPORT_MODES
+from .transport import init_transport
+from .utils import lazy_import
+from .utils import parse_size
+from .utils import write_precompressed
+
+# The heavy dependencies (SQLAlchemy, tinycss2, ..) are imported lazy by the
+# subsystems, short commands (and the shell completion) start fast.
+
+api = lazy_import('fontlib.api')
+bench = lazy_import('fontlib.bench')
+bundle = lazy_import('fontlib.bundle')
+db = lazy_import('fontlib.db')
+garbage = lazy_import('fontlib.garbage')
+googlefont = lazy_import('fontlib.googlefont')
+ingest = lazy_import('fontlib.ingest')
+mirror = lazy_import('fontlib.mirror')
+server = lazy_import('fontlib.server')
+sources = lazy_import('fontlib.sources')
+warm = lazy_import('fontlib.warm')
+watch = lazy_import('fontlib.watch')
+
+
+_development = importlib.util.find_spec('sqlalchemy_schemadisplay') is not None  # pylint: disable=invalid-name
 
 
 log = logging.getLogger('fontlib.cli')
@@ -131,6 +151,39 @@ def main():
         , action  = 'store_true'
         , help    = 'debug sql engine' )
 
+    cli.add_argument(
+        '--transport'
+        , dest = 'transport'
+        , default = None
+        , choices = TRANSPORT_MODES
+        , help = ("transport of HTTP requests (see [transport] in config.ini):"
+                  " %(choices)s" )
+        )
+
+    cli.add_argument(
+        '--profile'
+        , dest = 'profile'
+        , action = 'store_true'
+        , help = "profile the command, results are written to <workspace>/profile"
+        )
+
+    cli.add_argument(
+        '--profile-mode'
+        , dest = 'profile_mode'
+        , default = 'cpu'
+        , choices = PROFILE_MODES
+        , help = "profiler used by --profile (default: %(default)s): %(choices)s"
+        )
+
+    cli.add_argument(
+        '--profile-top'
+        , dest = 'profile_top'
+        , type = int
+        , default = 25
+        , metavar = 'N'
+        , help = "number of entries in the profile summary"
+        )
+
     # cmd: README ...
 
     _ = cli.addCMDParser(cli_readme, cmdName='README')
@@ -160,6 +213,100 @@ def main():
 
     _ = cli.addCMDParser(cli_list_fonts, cmdName='list')
 
+    # cmd: bench ...
+
+    bench_cmd = cli.addCMDParser(cli_bench, cmdName='bench')
+    bench_cmd.add_argument(
+        '--repeat'
+        , type = int
+        , default = 10
+        , help = 'repeat each benchmark N times'
+        , metavar = 'N'
+    )
+    bench_cmd.add_argument(
+        '--name'
+        , type = str
+        , default = None
+        , help = 'font name used in the lookup benchmark (default: first font in the workspace)'
+    )
+
+    # cmd: serve ...
+
+    serve_cmd = cli.addCMDParser(cli_serve, cmdName='serve')
+    serve_cmd.add_argument(
+        '--host'
+        , type = str
+        , default = None
+        , help = 'address the server listens on (default: [serve] host)'
+    )
+    serve_cmd.add_argument(
+        '--port'
+        , type = int
+        , default = None
+        , help = 'port the server listens on (default: [serve] port)'
+    )
+    serve_cmd.add_argument(
+        '--proxy'
+        , dest = 'proxy'
+        , action = 'store_true'
+        , default = None
+        , help = 'answer requests of the google fonts API (default: [serve] proxy)'
+    )
+
+    # cmd: gc ...
+
+    gc_cmd = cli.addCMDParser(cli_gc, cmdName='gc')
+    gc_cmd.add_argument(
+        '--dry-run'
+        , dest = 'dry_run'
+        , action = 'store_true'
+        , help = 'only report the garbage, nothing is deleted'
+    )
+    gc_cmd.add_argument(
+        '--include-unsourced'
+        , dest = 'include_unsourced'
+        , action = 'store_true'
+        , help = 'delete fonts which are not provided by a (recorded) source of the workspace'
+    )
+
+    # cmd: cache ...
+
+    cache_cmd = cli.addCMDParser(cli_cache, cmdName='cache')
+    cache_cmd.add_argument(
+        '--max-bytes'
+        , type = parse_size
+        , default = None
+        , help = 'byte budget, e.g. 200M (default: [cache warm] max bytes)'
+        , metavar = 'SIZE'
+    )
+    cache_cmd.add_argument(
+        '--max-count'
+        , type = int
+        , default = None
+        , help = 'maximal number of BLOBs (default: [cache warm] max count)'
+        , metavar = 'N'
+    )
+    cache_cmd.add_argument(
+        '--workers'
+        , type = int
+        , default = None
+        , help = 'number of concurrent downloads (default: [ingest] fetch workers)'
+        , metavar = 'N'
+    )
+    cache_cmd.add_argument(
+        '--policy'
+        , type = str
+        , default = None
+        , help = ("comma separated list of criteria: %s (default: [cache warm] policy)"
+                  % ', '.join(warm.WARM_POLICIES))
+    )
+    cache_cmd.add_argument(
+        "subcommand"
+        , type = str
+        , choices = ['warm']
+        , help = "available subcommands: %(choices)s"
+    )
+
     # cmd: css-parse
 
     css_parse = cli.addCMDParser(cli_parse_css, cmdName='css-parse')
@@ -174,6 +321,75 @@ def main():
         , help = "URL of stylesheet (CSS) to parse"
     )
 
+    # cmd: css-gen
+
+    css_gen = cli.addCMDParser(cli_gen_css, cmdName='css-gen')
+    css_gen.add_argument(
+        '--formats'
+        , type = str
+        , default = None
+        , help = "comma separated list of formats, most preferred first, e.g. woff2,woff (default: all formats)"
+    )
+    css_gen.add_argument(
+        '--url-base'
+        , dest = 'url_base'
+        , type = str
+        , default = None
+        , help = "the URL of a font is <url-base><font ID><suffix> (default: origin of the font)"
+    )
+    css_gen.add_argument(
+        "dest"
+        , type = FSPath
+        , help = "File name of the stylesheet, e.g. fonts.css"
+    )
+    css_gen.add_argument(
+        "family"
+        , type = str
+        , nargs = '+'
+        , help = (
+            "Font's name, the value of CSS font-family property."
+            "E.g. 'Roboto Slab' or 'DejaVu Sans Mono'"
+        )
+    )
+
+    # cmd: bundle ...
+
+    bundle_cmd = cli.addCMDParser(cli_bundle, cmdName='bundle')
+    bundle_cmd.add_argument(
+        '--formats'
+        , type = str
+        , default = None
+        , help = "comma separated list of formats, most preferred first, e.g. woff2,woff (default: all formats)"
+    )
+    bundle_cmd.add_argument(
+        '--url-base'
+        , dest = 'url_base'
+        , type = str
+        , default = ''
+        , help = "prepended to the file names of the fonts in the stylesheet (default: relative URLs)"
+    )
+    bundle_cmd.add_argument(
+        '--workers'
+        , type = int
+        , default = None
+        , help = 'number of concurrent copies and downloads (default: [ingest] fetch workers)'
+        , metavar = 'N'
+    )
+    bundle_cmd.add_argument(
+        "family"
+        , type = str
+        , nargs = '+'
+        , help = (
+            "Font's name, the value of CSS font-family property."
+            "E.g. 'Roboto Slab' or 'DejaVu Sans Mono'"
+        )
+    )
+    bundle_cmd.add_argument(
+        "dest"
+        , type = FSPath
+        , help = "Folder of the bundle."
+    )
+
     # cmd: download ...
 
     download_family = cli.addCMDParser(cli_download_family, cmdName='download')
@@ -219,10 +435,16 @@ def main():
 
     workspace = cli.addCMDParser(cli_workspace, cmdName='workspace')
     add_fontstack_options(workspace)
+    workspace.add_argument(
+        "--force"
+        , dest = 'force'
+        , action = 'store_true'
+        , help = "init: process all sources, regardless of their fingerprint"
+    )
     workspace.add_argument(
         "subcommand"
         , type = str
-        , choices = ['show', 'init']
+        , choices = ['show', 'init', 'watch', 'compile']
         , help = "available subcommands: %(choices)s"
     )
     workspace.add_argument(
@@ -246,10 +468,17 @@ def main():
                   " rst: reStructuredText,"
                   " raw: unformated" )
         )
+    google.add_argument(
+        "--workers"
+        , type = int
+        , default = None
+        , help = "number of concurrent requests of the mirror (default: [ingest] fetch workers)"
+        , metavar = 'N'
+        )
     google.add_argument(
         "subcommand"
         , type = str
-        , choices = ['list', 'add']
+        , choices = ['list', 'add', 'mirror']
         , help = "available subcommands: %(choices)s"
     )
     google.add_argument(
@@ -260,6 +489,11 @@ def main():
         , metavar = 'ARG'
     )
 
+    # wrap commands with the profiler (see --profile)
+
+    for cmd in cli.cliSubParsers.choices.values():
+        cmd.set_defaults(func=profile_cmd(cmd.get_default('func')))
+
     # run ...
     cli()
 
@@ -269,7 +503,7 @@ def cli_readme(args):
     Use ``--verbose`` to print URL auf http links.
 
     """
-    init_app(args)
+    init_app(args, init_db=False)
     cli = args.CLI
     _ = cli.UI
 
@@ -316,6 +550,10 @@ def cli_schema(args):
     if args.out.SUFFIX:
         fmt = args.out.SUFFIX[1:]
 
+    # pylint: disable=import-outside-toplevel
+    from sqlalchemy import MetaData
+    from sqlalchemy_schemadisplay import create_schema_graph
+
     # create the pydot graph object by autoloading all tables via a bound metadata object
     graph = create_schema_graph(
         metadata = MetaData(fontlib_connector)
@@ -332,7 +570,7 @@ def cli_schema(args):
 
 def cli_version(args):
     """prints version infos to stdout"""
-    init_app(args)
+    init_app(args, init_db=False)
     cli = args.CLI
     _ = cli.UI
 
@@ -351,7 +589,7 @@ def cli_list_fonts(args):
     cli = args.CLI
     _ = cli.UI
 
-    stack = FontStack.get_fontstack(CTX.CONFIG)
+    stack = api.FontStack.get_fontstack(CTX.CONFIG)
 
     def table_rows():
 
@@ -360,11 +598,11 @@ def cli_list_fonts(args):
             blob = stack.cache.get_blob_obj(font.origin)
 
             if blob is None:
-                state = URLBlob.STATE_REMOTE
+                state = api.URLBlob.STATE_REMOTE
                 url = urllib.parse.urlparse(blob.origin)
                 if url.scheme == 'file':
-                    state = URLBlob.STATE_LOCAL
-                blob = URLBlob(font.origin, state=state)
+                    state = api.URLBlob.STATE_LOCAL
+                blob = api.URLBlob(font.origin, state=state)
 
             closest = blob.origin
             if blob.state == blob.STATE_CACHED:
@@ -391,6 +629,106 @@ def cli_list_fonts(args):
             , ("location",      "%-90s",        "closest") )
 
 
+def cli_bench(args):
+    """Run read-only micro-benchmarks against the workspace.
+
+    Measures DB open time, list and name lookup of fonts and cache hit latency
+    of the workspace.  The timings (ms) and size statistics of DB and cache are
+    printed in JSON format::
+
+      fontlib bench --repeat 100 --name 'DejaVu Sans Mono'
+
+    """
+    init_app(args)
+    cli = args.CLI
+    _ = cli.UI
+
+    stack = api.FontStack.get_fontstack(CTX.CONFIG)
+
+    with db.fontlib_scope():
+        results = bench.workspace_bench(
+            CTX.CONFIG, stack, name=args.name, repeat=args.repeat)
+
+    results['workspace'] = str(CTX.WORKSPACE)
+    _.echo(json.dumps(results, indent=2))
+
+def cli_serve(args):
+    """Serve the fonts of the workspace by HTTP.
+
+    The fonts are served from the URL cache, the stylesheet of a font family is
+    generated (see :py:mod:`fontlib.server`)::
+
+      fontlib serve --port 8090
+
+    With ``--proxy`` the server also answers the requests of the google fonts
+    API (``/css?family=...``), unknown families are registered on the first
+    request::
+
+      fontlib serve --proxy
+
+    """
+    init_app(args)
+    _ = args.CLI.UI
+
+    stack = api.FontStack.get_fontstack(CTX.CONFIG)
+    with server.FontServer.from_config(
+            stack, CTX.CONFIG, args.host, args.port, args.proxy) as httpd:
+        _.echo(f"serving fonts of workspace {CTX.WORKSPACE} at: {httpd.url} (stop with Ctrl-C)")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+def cli_gc(args):
+    """Delete orphaned fonts, DB rows and cache files of the workspace.
+
+    The garbage is selected as described in :py:mod:`fontlib.garbage`, the
+    statistics are printed in JSON format::
+
+      fontlib gc --dry-run
+
+    Fonts are only deleted with ``--include-unsourced``.
+
+    """
+    init_app(args)
+    _ = args.CLI.UI
+
+    stack = api.FontStack.get_fontstack(CTX.CONFIG)
+    with db.fontlib_scope():
+        stats = garbage.collect_garbage(
+            stack, dry_run=args.dry_run, include_unsourced=args.include_unsourced)
+    _.echo(json.dumps(stats, indent=2))
+
+def cli_cache(args):
+    """Tools for the URL cache of the workspace.
+
+    commands:
+
+    - warm: prefetch BLOBs of registered fonts into the cache, ordered by a
+      policy until the budget is reached (see :py:mod:`fontlib.warm`)::
+
+        cache --max-bytes 200M --policy families,popularity warm
+
+    """
+    init_app(args)
+    _ = args.CLI.UI
+
+    if args.subcommand == 'warm':
+        policy = None
+        if args.policy:
+            policy = [i.strip() for i in args.policy.split(',')]
+
+        with db.fontlib_scope():
+            stack = api.FontStack.get_fontstack(CTX.CONFIG)
+            stats = warm.warm_cache(
+                CTX.CONFIG, stack
+                , max_bytes = args.max_bytes
+                , max_count = args.max_count
+                , workers = args.workers
+                , policy = policy )
+
+        _.echo(json.dumps(stats, indent=2))
+
 def cli_parse_css(args):
     """Parse ``@font-face`` rules from <url>.
 
@@ -425,7 +763,7 @@ def cli_parse_css(args):
 
     with db.fontlib_scope():
 
-        stack = FontStack.get_fontstack(CTX.CONFIG)
+        stack = api.FontStack.get_fontstack(CTX.CONFIG)
         _.echo(f"load css from url: {args.url}")
         stack.load_css(args.url)
 
@@ -440,6 +778,71 @@ def cli_parse_css(args):
     if args.register:
         _.echo(f'fonts registered in workspace: {CTX.WORKSPACE}')
 
+def cli_gen_css(args):
+    """Generate a stylesheet with the `@font-face`_ rules of font families.
+
+    The rules are optimised (see :py:meth:`fontlib.fontstack.FontStack.to_css`),
+    beside the stylesheet <dest>, the precompressed variants <dest>.gz and
+    <dest>.br are written (see :py:func:`fontlib.utils.write_precompressed`)::
+
+      fontlib css-gen --formats woff2,woff --url-base /fonts/ fonts.css 'Roboto Slab'
+
+    """
+    init_app(args)
+    _ = args.CLI.UI
+
+    formats = None
+    if args.formats:
+        formats = [i.strip() for i in args.formats.split(',')]
+
+    stack = api.FontStack.get_fontstack(CTX.CONFIG)
+    with db.fontlib_scope():
+        css = stack.to_css(args.family, formats=formats, url_base=args.url_base)
+    if not css:
+        msg = f"non of selected font families is registered: {', '.join(args.family)}"
+        log.error(msg)
+        _.echo(msg)
+        return 1
+    args.dest.ABSPATH.DIRNAME.makedirs()
+    stats = {
+        'rules': css.count('@font-face')
+        , 'written': write_precompressed(args.dest, css.encode('utf-8'))
+    }
+    _.echo(json.dumps(stats, indent=2))
+    return 0
+
+def cli_bundle(args):
+    """Export font-families <family> into a static bundle in folder <dest>.
+
+    The font files are named by the hash of their content, a stylesheet and a
+    manifest are generated (see :py:mod:`fontlib.bundle`), the statistics are
+    printed in JSON format::
+
+      fontlib bundle --formats woff2,woff 'Roboto Slab' ./static
+
+    """
+    init_app(args)
+    _ = args.CLI.UI
+
+    formats = None
+    if args.formats:
+        formats = [i.strip() for i in args.formats.split(',')]
+
+    stack = api.FontStack.get_fontstack(CTX.CONFIG)
+    with db.fontlib_scope():
+        stats = bundle.bundle_fonts(
+            CTX.CONFIG, stack, args.family, args.dest
+            , formats = formats
+            , url_base = args.url_base
+            , workers = args.workers )
+    _.echo(json.dumps(stats, indent=2))
+    if not stats['fonts']:
+        msg = f"non of selected font families is registered: {', '.join(args.family)}"
+        log.error(msg)
+        _.echo(msg)
+        return 1
+    return int(bool(stats['failed']))
+
 def download_progress(_url, font_name, font_format, _cache_file, down_bytes, max_bytes):
     """Callback that prints download progress bar.
 
@@ -468,7 +871,7 @@ def cli_download_family(args):
     cli = args.CLI
     _ = cli.UI
 
-    stack = FontStack.get_fontstack(CTX.CONFIG)
+    stack = api.FontStack.get_fontstack(CTX.CONFIG)
 
     event.add('urlcache.download.tick', download_progress)
 
@@ -521,7 +924,7 @@ def cli_config(args):
 
     """
 
-    init_app(args, verbose=True)
+    init_app(args, verbose=True, init_db=False)
     cli = args.CLI
     _ = cli.UI
 
@@ -590,6 +993,8 @@ def cli_workspace(args):
           workspace init ~/.fontlib
 
       Second argument is the destination of the workspace (default: ~/.fontlib).
+      Only the sources which have been changed since the last init are
+      processed, use ``--force`` to process all sources.
 
       To register fonts from google fonts infrastructure.  Select font families
       from: https://fonts.google.com
@@ -602,6 +1007,22 @@ def cli_workspace(args):
               font-fredoka-one font-hanken-grotesk font-intuitive \\
               font-source-sans-pro font-source-serif-pro
 
+    - watch: keep the workspace in sync with its sources, new, changed and
+      removed CSS files and font packages are applied incrementally (see
+      :py:mod:`fontlib.watch`)::
+
+          workspace watch
+
+      The command runs until it is interrupted (Ctrl-C).
+
+    - compile: compile the fonts of the workspace into a read-only index (see
+      :py:mod:`fontlib.catalog`)::
+
+          workspace compile [<dest>]
+
+      Second argument is the file name of the index (default:
+      <workspace>/catalog.idx).
+
     """
 
     init_app(args)
@@ -640,8 +1061,23 @@ def cli_workspace(args):
         workspace.makedirs()
 
         with db.fontlib_scope():
-            FontStack.init_fontstack(CTX.CONFIG)
+            stats = api.FontStack.init_fontstack(CTX.CONFIG, force=args.force)
+        _.echo(json.dumps(stats, indent=2))
+        return
+
+    if args.subcommand == 'watch':
+
+        # finally check command line
+
+        if args.argument_list:
+            _.echo(f"WARNING: ignoring arguments: {','.join(args.argument_list)}")
 
+        _.echo(f"watching sources of workspace: {workspace} (stop with Ctrl-C)")
+        try:
+            watch.watch_workspace(
+                CTX.CONFIG, on_sync=lambda stats: _.echo(json.dumps(stats, indent=2)))
+        except KeyboardInterrupt:
+            pass
         return
 
     if args.subcommand == 'show':
@@ -656,6 +1092,23 @@ def cli_workspace(args):
         _.echo(f"CONFIG:    {cfg_file}")
         return
 
+    if args.subcommand == 'compile':
+
+        dest = None
+        if args.argument_list:
+            dest = FSPath(args.argument_list.pop(0))
+
+        # finally check command line
+
+        if args.argument_list:
+            _.echo(f"WARNING: ignoring arguments: {','.join(args.argument_list)}")
+
+        stack = api.FontStack.get_fontstack(CTX.CONFIG)
+        with db.fontlib_scope():
+            stats = compile_catalog(CTX.CONFIG, stack, dest)
+        _.echo(json.dumps(stats, indent=2))
+        return
+
 def cli_google(args):
     """tools for Google fonts
 
@@ -669,6 +1122,11 @@ def cli_google(args):
 
         google --format=rst add 'Libre.*39'
 
+    - mirror: add fonts to FontStack and download their BLOBs into the cache, an
+      interrupted mirror resumes where it stopped (see :py:mod:`fontlib.mirror`)::
+
+        google --workers 16 mirror 'Roboto.*'
+
       The second argument is a optional regular expression to filter font names
       by matching this expression (default: *None*).
     """
@@ -676,7 +1134,7 @@ def cli_google(args):
     init_app(args)
     _ = args.CLI.UI
 
-    if args.subcommand in ('list', 'add'):
+    if args.subcommand in ('list', 'add', 'mirror'):
 
         # get match condition ...
         condition = None
@@ -696,7 +1154,9 @@ def cli_google(args):
             _.rst_title("google font names")
 
         i = 0
-        for name, item in googlefont.font_map(CTX.CONFIG).items():
+        with db.fontlib_scope():
+            font_map = googlefont.font_map(CTX.CONFIG)
+        for name, item in font_map.items():
             if condition is not None:
                 if not condition.search(name):
                     continue
@@ -715,17 +1175,31 @@ def cli_google(args):
         event.add('FontStack.add_alias', print_msg('add alias %s to font %s'))
         i = 0
 
+        css_sources = []
+        with db.fontlib_scope():
+            font_map = googlefont.font_map(CTX.CONFIG)
+        for name, item in font_map.items():
+            if condition is not None:
+                if not condition.search(name):
+                    continue
+            i += 1
+
+            _.echo(f"{i:4d}. read font-family '{name}' from CSS: {item['css_url']}")
+            css_sources.append((ingest.SOURCE_CSS, item['css_url']))
+
         with db.fontlib_scope():
-            stack = FontStack.get_fontstack(CTX.CONFIG)
+            stack = api.FontStack.get_fontstack(CTX.CONFIG)
+            ingest.IngestPipeline.from_config(stack, CTX.CONFIG).run(
+                css_sources
+                , on_source=lambda src_type, value, fonts, state: sources.register_source(value, fonts))
+
+    if args.subcommand == 'mirror':
 
-            for name, item in googlefont.font_map(CTX.CONFIG).items():
-                if condition is not None:
-                    if not condition.search(name):
-                        continue
-                i += 1
+        with db.fontlib_scope():
+            stack = api.FontStack.get_fontstack(CTX.CONFIG)
+            stats = mirror.GoogleMirror(CTX.CONFIG, stack, workers=args.workers).run(condition)
 
-                _.echo(f"{i:4d}. read font-family '{name}' from CSS: {item['css_url']}")
-                stack.load_css(item['css_url'])
+        _.echo(json.dumps(stats, indent=2))
 
 # ==============================================================================
 # helper ...
@@ -737,6 +1211,7 @@ MAP_ARG_TO_CFG = {
     , 'epfonts'       : ('fontstack', 'entry points')
     , 'google'        : ('google fonts', 'fonts')
     , 'workspace'     : ('DEFAULT', 'workspace')
+    , 'transport'     : ('transport', 'mode')
 }
 """Maps command line arguments to config section & option"""
 
@@ -773,6 +1248,29 @@ def add_fontstack_options(cmd):
         , help = f"register fonts from fonts.googleapis.com / e.g. '{CTX.CONFIG.get(*MAP_ARG_TO_CFG['google'][:2])}'"
         )
 
+def profile_cmd(func):
+    """Wraps command function ``func`` by the profiler selected in ``--profile``
+
+    Results of the profiler are written to ``<workspace>/profile``, see
+    :py:mod:`fontlib.profiling`.
+
+    """
+    def cmd(args):
+        if not args.profile:
+            return func(args)
+        ret_val, out_files = profile_call(
+            args.profile_mode, func, args
+            # the workspace is known after init_app(args) in func(args)
+            , dest = lambda: CTX.WORKSPACE / 'profile'
+            , name = args.command
+            , top = args.profile_top )
+        for fname in out_files:
+            args.ERR.write(f"{args.profile_mode} profile: {fname}\n")
+        return ret_val
+
+    cmd.__doc__ = func.__doc__
+    return cmd
+
 def init_main(cli):
     """Init routine for the very first the main function."""
 
@@ -796,13 +1294,15 @@ def init_main(cli):
     env = CTX.CONFIG.config_env(app='cli', workspace=CTX.WORKSPACE)
     init_log(log_cfg, defaults = env)
 
-def init_app(args, verbose=False): # pylint: disable=too-many-statements
+def init_app(args, verbose=False, init_db=True): # pylint: disable=too-many-statements
     """Init the application.
 
     - init :py:obj:`Context.CONFIG` from arguments & INI file
     - init :py:obj:`Context.WORKSPACE`
     - init :py:obj:`.log.FONTLIB_LOGGER`
-    - init DB engine configured in INI ``[DEFAULT]:fontlib_db``
+    - init transport configured in INI ``[transport]``
+    - init DB engine configured in INI ``[DEFAULT]:fontlib_db`` (commands which
+      do not need the DB pass ``init_db=False``)
 
     """
     # pylint: disable=too-many-branches
@@ -883,8 +1383,12 @@ def init_app(args, verbose=False): # pylint: disable=too-many-statements
             + "\n - ".join([str(h) for h in logger.handlers])
             + "\n")
 
+    # init transport of HTTP requests
+    init_transport(CTX.CONFIG)
+
     # init database
-    db.fontlib_init(CTX.CONFIG)
+    if init_db:
+        db.fontlib_init(CTX.CONFIG)
 
 # ==============================================================================
 # call main ...
@@ -1,7 +1,7 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 """Implementation of application's configuration class :py:class:`Config`."""
 
-__all__ = ['Config', 'init_cfg', 'get_cfg', 'DEFAULT_INI', 'GLOBAL_CONFIG']
+__all__ = ['Config', 'init_cfg', 'get_cfg', 'DEFAULT_INI', 'BUILTINS', 'GLOBAL_CONFIG']
 
 import logging
 import configparser
@@ -12,6 +12,9 @@ log = logging.getLogger(__name__)
 DEFAULT_INI = FSPath(__file__).DIRNAME / "config.ini"
 """Default ``config.ini``"""
 
+BUILTINS = FSPath(__file__).DIRNAME / "files"
+"""Folder where the builtin fonts are in (``[fontstack] builtin fonts``)."""
+
 GLOBAL_CONFIG = None
 """Active :py:class:`Config` object of the application
 
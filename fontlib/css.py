@@ -3,29 +3,50 @@
 
 """
 
-__all__ = ['get_css_at_rules', 'CSSRule', 'AtRule', 'FontFaceRule']
+__all__ = [
+    'get_css_at_rules'
+    , 'iter_css_at_rules'
+    , 'parse_css_bytes'
+    , 'iter_css_blocks'
+    , 'prescan_at_rules'
+    , 'CSSRule'
+    , 'AtRule'
+    , 'FontFaceRule'
+    , 'FontFaceRecord'
+    , 'FONT_FACE_DESCRIPTORS'
+    , 'FONT_FORMAT_ORDER'
+    , 'font_face_css'
+]
 
 import logging
+import functools
+import itertools
 import re
-from urllib.request import urlopen
+from collections import namedtuple
 
 import tinycss2
+import webencodings
 
 from .googlefont import is_google_font_url
-from .googlefont import read_google_font_css
+from .googlefont import iter_google_font_css
+from .transport import get_transport
 
 log = logging.getLogger(__name__)
 
+_Block = namedtuple('_Block', ['content'])
+
+FONT_FACE_DESCRIPTORS = ('font-style', 'font-weight', 'font-stretch', 'font-display')
+"""Descriptors of a ``@font-face`` rule which are kept in the record of the
+rule (see :py:meth:`FontFaceRule.descriptors`)"""
+
+FONT_FORMAT_ORDER = ('woff2', 'woff', 'truetype', 'opentype', 'embedded-opentype', 'svg')
+"""Order of the formats in a generated ``src`` list, most preferred first (see
+:py:func:`font_face_css`)"""
+
 def get_css_at_rules(css_url, at_class):
     """Get at-rules of type ``at_class`` from CSS ``css_url``.
 
-    The CSS file is read by :py:func:`urllib.request.urlopen`.  If the URL
-    points to the google fonts api, the CSS is read by
-    :py:func:`.googlefont.read_google_font_css`.
-
-    Both funtions return the byte stream from the URL, which is parsed by
-    :py:func:`tinycss2.parse_stylesheet_bytes`.  The resulting CSS rules are
-    filtered by ``at_class``.
+    Returns a list of all rules from :py:func:`iter_css_at_rules`.
 
     :type css_url:   str
     :param css_url:  URL of the CSS (stylesheet) file
@@ -36,67 +57,226 @@ def get_css_at_rules(css_url, at_class):
     :rtype: [css.AtRule]
     :return: list of ``at_class`` objects
 
+    """
+    return list(iter_css_at_rules(css_url, at_class))
+
+def iter_css_at_rules(css_url, at_class, chunksize=65536):
+    """Generator of the at-rules of type ``at_class`` from CSS ``css_url``.
+
+    The CSS file is streamed by the active transport (see
+    :py:func:`.transport.get_transport`).  If the URL points to the google fonts
+    api, the CSS is streamed by :py:func:`.googlefont.iter_google_font_css`.
+
+    The byte stream is decoded chunk by chunk (the encoding is detected from the
+    first chunk, see :py:func:`tinycss2.bytes.decode_stylesheet_bytes`).  The
+    blocks of the ``at_class`` rules are picked out from the decoded stream (see
+    :py:func:`prescan_at_rules`) and a rule is yielded as soon as its block is
+    parsed.  The stylesheet is never hold in memory as a whole.
+
+    :type css_url:   str
+    :param css_url:  URL of the CSS (stylesheet) file
+
+    :type at_class:  css.AtRule
+    :param at_class: class of the at-rule
+
+    :param int chunksize: size of the chunks read from the stream
+
+    :rtype: generator of css.AtRule
+    :return: generator of ``at_class`` objects
+
     """
     if is_google_font_url(css_url):
-        css_bytes = read_google_font_css(css_url)
+        byte_chunks = iter_google_font_css(css_url, chunksize=chunksize)
     else:
-        with urlopen(css_url) as handle:
-            css_bytes= handle.read()
+        byte_chunks = _iter_css_bytes(css_url, chunksize)
+    yield from parse_css_bytes(byte_chunks, css_url, at_class)
 
-    # parse css ...
-    css_rules, _encoding = tinycss2.parse_stylesheet_bytes(css_bytes=css_bytes)
+def parse_css_bytes(byte_chunks, css_url, at_class):
+    """Generator of the at-rules of type ``at_class`` from a stream of CSS bytes.
 
-    # filter @font-face (at rules)
-    font_face_rules =  [
-        rule for rule in css_rules
-        if (rule.type == 'at-rule' and rule.at_keyword == at_class.rule_name) ]
+    :param byte_chunks: iterable of (bytes) chunks of the stylesheet
+    :param str css_url: URL of the CSS (stylesheet) the bytes come from
+    :param at_class: class of the at-rule
 
-    # instances of class CSSRule
-    css_rules = []
-    for rule in font_face_rules:
+    """
+    count = 0
+    for css_block in iter_css_blocks(byte_chunks, at_class.rule_name):
         obj = at_class(css_url=css_url)
-        css_rules.append(obj)
-        obj.parse_css_rule(rule)
+        obj.parse_css_block(css_block)
+        count += 1
+        yield obj
 
-    log.debug("found %s at-rules", len(css_rules))
-    return css_rules
+    log.debug("found %s at-rules", count)
 
+def iter_css_blocks(byte_chunks, rule_name):
+    """Generator of the blocks of the ``@<rule_name>`` rules from a stream of
+    CSS bytes (see :py:func:`prescan_at_rules`).
 
-def split_tokens(rule_tokens, t_type='literal', t_value=';'):
-    """Split list of tokens into a list of token lists.
+    :param byte_chunks: iterable of (bytes) chunks of the stylesheet
+    :param str rule_name: name of the at-rule (e.g. ``font-face``)
+    """
+    return prescan_at_rules(_decode_css_bytes(byte_chunks), rule_name)
+
+def _iter_css_bytes(css_url, chunksize):
+    with get_transport().get(css_url) as resp:
+        yield from resp.iter_content(chunksize)
+
+def _decode_css_bytes(byte_chunks):
+    """Decode a stream of CSS bytes, the encoding is detected from the first chunk."""
+    byte_chunks = iter(byte_chunks)
+    first = next(byte_chunks, b'')
+    _, encoding = tinycss2.bytes.decode_stylesheet_bytes(first[:1024])
+    text_chunks, _ = webencodings.iter_decode(itertools.chain([first], byte_chunks), encoding)
+    return text_chunks
 
-    By a delimiter, the ``rule_tokens`` list is splitted into groups.
-    Delimiters are tokens with type ``t_type`` and value ``t_value``.
-    Delimiter tokens and ``whitespace`` tokens are stripped from the
-    returned lists.
+_STRING_RE = re.compile(r'"(?:[^"\\\n]|\\.)*["\n]|\'(?:[^\'\\\n]|\\.)*[\'\n]', re.S)
+_AT_RULE_START_RE = {}
+_AT_RULE_GAP = r'(?:\s|/\*.*?\*/)*'  # white space and comments in front of the block
 
-    The default ``t_type`` and ``t_value`` are good to consume a list of
-    declarations:
+def prescan_at_rules(css_text, rule_name):
+    """Returns a generator of the blocks of ``@<rule_name> {...}`` rules in ``css_text``.
 
-    - https://drafts.csswg.org/css-syntax-3/#consume-a-list-of-declarations
+    :param css_text: stylesheet, a string or an iterable of (string) chunks
+    :param str rule_name: name of the at-rule (e.g. ``font-face``)
 
-    :param rule_tokens:
-        A list of :class:`tinycss.ast.Node`
-    :param t_type:
-        String with the type of the delimiter token (default=``literal``)
-    :param t_value:
-        String with the value of the delimiter token (default=``;``)
-    :returns: a list of lists with token in (:class:`tinycss.ast.Node`)
-    :return: list
+    The pre-scan is a cheap search for top-level at-rules whose block does not
+    contain nested blocks (like ``@font-face``), at-rules nested in other
+    blocks (e.g. in ``@media``) are skipped.  Only comments, strings, unquoted
+    ``url(..)`` tokens and curly brackets are recognised, all other content of
+    the stylesheet is skipped without being tokenized.  The generator yields
+    the text between the curly brackets (without comments), to parse use
+    :py:meth:`CSSRule.parse_css_block`.
+
+    From a stream of chunks, only the incomplete rest of the last chunk is kept
+    in memory (an unclosed comment, string or an incomplete at-rule).
 
     """
-    decl_tokens = []
-    current = []
-    for token in rule_tokens:
-        if token.type in ['whitespace',]:
-            # strip whitespaces
-            continue
-        if token.type == t_type and token.value == t_value:
-            decl_tokens.append(current)
-            current = []
-        else:
-            current.append(token)
-    return decl_tokens
+    if isinstance(css_text, str):
+        css_text = [css_text]
+
+    token_re = _AT_RULE_START_RE.get(rule_name)
+    if token_re is None:
+        token_re = re.compile(
+            r'/\*|["\']|url\((?=\s*[^\s"\'])|[{}]|@' + re.escape(rule_name) + _AT_RULE_GAP + r'\{'
+            , re.I | re.S)
+        _AT_RULE_START_RE[rule_name] = token_re
+
+    buf = ''
+    depth = 0
+    for chunk in css_text:
+        buf = buf + chunk if buf else chunk
+        pos = 0
+        keep = None
+        rule_start = None  # position of the '@' of the current rule
+        comments = []      # comments in the block of the current rule
+        gap = None         # (pos, start) of the last run of comments
+
+        while True:
+            match = token_re.search(buf, pos)
+            if match is None:
+                break
+            token = match.group(0)
+            if token == '/*':
+                if gap is None or buf[pos:match.start()].strip():
+                    gap = (pos, match.start())
+                end = buf.find('*/', match.end())
+                if end < 0:
+                    keep = match.start()
+                    break
+                if rule_start is not None:
+                    comments.append((match.start(), end + 2))
+                pos = end + 2
+                continue
+            gap = None
+            if token in ('"', "'"):
+                string = _STRING_RE.match(buf, match.start())
+                if string is None:
+                    keep = match.start()
+                    break
+                pos = string.end()
+            elif token == '{':
+                depth += 1
+                pos = match.end()
+            elif token == '}':
+                pos = match.end()
+                if depth == 0:
+                    continue
+                depth -= 1
+                if rule_start is not None and depth == 0:
+                    yield _strip_comments(buf, block_start, match.start(), comments)
+                    rule_start = None
+                    comments = []
+            elif token[0] == '@':
+                if depth == 0:
+                    rule_start, block_start = match.start(), match.end()
+                depth += 1
+                pos = match.end()
+            else:
+                # unquoted url(..)
+                end = buf.find(')', match.end())
+                if end < 0:
+                    keep = match.start()
+                    break
+                pos = end + 1
+
+        if rule_start is not None:
+            # the block of the rule is incomplete, scan it again with the
+            # next chunk
+            keep = rule_start
+            depth = 0
+        elif keep is None:
+            keep = max(pos, min(_incomplete_start(buf, pos, rule_name), len(buf) - 4))
+        if rule_start is None and gap is not None:
+            # the comments might be in front of the block of a rule
+            keep = min(keep, _incomplete_start(buf, gap[0], rule_name, gap[1]))
+        buf = buf[keep:]
+
+def _strip_comments(buf, start, end, comments):
+    if not comments:
+        return buf[start:end]
+    parts = []
+    for c_start, c_end in comments:
+        parts.append(buf[start:c_start])
+        start = c_end
+    parts.append(buf[start:end])
+    return ''.join(parts)
+
+def _incomplete_start(buf, pos, rule_name, end=None):
+    """Position in ``buf[pos:]`` where a comment or at-rule might have been cut
+    by the end of a chunk, the ``@`` of the at-rule is searched in
+    ``buf[pos:end]``."""
+    if buf.endswith('/'):
+        keep = len(buf) - 1
+    else:
+        keep = len(buf)
+    i = buf.rfind('@', pos, end)
+    if i >= 0:
+        name = buf[i+1:]
+        if rule_name.startswith(name.lower()) or re.fullmatch(
+                re.escape(rule_name) + _AT_RULE_GAP + r'(?:/\*.*|/)?', name, re.I | re.S):
+            keep = i
+    return keep
+
+_DECL_NAME_RE = re.compile(r'-?[a-zA-Z_][-a-zA-Z0-9_]*')
+_QUOTED_RE = re.compile(r'"[^"]*"|\'[^\']*\'|\([^)]*\)')
+
+def _is_simple_block(css_block):
+    """A block is *simple* if it has no escapes, no ``!important`` and no ``;``
+    in strings or functions"""
+    if '\\' in css_block or '!' in css_block:
+        return False
+    for match in _QUOTED_RE.finditer(css_block):
+        if ';' in match.group(0):
+            return False
+    return True
+
+@functools.lru_cache(maxsize=4096)
+def _parse_value(css_value):
+    """Tokens of a declaration value (cached, most values are repeated in large
+    stylesheets)"""
+    tokens = tuple(tinycss2.parse_component_value_list(css_value, skip_comments=True))
+    return tokens, tuple(t for t in tokens if t.type not in ('whitespace', 'literal'))
+
 
 
 class CSSRule:
@@ -107,51 +287,115 @@ class CSSRule:
     rule_type = None
     """String naming the type of the rule"""
 
+    _decl_handlers = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # each class has its own dispatch table
+        cls._decl_handlers = {}
+
     def __init__(self, css_url, *args, **kwargs):  # pylint: disable=unused-argument
         self.css_url = css_url
         """URL of the CSS (stylesheet) file"""
         self.content = []
+        self.css_block = None
         self.declarations = {}
         """Python dict with CSS declarations"""
 
     def serialize(self):
         """Returns a string of the CSS rule."""
+        if self.content is None:
+            self.content = tinycss2.parse_component_value_list(self.css_block)
         return tinycss2.serialize(self.content)
 
+    @classmethod
+    def decl_handler(cls, decl_name):
+        """Returns the function that parses the tokens of declaration ``decl_name``
+
+        A declaration is parsed by method ``parse_decl_<decl_name>``, if this
+        does not exists, :py:meth:`parse_decl` is used.  The result of the lookup
+        is stored in a per class dispatch table.
+
+        """
+        handler = cls._decl_handlers.get(decl_name)
+        if handler is None:
+            method_name = 'parse_decl_' + re.sub('[^a-zA-Z0-9]', '_', decl_name)
+            handler = getattr(cls, method_name, cls.parse_decl)
+            cls._decl_handlers[decl_name] = handler
+        return handler
+
     def parse_css_rule(self, rule):
         """Parse CSS rule
 
-        TODO: needs some documentation
+        The content of the ``rule`` is parsed into a list of declarations
+        (:py:func:`tinycss2.parse_declaration_list`).  The tokens of each
+        declaration are passed to the method of the declaration (see
+        :py:meth:`decl_handler`), the parsed tokens are stored in
+        :py:obj:`declarations`.
+
         """
         self.content = rule.content
         self.declarations = {}
+        default = CSSRule.parse_decl
 
-        for decl in split_tokens(self.content, t_type='literal', t_value=';'):
-            decl_name = None
-            colon = False
+        for decl in tinycss2.parse_declaration_list(
+                self.content, skip_comments=True, skip_whitespace=True):
 
-            for token in decl:
-                # iterate until first ident-token
-                if decl_name is None:
-                    if token.type == 'ident':
-                        decl_name = token.value.lower()
-                        self.declarations[decl_name] = []
-                    continue
-                # iterate until first colon ``:``
-                if decl_name and colon is False:
-                    if token.type == 'literal' and token.value == ':':
-                        colon = True
-                    continue
+            if decl.type != 'declaration':
+                continue
+
+            decl_name = decl.lower_name
+            handler = self.decl_handler(decl_name)
+
+            if handler is default:
+                # fast path of the default method
+                self.declarations[decl_name] = [
+                    token for token in decl.value
+                    if token.type not in ('whitespace', 'literal') ]
+                continue
+
+            self.declarations[decl_name] = []
+            for token in decl.value:
+                handler(self, decl_name, token)
+
+    def parse_css_block(self, css_block):
+        """Parse the content of a CSS rule (the text between the curly brackets).
+
+        Simple blocks (no escapes, no ``!important`` and no ``;`` in strings or
+        functions) are splitted into declarations by string operations and only
+        the values are tokenized by tinycss2.  The tokens of a value are cached,
+        since most values are repeated in a large stylesheet.  All other blocks
+        are parsed by :py:meth:`parse_css_rule`.
+
+        """
+        if not _is_simple_block(css_block):
+            self.parse_css_rule(_Block(tinycss2.parse_component_value_list(css_block)))
+            return
 
-                # parse with method parse_decl_<decl_name>, if this does not
-                # exists, use self.parse_decl
+        self.content = None
+        self.css_block = css_block
+        self.declarations = {}
+        default = CSSRule.parse_decl
+
+        for decl in css_block.split(';'):
+            decl_name, colon, value = decl.partition(':')
+            decl_name = decl_name.strip()
+            if not colon or not _DECL_NAME_RE.fullmatch(decl_name):
+                if decl.strip():
+                    log.warning("CSS: ignore invalid declaration: %s", decl.strip())
+                continue
+
+            decl_name = decl_name.lower()
+            handler = self.decl_handler(decl_name)
+            tokens, values = _parse_value(value.strip())
 
-                method_name = re.sub('[^a-zA-Z0-9]', '_', decl_name)
-                parse_method = getattr(
-                    # pylint: disable=consider-using-f-string
-                    self, 'parse_decl_%s' % method_name, self.parse_decl
-                )
-                parse_method(decl_name, token)
+            if handler is default:
+                self.declarations[decl_name] = list(values)
+                continue
+
+            self.declarations[decl_name] = []
+            for token in tokens:
+                handler(self, decl_name, token)
 
     def parse_decl(self, decl_name, token):
         """Default method to parse declarations."""
@@ -299,3 +543,120 @@ class FontFaceRule(AtRule):
         if decl is not None:
             ret_val = [ token.serialize() for token in decl ]
         return ', '.join(ret_val)
+
+    def descriptors(self):
+        """Returns a dictionary with the values (strings) of the descriptors
+        :py:obj:`FONT_FACE_DESCRIPTORS` (e.g. ``{'font-weight': '400'}``)."""
+        ret_val = {}
+        for name in FONT_FACE_DESCRIPTORS:
+            decl = self.declarations.get(name)
+            if decl:
+                ret_val[name] = ' '.join(token.serialize() for token in decl)
+        return ret_val
+
+    def record(self):
+        """Returns a compact (JSON serializable) record of the rule.
+
+        The record is a list ``[font-family, src-url, src-format, src-local,
+        unicode-range, descriptors]``, to restore the rule use
+        :py:class:`FontFaceRecord`.
+
+        """
+        src = self.src()
+        return [
+            self.font_family(), src['url'], src['format'], src['local'], self.unicode_range()
+            , self.descriptors() ]
+
+
+class FontFaceRecord:
+    """A ``@font-face`` rule restored from a :py:meth:`FontFaceRule.record`.
+
+    Has the same accessors as :py:class:`FontFaceRule`, but no declarations
+    (no tokens).
+
+    """
+    rule_name = FontFaceRule.rule_name
+
+    __slots__ = ('css_url', '_record')
+
+    def __init__(self, css_url, record):
+        self.css_url = css_url
+        self._record = record
+
+    def font_family(self):
+        """see :py:meth:`FontFaceRule.font_family`"""
+        return self._record[0]
+
+    def src(self):
+        """see :py:meth:`FontFaceRule.src`"""
+        return {'url': self._record[1], 'format': self._record[2], 'local': self._record[3]}
+
+    def unicode_range(self):
+        """see :py:meth:`FontFaceRule.unicode_range`"""
+        return self._record[4]
+
+    def descriptors(self):
+        """see :py:meth:`FontFaceRule.descriptors`"""
+        # records of older releases have no descriptors
+        return self._record[5] if len(self._record) > 5 else {}
+
+    def record(self):
+        """see :py:meth:`FontFaceRule.record`"""
+        return self._record
+
+
+def _css_string(value):
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+def font_face_css(faces, formats=None):
+    """Returns (minified) ``@font-face`` rules of the font ``faces``.
+
+    The faces of a family with the same descriptors and unicode range are the
+    same face in different formats, they are merged into one rule, the ``src``
+    list of the rule is ordered by the formats.  A face whose format is already
+    in the ``src`` list of the rule gets a rule of its own (e.g. two weights of
+    a family without a ``font-weight`` descriptor).
+
+    :param faces: iterable of ``(font-family, url, format, unicode-range,
+        descriptors)`` tuples, ``descriptors`` is a dictionary (see
+        :py:meth:`FontFaceRule.descriptors`)
+    :param formats: list of the formats, most preferred first, faces in other
+        formats are dropped (default: :py:obj:`FONT_FORMAT_ORDER`, other formats
+        are appended)
+    :rtype: str
+    """
+    order = list(formats or FONT_FORMAT_ORDER)
+    rules = []
+    merge = {}
+    for family, url, fmt, unicode_range, descriptors in faces:
+        fmt = (fmt or '').split(',')[0]
+        if formats is not None and fmt not in order:
+            continue
+        key = (family, unicode_range or '', tuple(sorted((descriptors or {}).items())))
+        for src in merge.setdefault(key, []):
+            if fmt not in src:
+                src[fmt] = url
+                break
+        else:
+            src = {fmt: url}
+            merge[key].append(src)
+            rules.append((key, src))
+
+    def rank(fmt):
+        return order.index(fmt) if fmt in order else len(order)
+
+    css = []
+    for (family, unicode_range, descriptors), src in rules:
+        src_list = []
+        for fmt in sorted(src, key=rank):
+            item = f"url({src[fmt]})"
+            if fmt:
+                item += f" format({_css_string(fmt)})"
+            src_list.append(item)
+        decl = [f"font-family:{_css_string(family)}"]
+        decl.extend(f"{name}:{value}" for name, value in descriptors)
+        decl.append("src:" + ",".join(src_list))
+        if unicode_range:
+            decl.append(f"unicode-range:{unicode_range.replace(', ', ',')}")
+        css.append("@font-face{" + ";".join(decl) + "}\n")
+    return "".join(css)
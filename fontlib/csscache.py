@@ -0,0 +1,361 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Cache of CSS (stylesheet) responses and their parsed ``@font-face`` rules.
+
+A CSS source is identified by its URL.  For each source, the validators of the
+responses (``ETag``, ``Last-Modified``), the time of the last fetch and a hash
+of the content are stored in the table ``css_source``
+(:py:class:`CSSSource`).  The parsed ``@font-face`` rules of a content are
+stored in a compact form (see :py:meth:`.css.FontFaceRule.record`) in a file
+named by the content hash.
+
+When the rules of a source are requested (:py:meth:`CSSCache.at_rules`):
+
+1. Within the TTL of a ``http:`` or ``https:`` source, the rules are taken from
+   the cache without any request.
+
+2. Otherwise the responses are revalidated by conditional requests
+   (``If-None-Match``, ``If-Modified-Since``).  If none of the responses has
+   been modified, the rules are taken from the cache.
+
+3. Otherwise the CSS is parsed (see :py:func:`.css.parse_css_bytes`) and the
+   rules are stored under the hash of the new content.
+
+"""
+
+__all__ = [
+    'CSSSource'
+    , 'CSSCache'
+    , 'NoCSSCache'
+    , 'SimpleCSSCache'
+    , 'iter_css_responses'
+    , 'fetch_css'
+]
+
+import os
+import json
+import time
+import hashlib
+import logging
+from urllib.parse import urlparse
+
+from sqlalchemy import Column, String, Float, Text
+
+from .db import FontLibSchema
+from .db import TableUtilsMixIn
+from .db import fontlib_session
+from .css import FontFaceRule
+from .css import FontFaceRecord
+from .css import iter_css_at_rules
+from .css import parse_css_bytes
+from .googlefont import is_google_font_url
+from .googlefont import google_font_css_requests
+from .transport import get_transport
+
+log = logging.getLogger(__name__)
+
+class CSSSource(FontLibSchema, TableUtilsMixIn):  # pylint: disable=too-few-public-methods
+    """A CSS source (stylesheet) in the :py:class:`CSSCache`"""
+
+    __tablename__ = 'css_source'
+
+    url = Column(String(1024), primary_key=True)
+    """The URL of the stylesheet"""
+
+    validators = Column(Text)
+    """JSON object with the validators (``ETag``, ``Last-Modified``) of each
+    response, the key is the font format of a google CSS request or an empty
+    string"""
+
+    content_hash = Column(String(40))
+    """SHA1 hash of the content (the parsed rules are stored under this name)"""
+
+    fetched = Column(Float)
+    """Time (seconds since the epoch) of the last fetch or revalidation"""
+
+    def __repr__(self):
+        # pylint: disable=consider-using-f-string
+        return "<CSSSource %(url)s (%(content_hash)s)>" % self.__dict__
+
+
+def _css_requests(css_url):
+    if is_google_font_url(css_url):
+        return google_font_css_requests(css_url)
+    return [('', {})]
+
+def _validators(resp):
+    return {
+        'etag': resp.headers.get('ETag')
+        , 'last-modified': resp.headers.get('Last-Modified')
+    }
+
+def _not_modified(resp, validators):
+    if resp.status == 304:
+        return True
+    if not validators or resp.status != 200:
+        return False
+    # servers (and file: URLs) which do not support conditional requests
+    etag = resp.headers.get('ETag')
+    if etag and etag == validators.get('etag'):
+        return True
+    last_modified = resp.headers.get('Last-Modified')
+    if not etag and last_modified and last_modified == validators.get('last-modified'):
+        return True
+    return False
+
+
+def iter_css_responses(css_url, validators, chunksize=65536, prefetched=None):
+    """Stream the CSS from ``css_url``, the validators of the responses are
+    stored in dict ``validators`` (see :py:attr:`CSSSource.validators`).
+
+    Responses already read by :py:meth:`CSSCache.revalidate` are passed in
+    ``prefetched`` (``{key: (validators, content)}``) and are not requested
+    again.
+
+    :rtype: generator of bytes
+    :return: chunks of the (concatenated) responses
+    """
+    prefetched = prefetched or {}
+    for key, headers in _css_requests(css_url):
+        if key in prefetched:
+            validators[key], content = prefetched[key]
+            yield content
+        else:
+            with get_transport().get(css_url, headers=headers) as resp:
+                if not resp.ok:
+                    raise ConnectionError(f'HTTP {resp.status} : {css_url}')
+                validators[key] = _validators(resp)
+                yield from resp.iter_content(chunksize)
+        # the responses are concatenated
+        yield b'\n'
+
+def fetch_css(css_url, state, prefetched=None):
+    """Stream the CSS from ``css_url``.
+
+    The content is hashed chunk by chunk, when the stream is exhausted the
+    cache state of the CSS source (see :py:meth:`CSSCache.lookup`) is stored in
+    dict ``state``.
+
+    :rtype: generator of bytes
+    :return: chunks of the CSS (see :py:func:`iter_css_responses`)
+    """
+    validators = {}
+    hasher = hashlib.sha1()
+    for chunk in iter_css_responses(css_url, validators, prefetched=prefetched):
+        hasher.update(chunk)
+        yield chunk
+    state.update({
+        'validators': validators
+        , 'content_hash': hasher.hexdigest()
+        , 'fetched': time.time()
+    })
+
+
+class CSSCache:
+    """Abstract cache of CSS sources and their parsed ``@font-face`` rules.
+
+    Beside :py:meth:`at_rules`, the cache has a API for fetching and parsing
+    outside of the cache (e.g. in threads, see :py:mod:`.ingest`):
+    :py:meth:`lookup` and :py:meth:`update` need an active session (see
+    :py:func:`.db.fontlib_scope`), :py:meth:`revalidate` does not use the
+    database and can be called from any thread.
+
+    """
+
+    def __init__(self):
+        self.init_ok = False
+
+    def init(self, config):
+        """Init cache from :py:class:`fontlib.config.Config` object"""
+        raise NotImplementedError
+
+    def at_rules(self, css_url):
+        """Returns a generator of the ``@font-face`` rules from ``css_url``.
+
+        :param str css_url: URL of the CSS (stylesheet) file
+        :rtype: generator of :py:class:`.css.FontFaceRule` or
+            :py:class:`.css.FontFaceRecord`
+
+        """
+        raise NotImplementedError
+
+    def lookup(self, css_url):  # pylint: disable=unused-argument
+        """Returns the state of ``css_url`` in the cache or ``None``.
+
+        The state is a dict with the items ``validators``, ``content_hash`` and
+        ``fetched`` (see :py:class:`CSSSource`).
+        """
+        return None
+
+    def is_fresh(self, css_url, state):  # pylint: disable=unused-argument
+        """``True`` if the cached rules of ``css_url`` can be used without any
+        request to the origin."""
+        return False
+
+    def revalidate(self, css_url, state):  # pylint: disable=unused-argument
+        """Returns the cached rules (list of :py:class:`.css.FontFaceRecord`) if
+        ``state`` is still valid, otherwise ``None``.
+
+        If the source has been revalidated at the origin, item ``dirty`` is set
+        in the ``state``, the state needs to be :py:meth:`update`'d.  If the
+        source has been modified, the responses already read are stored in item
+        ``prefetched`` of the ``state`` (see :py:func:`fetch_css`).
+        """
+        return None
+
+    def store(self, css_url, state, rules):
+        """Store the parsed ``rules`` of the content of ``state``.  Does not use
+        the database and can be called from any thread, :py:meth:`update`
+        stores the ``state`` (a :py:meth:`revalidate` with the new state finds
+        the rules)."""
+
+    def update(self, css_url, state, rules=None):
+        """Store ``state`` of ``css_url`` and the parsed ``rules`` of its content."""
+
+
+class NoCSSCache(CSSCache):
+    """A dummy cache which never caches"""
+
+    def init(self, config):
+        self.init_ok = True
+
+    def at_rules(self, css_url):
+        return iter_css_at_rules(css_url, FontFaceRule)
+
+
+class SimpleCSSCache(CSSCache):
+    """Simple CSS cache
+
+    The parsed rules are stored in folder ``[DEFAULT]<workspace>/csscache`` in
+    your <workspace>.  The TTL (seconds) of a ``http:`` or ``https:`` source is
+    taken from the configuration::
+
+        [css cache]
+        ttl = 86400
+
+    """
+
+    RULES_SUFFIX = '.v2.json'
+    """Suffix of the files with the parsed rules, changes when the record of a
+    rule has been changed (see :py:meth:`.css.FontFaceRule.record`)"""
+
+    def __init__(self):
+        super().__init__()
+        self.root = None
+        self.ttl = 0
+
+    def init(self, config):
+        if self.init_ok:
+            return
+        self.root = config.getpath('DEFAULT', 'workspace') / 'csscache'
+        self.ttl = config.getfloat('css cache', 'ttl', fallback=86400)
+        log.info("init SimpleCSSCache at: %s (TTL %ss)", self.root, self.ttl)
+        self.root.makedirs()
+        self.init_ok = True
+
+    def fname_by_hash(self, content_hash):
+        """Return file name of the parsed rules of content ``content_hash``"""
+        if self.root is None:
+            raise ValueError("cache not yet inited!")
+        return self.root / content_hash + self.RULES_SUFFIX
+
+    def load_rules(self, css_url, content_hash):
+        """Load the parsed rules of content ``content_hash``, returns ``None`` if
+        they are not in the cache."""
+        fname = self.fname_by_hash(content_hash)
+        if not fname.EXISTS:
+            return None
+        with open(fname, encoding='utf-8') as f:
+            records = json.load(f)
+        return [FontFaceRecord(css_url, record) for record in records]
+
+    def save_rules(self, content_hash, rules):
+        """Store the parsed rules of content ``content_hash``"""
+        fname = self.fname_by_hash(content_hash)
+        with open(fname + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump([rule.record() for rule in rules], f, separators=(',', ':'))
+        os.replace(fname + '.tmp', fname)
+
+    def at_rules(self, css_url):
+        state = self.lookup(css_url)
+        rules = self.revalidate(css_url, state)
+        if rules is not None:
+            if state.get('dirty'):
+                self.update(css_url, state)
+            yield from rules
+            return
+
+        prefetched = state.get('prefetched') if state else None
+        state = {}
+        rules = []
+        for rule in parse_css_bytes(fetch_css(css_url, state, prefetched), css_url, FontFaceRule):
+            rules.append(rule)
+            yield rule
+        self.update(css_url, state, rules)
+
+    def lookup(self, css_url):
+        source = fontlib_session().query(CSSSource).get(css_url)
+        if source is None:
+            return None
+        return {
+            'validators': json.loads(source.validators or '{}')
+            , 'content_hash': source.content_hash
+            , 'fetched': source.fetched or 0
+        }
+
+    def is_fresh(self, css_url, state):
+        return (
+            state is not None
+            and urlparse(css_url).scheme in ('http', 'https')
+            and time.time() - state['fetched'] < self.ttl
+            and self.fname_by_hash(state['content_hash']).EXISTS )
+
+    def revalidate(self, css_url, state):
+        if state is None or not self.fname_by_hash(state['content_hash']).EXISTS:
+            return None
+
+        if self.is_fresh(css_url, state):
+            log.debug("css cache: TTL hit %s", css_url)
+            return self.load_rules(css_url, state['content_hash'])
+
+        validators = state['validators']
+        prefetched = None
+        for key, headers in _css_requests(css_url):
+            headers = dict(headers)
+            if prefetched is None:
+                _ = validators.get(key) or {}
+                if _.get('etag'):
+                    headers['If-None-Match'] = _['etag']
+                if _.get('last-modified'):
+                    headers['If-Modified-Since'] = _['last-modified']
+            with get_transport().get(css_url, headers=headers) as resp:
+                if prefetched is None and _not_modified(resp, validators.get(key)):
+                    continue
+                if prefetched is None:
+                    log.debug("css cache: modified %s (%s)", css_url, key)
+                    prefetched = {}
+                # keep the content, the remaining responses are requested
+                # unconditionally
+                if resp.ok:
+                    prefetched[key] = (_validators(resp), resp.content)
+        if prefetched is not None:
+            state['prefetched'] = prefetched
+            return None
+
+        log.debug("css cache: not modified %s", css_url)
+        state['fetched'] = time.time()
+        state['dirty'] = True
+        return self.load_rules(css_url, state['content_hash'])
+
+    def store(self, css_url, state, rules):
+        if not self.fname_by_hash(state['content_hash']).EXISTS:
+            log.debug("css cache: store %s rules of %s (%s)", len(rules), css_url, state['content_hash'])
+            self.save_rules(state['content_hash'], rules)
+
+    def update(self, css_url, state, rules=None):
+        if rules is not None:
+            self.store(css_url, state, rules)
+        fontlib_session().merge(CSSSource(
+            url = css_url
+            , validators = json.dumps(state['validators'])
+            , content_hash = state['content_hash']
+            , fetched = state['fetched'] ))
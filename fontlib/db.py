@@ -16,12 +16,29 @@ __all__ = [
     , 'FONTLIB_SESSION'
     , 'FONTLIB_ACTIVE_SESSION'
     , 'FONTLIB_SESSIONMAKER'
+    , 'SQLITE_PRAGMAS'
+    , 'engine_options'
+    , 'sqlite_pragmas'
+    , 'init_sqlite_pragmas'
+    , 'active_session'
+    , 'SCHEMA_MODULES'
+    , 'SchemaVersion'
+    , 'schema_version'
+    , 'init_schema'
 ]
 
+import re
+import hashlib
 import logging
+import importlib
+import contextvars
 from contextlib import contextmanager
 
+from sqlalchemy import Column, String
 from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy import inspect
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import scoped_session
 from sqlalchemy.ext.declarative import declarative_base
@@ -30,9 +47,11 @@ log = logging.getLogger(__name__)
 
 FontLibSchema = declarative_base()
 FONTLIB_SESSION = None
-"""Session class
+"""Session class (a scoped_session_ of :py:obj:`FONTLIB_SESSIONMAKER`)
 
-The global session class is inited by :py:func:`fontlib_init`
+The global session class is inited by :py:func:`fontlib_init`.  Fontlib itself
+does not use it (see :py:func:`fontlib_scope`), it is kept for applications
+which use a thread-local session.
 
 """
 
@@ -48,31 +67,195 @@ The global session maker is inited by :py:func:`fontlib_init`
 
 """
 
-FONTLIB_ACTIVE_SESSION = None
-"""active session of DB ``fontlib``
-
-The surrounding process (or thread) sets the active session, for details see
-:py:func:`fontlib_scope` and :py:func:`fontlib_session`
-
-"""
+_ACTIVE_SESSION = contextvars.ContextVar('fontlib_active_session', default=None)
+
+def __getattr__(name):
+    # FONTLIB_ACTIVE_SESSION is no longer a module global, the active session
+    # is local to the context (thread, asyncio task)
+    if name == 'FONTLIB_ACTIVE_SESSION':
+        return _ACTIVE_SESSION.get()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+SCHEMA_MODULES = [
+    'fontlib.font'
+    , 'fontlib.urlcache'
+    , 'fontlib.csscache'
+    , 'fontlib.googlefont'
+    , 'fontlib.mirror'
+    , 'fontlib.sources'
+]
+"""Modules with the ORM classes of the schema, imported by :py:func:`init_schema`"""
+
+class SchemaVersion(FontLibSchema):  # pylint: disable=too-few-public-methods
+    """Version of the schema in the DB (see :py:func:`init_schema`)"""
+
+    __tablename__ = 'schema_version'
+
+    name = Column(String(80), primary_key=True)
+    """Name of the schema"""
+
+    version = Column(String(40), nullable=False)
+    """Hash of the schema (see :py:func:`schema_version`)"""
+
+    def __repr__(self):
+        # pylint: disable=consider-using-f-string
+        return "<SchemaVersion %(name)s %(version)s>" % self.__dict__
+
+def schema_version(metadata=None):
+    """Returns a hash of the tables and columns in the ``metadata`` (default:
+    metadata of :py:obj:`FontLibSchema`)."""
+    if metadata is None:
+        metadata = FontLibSchema.metadata
+    _ = hashlib.sha1()
+    for table in sorted(metadata.tables.values(), key=lambda t: t.name):
+        _.update(table.name.encode('utf-8'))
+        for col in table.columns:
+            _.update(f"|{col.name}:{col.type!r}:{col.primary_key}:{col.nullable}".encode('utf-8'))
+    return _.hexdigest()
+
+def _add_columns(conn):
+    inspector = inspect(conn)
+    for table in FontLibSchema.metadata.sorted_tables:
+        existing = {col['name'] for col in inspector.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in existing or col.primary_key or not col.nullable:
+                continue
+            log.info("init_schema: add column %s.%s", table.name, col.name)
+            conn.execute(text(
+                f'ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(conn.dialect)}'))
+
+def init_schema(conn):
+    """Create the schema (see :py:obj:`SCHEMA_MODULES`) in the DB of connection
+    ``conn``.
+
+    :py:class:`sqlalchemy.schema.MetaData.create_all` inspects each table in
+    the DB, this is skipped when the :py:class:`SchemaVersion` stored in the DB
+    matches the :py:func:`schema_version`.  Returns ``True`` if the schema has
+    been created (updated).
+
+    ``create_all`` does not alter existing tables: a (nullable) column which
+    has been added to the model is added to the table by ``ALTER TABLE``.
+    """
+    for name in SCHEMA_MODULES:
+        importlib.import_module(name)
+    version = schema_version()
+    table = SchemaVersion.__table__
+
+    if inspect(conn).has_table(table.name):
+        stored = conn.execute(
+            table.select().where(table.c.name == 'fontlib')).first()
+        if stored is not None and stored.version == version:
+            log.debug("init_schema: schema version %s is up to date", version)
+            return False
+
+    log.debug("init_schema: create_all of %s (version %s)",  FontLibSchema, version)
+    # https://docs.sqlalchemy.org/en/13/core/metadata.html#creating-and-dropping-database-tables
+    FontLibSchema.metadata.create_all(conn)
+    _add_columns(conn)
+    conn.execute(table.delete().where(table.c.name == 'fontlib'))
+    conn.execute(table.insert().values(name='fontlib', version=version))
+    return True
+
+SQLITE_PRAGMAS = {
+    # pragma:        (option in section [db], type)
+    'journal_mode': ('sqlite journal mode', str)
+    , 'synchronous': ('sqlite synchronous', str)
+    , 'cache_size': ('sqlite cache size', int)
+    , 'mmap_size': ('sqlite mmap size', int)
+    , 'busy_timeout': ('sqlite busy timeout', int)
+}
+"""SQLite pragmas applied on each connection, configured in section ``[db]``"""
+
+def engine_options(config, connector):
+    """Returns keyword arguments of :py:func:`sqlalchemy.create_engine` configured
+    in section ``[db]`` of the ``config``.
+
+    .. code-block:: ini
+
+       [db]
+       pool size = 5
+       max overflow = 10
+       echo = false
+       query cache size = 500
+
+    The options of the pool are not passed to a SQLite in-memory database, its
+    (single) connection is bound to the thread.
+    """
+    options = {
+        'echo': config.getboolean('db', 'echo', fallback=False)
+        , 'query_cache_size': config.getint('db', 'query cache size', fallback=500)
+    }
+    if not (connector.startswith('sqlite') and ':memory:' in connector):
+        options['pool_size'] = config.getint('db', 'pool size', fallback=5)
+        options['max_overflow'] = config.getint('db', 'max overflow', fallback=10)
+    return options
+
+def sqlite_pragmas(config):
+    """Returns list of the ``PRAGMA`` statements configured in section ``[db]``
+    (see :py:obj:`SQLITE_PRAGMAS`).
+
+    .. code-block:: ini
+
+       [db]
+       sqlite journal mode = wal
+       sqlite synchronous = normal
+       sqlite cache size = -20000
+       sqlite mmap size = 268435456
+       sqlite busy timeout = 5000
+
+    In WAL mode readers do not block the writer and the writer does not block
+    the readers (e.g. a ``fontlib list`` while a ``fontlib workspace init`` is
+    running).  A pragma with an empty value is not set.
+    """
+    ret_val = []
+    for pragma, (option, _type) in SQLITE_PRAGMAS.items():
+        value = config.get('db', option, fallback='').strip()
+        if not value:
+            continue
+        if _type is int:
+            value = int(value)
+        elif not re.match(r'^[A-Za-z_]+$', value):
+            raise ValueError(f"invalid value of [db] {option}: {value}")
+        ret_val.append(f"PRAGMA {pragma} = {value}")
+    return ret_val
+
+def init_sqlite_pragmas(engine, config):
+    """Set the :py:func:`sqlite_pragmas` on each new connection of a SQLite
+    ``engine`` (a engine of an other dialect is not touched)."""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(config)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):  # pylint: disable=unused-argument
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
 
 def fontlib_init(config):
     """Init DB engine configured in config.ini ``[DEFAULT]:fontlib_db``
 
     1. Create a DB connector to database ``[DEFAULT]:fontlib_db``
 
-    2. Create a engine with this connector in :py:obj:`FONTLIB_ENGINE`
+    2. Create a engine with this connector in :py:obj:`FONTLIB_ENGINE`, the
+       engine is tuned by the options of section ``[db]`` (see
+       :py:func:`engine_options` and :py:func:`sqlite_pragmas`).
 
     3. Create a session maker in :py:obj:`FONTLIB_SESSIONMAKER`
 
-    4. Create DB schema by calling :py:class:`sqlalchemy.schema.MetaData.create_all`
+    4. Create DB schema by calling :py:class:`sqlalchemy.schema.MetaData.create_all`,
+       skipped when the schema version in the DB is up to date (see
+       :py:func:`init_schema`)
 
-    5. Create a session class in :py:obj:`FONTLIB_SESSION`.
+    5. Create a session class in :py:obj:`FONTLIB_SESSION` (not used by
+       fontlib).
 
     .. hint::
 
        The :py:obj:`FONTLIB_SESSION` is a scoped_session_, about session
-       management (transactions) in application's code see :py:func:`fontlib_scope`.
+       management (transactions) in fontlib and application's code see
+       :py:func:`fontlib_scope`.
 
     """
     global FONTLIB_ENGINE, FONTLIB_SESSIONMAKER, FONTLIB_SESSION  # pylint: disable=global-statement
@@ -84,11 +267,13 @@ def fontlib_init(config):
     log.debug("init_fontlib: create engine connected to DB: %s", fontlib_connector)
     # https://docs.sqlalchemy.org/orm/tutorial.html#connecting
     # https://docs.sqlalchemy.org/core/engines.html
-    FONTLIB_ENGINE = create_engine(fontlib_connector)
+    FONTLIB_ENGINE = create_engine(
+        fontlib_connector, **engine_options(config, fontlib_connector))
 
-    log.debug("fontlib_db: init schema (create_all) of %s",  FontLibSchema)
-    # https://docs.sqlalchemy.org/en/13/core/metadata.html#creating-and-dropping-database-tables
-    FontLibSchema.metadata.create_all(FONTLIB_ENGINE)
+    init_sqlite_pragmas(FONTLIB_ENGINE, config)
+
+    with FONTLIB_ENGINE.begin() as conn:
+        init_schema(conn)
 
     # https://docs.sqlalchemy.org/en/13/orm/contextual.html#unitofwork-contextual
     log.debug("fontlib_db: create sessionmaker binded to engine: %s", FONTLIB_ENGINE)
@@ -104,8 +289,24 @@ def fontlib_init(config):
 def fontlib_scope():
     """Provide a (new) transactional scope for on 'fontlib' DB.
 
-    Creates a instance of :py:obj:`FONTLIB_SESSION`, stores it under the global
-    name :py:obj:`FONTLIB_ACTIVE_SESSION` and yield it.
+    Creates a new session (:py:obj:`FONTLIB_SESSIONMAKER`), stores it as the
+    active session of the current context and yield it.  The active session is
+    stored in a :py:class:`contextvars.ContextVar`: each thread (e.g. a worker
+    of a thread pool) and each asyncio task which opens its own scope gets its
+    own session and transaction.
+
+    A scope which is opened in a context that already has an active session (a
+    nested scope) yields the active session, the transaction is committed (or
+    rolled back) and the session is closed by the outermost scope.  Nested
+    scopes do not open concurrent transactions (with SQLite concurrent write
+    transactions end in a "database is locked" error).
+
+    .. hint::
+
+       A session must not be shared between threads.  A thread starts with an
+       empty context, to use the DB a worker thread has to open its own scope.
+       A SQLite in-memory DB (``sqlite:///:memory:``) is bound to the thread
+       which opened the connection, use a file DB for multi-threaded access.
 
     .. hint::
 
@@ -152,32 +353,56 @@ def fontlib_scope():
             fontlib_session().add(font)
 
     """
-    global FONTLIB_ACTIVE_SESSION # pylint: disable=global-statement
-
     # https://docs.sqlalchemy.org/en/13/orm/contextual.html#unitofwork-contextual
+    session = _ACTIVE_SESSION.get()
+    if session is not None:
+        log.debug("fontlib_scope: nested scope, use active session")
+        yield session
+        return
+
     log.debug("fontlib_scope: START transactional scope")
-    FONTLIB_ACTIVE_SESSION = FONTLIB_SESSION()
+    session = FONTLIB_SESSIONMAKER()
+    token = _ACTIVE_SESSION.set(session)
     try:
-        yield FONTLIB_ACTIVE_SESSION
+        yield session
         log.debug("fontlib_scope: COMMIT transactional scope")
-        FONTLIB_ACTIVE_SESSION.commit()
+        session.commit()
 
     except:
         log.debug("fontlib_scope: ROLLBACK transactional scope")
-        FONTLIB_ACTIVE_SESSION.rollback()
+        session.rollback()
         raise
 
     finally:
         log.debug("fontlib_scope: CLOSE transactional scope")
-        FONTLIB_ACTIVE_SESSION.close()
+        session.close()
+        _ACTIVE_SESSION.reset(token)
 
     log.debug("fontlib_scope: END transactional scope")
 
+@contextmanager
+def active_session(session):
+    """Set ``session`` as the active session of the current context (without a
+    transactional scope), the previous active session is restored on exit.
+
+    E.g. the synchronous session of an :py:class:`sqlalchemy.ext.asyncio.AsyncSession`
+    is set active while functions which use :py:func:`fontlib_session` are
+    called (see :py:func:`.asyncdb.run_sync`).
+    """
+    token = _ACTIVE_SESSION.set(session)
+    try:
+        yield session
+    finally:
+        _ACTIVE_SESSION.reset(token)
+
 def fontlib_session():
     """Returns current active fontlib session (see :py:func:`fontlib_scope`)
 
+    The active session is local to the context (thread or asyncio task), in a
+    context without a :py:func:`fontlib_scope` ``None`` is returned.
+
     """
-    return FONTLIB_ACTIVE_SESSION
+    return _ACTIVE_SESSION.get()
 
 
 class TableUtilsMixIn:
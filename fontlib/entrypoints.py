@@ -0,0 +1,195 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Index of the fonts from python entry points.
+
+Font packages (e.g. from the fonts-python_ project) register a dictionary of
+font files in an entry point (e.g. ``fonts_ttf``)::
+
+    {'Amatic SC Bold': '/usr/lib/python3/site-packages/font_amatic_sc/files/AmaticSC-Bold.ttf', ... }
+
+To read these dictionaries, the distributions have to be scanned and each font
+package has to be imported.  The :py:class:`EntryPointIndex` scans the
+distributions by :py:mod:`importlib.metadata` and stores the font files of
+the entry points in a file (``[fontstack] entry point index``)::
+
+  [fontstack]
+  entry point index = %(workspace)s/entry_points.json
+
+The index is valid as long as the state of the folders in :py:obj:`sys.path`
+has not been changed (a distribution has been installed, updated or removed).
+With a valid index, neither the distributions are scanned nor the font
+packages are imported.  For each entry point, the index has a fingerprint of
+the distributions (name and version) and the names of their font files, the
+fingerprint of an entry point also covers the size and modification time of
+the font files (see :py:meth:`EntryPointIndex.fingerprint`).
+
+"""
+
+__all__ = ['EntryPointIndex', 'site_folders', 'site_state', 'scan_entry_points']
+
+import os
+import sys
+import json
+import hashlib
+import logging
+import threading
+import importlib.metadata
+
+log = logging.getLogger(__name__)
+
+_DIST_SUFFIXES = ('.dist-info', '.egg-info', '.egg-link')
+
+def site_folders():
+    """Returns the folders in :py:obj:`sys.path` which contain distributions
+    (``.dist-info``, ``.egg-info`` or ``.egg-link``)."""
+    folders = []
+    for folder in sys.path:
+        try:
+            with os.scandir(folder or '.') as entries:
+                if any(entry.name.endswith(_DIST_SUFFIXES) for entry in entries):
+                    folders.append(folder or '.')
+        except OSError:
+            continue
+    return folders
+
+def site_state():
+    """Returns a hash of the state (modification time) of the
+    :py:func:`site_folders`.
+
+    Installing, updating or removing a distribution adds or removes a
+    ``.dist-info`` folder, which changes the modification time of the folder
+    the distribution is installed in.  Folders without distributions (e.g. the
+    folder of the script) are not taken into account.
+    """
+    _ = hashlib.sha1(sys.version.encode('utf-8'))
+    for folder in site_folders():
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+        except OSError:
+            continue
+        _.update(f"|{folder}:{mtime}".encode('utf-8'))
+    return _.hexdigest()
+
+def _entry_points(group):
+    eps = importlib.metadata.entry_points()
+    if hasattr(eps, 'select'):
+        return list(eps.select(group=group))
+    # python < 3.10
+    return list(eps.get(group, []))
+
+def _dist_name(entry_point):
+    dist = getattr(entry_point, 'dist', None)  # python < 3.10 has no dist
+    if dist is None:
+        return entry_point.value
+    return f"{dist.metadata['Name']}=={dist.version}"
+
+def scan_entry_points(group):
+    """Scan distributions for entry point ``group`` and load the entry points.
+
+    :return: tuple ``(font_files, fingerprint)``, list of ``[name, file name]``
+        pairs and the SHA1 hash of the distributions (name and version) and
+        the names of the font files
+    """
+    font_files = []
+    dists = []
+    for entry_point in _entry_points(group):
+        log.debug("loading from entry point: %s (%s)", group, entry_point)
+        dists.append(_dist_name(entry_point))
+        font_files.extend([name, file_name] for name, file_name in entry_point.load().items())
+    fingerprint = hashlib.sha1(
+        json.dumps([sorted(dists), font_files]).encode('utf-8')).hexdigest()
+    return font_files, fingerprint
+
+
+class EntryPointIndex:
+    """Font files of the entry points, cached in file ``fname``.
+
+    :param str fname: file name of the index, with ``None`` the index is only
+        held in memory
+
+    The index can be used from concurrent threads (e.g. the fetch stage of the
+    :py:class:`.ingest.IngestPipeline`).
+    """
+
+    def __init__(self, fname=None):
+        self.fname = fname
+        self._lock = threading.Lock()
+        self._state = None
+        self._groups = None
+        self._fingerprints = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Get index instance by configuration ``config``."""
+        return cls(config.getpath('fontstack', 'entry point index', fallback=None))
+
+    def _load(self):
+        state = site_state()
+        if self._state == state:
+            return
+        self._state = state
+        self._groups = {}
+        self._fingerprints = {}
+        if self.fname is None or not os.path.exists(self.fname):
+            return
+        try:
+            with open(self.fname, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError) as exc:
+            log.warning("entry point index %s ignored: %s", self.fname, exc)
+            return
+        if index.get('site state') == state and 'fingerprints' in index:
+            self._groups = index['groups']
+            self._fingerprints = index['fingerprints']
+        else:
+            log.debug("entry point index %s is outdated", self.fname)
+
+    def _save(self):
+        if self.fname is None:
+            return
+        tmp_file = self.fname + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'site state': self._state
+                , 'groups': self._groups
+                , 'fingerprints': self._fingerprints
+            }, f)
+        os.replace(tmp_file, self.fname)
+
+    def _group(self, group):
+        self._load()
+        if group not in self._groups:
+            log.debug("entry point index: scan distributions for %s", group)
+            self._groups[group], self._fingerprints[group] = scan_entry_points(group)
+            self._save()
+
+    def font_files(self, group):
+        """Returns the font files of entry point ``group`` (e.g. ``fonts_ttf``).
+
+        :return: list of ``[name, file name]`` pairs
+        """
+        with self._lock:
+            self._group(group)
+            return self._groups[group]
+
+    def fingerprint(self, group):
+        """Returns the fingerprint of entry point ``group``, the fingerprint
+        changes when a distribution of the entry point is installed, updated or
+        removed or when its font files change.
+
+        A font file which is changed in place does not change the state of the
+        site folders (see :py:func:`site_state`), the size and modification
+        time of the font files are added to the (indexed) fingerprint of
+        :py:func:`scan_entry_points` on each call.
+        """
+        with self._lock:
+            self._group(group)
+            font_files = self._groups[group]
+            _ = hashlib.sha1(self._fingerprints[group].encode('utf-8'))
+        for _name, file_name in font_files:
+            try:
+                stat = os.stat(file_name)
+            except OSError:
+                _.update(f"|{file_name}:-".encode('utf-8'))
+                continue
+            _.update(f"|{file_name}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8'))
+        return _.hexdigest()
@@ -32,6 +32,7 @@ Observer's POV::
 
 __all__ = [
     'init_dispatcher'
+    , 'dispatcher_inited'
     , 'get_event'
     , 'emit'
     , 'add'
@@ -71,6 +72,11 @@ def init_dispatcher(event_cls=None):
     _EVENT_CLASS = event_cls
     _DISPATCHER = {}
 
+def dispatcher_inited():
+    """Returns ``True`` if the global dispatcher has been inited (see
+    :py:func:`init_dispatcher`)."""
+    return _DISPATCHER is not None
+
 def get_event(event_name):
     """Returns a named :py:class:`Event` instance from global event dispatcher.
 
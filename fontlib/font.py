@@ -3,7 +3,15 @@
 
 """
 
-__all__ = ['Font', 'FontAlias', 'FontSrcFormat']
+__all__ = [
+    'Font'
+    , 'FontAlias'
+    , 'FontSrcFormat'
+    , 'guess_format'
+    , 'CatalogVersion'
+    , 'catalog_version'
+    , 'touch_catalog'
+]
 
 from urllib.parse import urlparse
 
@@ -12,18 +20,22 @@ import collections
 import logging
 import base64
 import hashlib
-from sqlalchemy import Column, String
+import time
+import uuid
+from sqlalchemy import Column, String, Float
 from sqlalchemy.schema import ForeignKey
 from sqlalchemy.orm import relationship
 
-import pkg_resources
-
 from .db import FontLibSchema
 from .db import TableUtilsMixIn
-from .css import get_css_at_rules
-from .css import FontFaceRule
+from .db import fontlib_session
+from .entrypoints import EntryPointIndex
+from .utils import lazy_import
 from .utils import lazy_property
 
+# the CSS parser (tinycss2) is imported lazy, when the first CSS is parsed
+css = lazy_import('fontlib.css')
+
 log = logging.getLogger(__name__)
 
 
@@ -45,7 +57,10 @@ _['opentype'] = ('.otf', 'ttf', )    # OpenType --> https://docs.microsoft.com/e
 _['embedded-opentype'] = ('.eot', )  # Embedded OpenType --> https://www.w3.org/Submission/2008/SUBM-EOT-20080305/
 _['svg'] = ('.svg', '.svgz', )       # SVG Font --> https://www.w3.org/TR/SVG11/fonts.html
 
-def _guess_format(src_format_string):
+def guess_format(src_format_string):
+    """Returns the name of the font format (a key of ``FONTFACE_SRC_FORMAT``)
+    of a ``format()`` string or a file suffix (e.g. ``.woff2`` or ``ttf``).
+    Unknown formats are returned in lower case, ``None`` is returned as is."""
     if src_format_string is None:
         return None
 
@@ -69,6 +84,13 @@ def _guess_format(src_format_string):
         src_format_string = found_format
     return src_format_string
 
+# descriptors of a @font-face rule which are stored in the font (descriptor, column)
+_FACE_DESCRIPTORS = (
+    ('font-style', 'font_style')
+    , ('font-weight', 'font_weight')
+    , ('font-stretch', 'font_stretch')
+)
+
 class Font(FontLibSchema, TableUtilsMixIn):
 
     """A font resource identified by URL (ID).
@@ -91,6 +113,15 @@ class Font(FontLibSchema, TableUtilsMixIn):
     unicode_range = Column(String(4098))
     """A string with the value of `CSS @font-face:unicode-range`_"""
 
+    font_style = Column(String(80))
+    """Value of descriptor ``font-style`` (e.g. ``italic``)"""
+
+    font_weight = Column(String(80))
+    """Value of descriptor ``font-weight`` (e.g. ``700``)"""
+
+    font_stretch = Column(String(80))
+    """Value of descriptor ``font-stretch`` (e.g. ``condensed``)"""
+
 
     # https://docs.sqlalchemy.org/orm/backref.html
 
@@ -128,68 +159,104 @@ class Font(FontLibSchema, TableUtilsMixIn):
         # pylint: disable=consider-using-f-string
         return "<Font (%(name)s) id='%(id)s', origin='%(origin)s'>" % self.__dict__
 
+    def descriptors(self):
+        """Returns a dictionary with the descriptors ``font-style``,
+        ``font-weight`` and ``font-stretch`` of the font (e.g. ``{'font-weight':
+        '700'}``), see :py:func:`.css.font_face_css`."""
+        ret_val = {}
+        for name, attr in _FACE_DESCRIPTORS:
+            value = getattr(self, attr)
+            if value:
+                ret_val[name] = value
+        return ret_val
+
+    def set_descriptors(self, descriptors):
+        """Set the descriptors (see :py:meth:`descriptors`) of the font, other
+        descriptors (e.g. ``font-display``) are ignored."""
+        for name, attr in _FACE_DESCRIPTORS:
+            setattr(self, attr, descriptors.get(name))
+
     def match_name(self, name):
         """Returns ``True`` if ``name`` match one of the names"""
-        return self.name == name or name in self.aliases
+        return self.name == name or any(alias.alias_name == name for alias in self.aliases)
 
     @lazy_property
     def format(self):
         """String that represents the format"""
         fmt_list = []
         for row in self.src_formats:
-            fmt = _guess_format(row.src_format)
+            fmt = guess_format(row.src_format)
             fmt_list.append(fmt)
         return ','.join(fmt_list)
 
+    @lazy_property
+    def suffix(self):
+        """File suffix of the (first) format (e.g. ``.woff2``) or an empty
+        string if the format is unknown."""
+        suffixes = FONTFACE_SRC_FORMAT.get((self.format or '').split(',')[0])
+        return suffixes[0] if suffixes else ''
+
     @classmethod
-    def from_entry_point(cls, ep_name):
+    def from_entry_point(cls, ep_name, ep_index=None):
         """Build Font instances from python entry point.
 
         :param ep_name:
             Name of the python entry point (e.g. ``fonts_ttf`` or ``fonts_woff2``)
 
+        :type ep_index:  .entrypoints.EntryPointIndex
+        :param ep_index: index of the font files from the entry points
+            (optional)
+
         :rtype: [fontlib.font.Font]
         :return:
             A generator of :py:class:`Font` instances.
         """
-
-        ep_list = list(pkg_resources.iter_entry_points(ep_name))
-
-        for entry_point in ep_list:
-            log.debug("loading from entry point: %s (%s)", ep_name, entry_point)
-            for name, file_name in entry_point.load().items():
-                src_format = mimetypes.guess_type(file_name)[0]
-                if src_format is not None:
-                    src_format = src_format.split('/')[1]
-                else:
-                    src_format = file_name.split('.')[-1]
-                origin = 'file:' + file_name
-
-                # create font object
-                font = Font(
-                    origin = origin
-                    , name = name
-                )
-                # create font_src_format object and append it to the font
-                font.src_formats.append(
-                    FontSrcFormat(
-                        src_format=src_format))
-
-                yield font
+        if ep_index is None:
+            ep_index = EntryPointIndex()
+
+        for name, file_name in ep_index.font_files(ep_name):
+            src_format = mimetypes.guess_type(file_name)[0]
+            if src_format is not None:
+                src_format = src_format.split('/')[1]
+            else:
+                src_format = file_name.split('.')[-1]
+            origin = 'file:' + file_name
+
+            # create font object
+            font = Font(
+                origin = origin
+                , name = name
+            )
+            # create font_src_format object and append it to the font
+            font.src_formats.append(
+                FontSrcFormat(
+                    src_format=src_format))
+
+            yield font
 
     @classmethod
-    def from_css(cls, css_url):
+    def from_css(cls, css_url, css_cache=None):
         """Get :py:class:`Font` objects from CSS Stylesheet
 
         :type css_url:   str
         :param css_url:  URL of the CSS (stylesheet) file
 
+        :type css_cache: .csscache.CSSCache
+        :param css_cache: cache of the parsed ``@font-face`` rules (optional)
+
+        The ``@font-face`` rules are parsed from the streamed CSS (see
+        :py:func:`.css.iter_css_at_rules`), a font is yielded as soon as its
+        rule has been parsed.
+
         :rtype: [Font]
         :return:
             A generator of :py:class:`Font` instances.
         """
-        at_rules = get_css_at_rules(css_url, FontFaceRule)
-        for rule in at_rules:
+        if css_cache is not None:
+            rules = css_cache.at_rules(css_url)
+        else:
+            rules = css.iter_css_at_rules(css_url, css.FontFaceRule)
+        for rule in rules:
             yield cls.from_at_rule(rule, css_url)
 
     @classmethod
@@ -226,6 +293,7 @@ class Font(FontLibSchema, TableUtilsMixIn):
             , name = font_family
             , unicode_range = unicode_range
         )
+        font.set_descriptors(at_rule.descriptors())
         # create font_src_format object and append it to the font
         font.src_formats.append(
             FontSrcFormat(
@@ -269,3 +337,46 @@ class FontSrcFormat(FontLibSchema, TableUtilsMixIn):
     def __repr__(self):
         # pylint: disable=consider-using-f-string
         return "<FontSrcFormat %(src_format)s>" % self.__dict__
+
+
+class CatalogVersion(FontLibSchema):  # pylint: disable=too-few-public-methods
+    """Version of the font catalog in the DB (see :py:func:`catalog_version`)"""
+
+    __tablename__ = 'catalog_version'
+
+    name = Column(String(80), primary_key=True)
+    """Name of the catalog"""
+
+    version = Column(String(40), nullable=False)
+    """Random ID, changed by :py:func:`touch_catalog`"""
+
+    updated = Column(Float)
+    """Time (seconds since the epoch) of the last change"""
+
+    def __repr__(self):
+        # pylint: disable=consider-using-f-string
+        return "<CatalogVersion %(name)s %(version)s>" % self.__dict__
+
+def catalog_version():
+    """Returns the version of the font catalog (a string).
+
+    The version changes each time a font (or an alias of a font) is added or
+    removed (see :py:func:`touch_catalog`), outputs which are generated from
+    the catalog (e.g. :py:meth:`.fontstack.FontStack.to_css`) can be cached by
+    the version.  Needs an active session (see :py:func:`.db.fontlib_scope`).
+    """
+    obj = fontlib_session().query(CatalogVersion).get('fonts')
+    return '' if obj is None else obj.version
+
+def touch_catalog():
+    """Change the version of the font catalog (see :py:func:`catalog_version`).
+
+    Needs an active session (see :py:func:`.db.fontlib_scope`).
+    """
+    session = fontlib_session()
+    obj = session.get(CatalogVersion, 'fonts')
+    if obj is None:
+        obj = CatalogVersion(name='fonts')
+        session.add(obj)
+    obj.version = uuid.uuid4().hex
+    obj.updated = time.time()
@@ -6,30 +6,61 @@
 __all__ = ['FontStack', 'BUILTINS']
 
 import logging
+import threading
+
 import fspath
+from sqlalchemy import or_
+from sqlalchemy.orm import selectinload
 
 from . import event
+from .config import BUILTINS
 from .db import fontlib_session
 from .font import Font
 from .font import FontAlias
+from .font import catalog_version
+from .font import touch_catalog
 from .urlcache import NoCache
+from .entrypoints import EntryPointIndex
+from .utils import lazy_import
 
-log = logging.getLogger(__name__)
+# the CSS parser (tinycss2), the CSS cache and the ingest pipeline are imported
+# lazy, importing fontlib.api does not import them
+
+css = lazy_import('fontlib.css')
+csscache = lazy_import('fontlib.csscache')
+ingest = lazy_import('fontlib.ingest')
+sources = lazy_import('fontlib.sources')
 
-BUILTINS = fspath.FSPath(__file__).DIRNAME / 'files'
-"""Folder where the builtin fonts are in."""
+log = logging.getLogger(__name__)
 
 class FontStack:
     """A collection of :py:class:`.font.Font` objects"""
 
+    CSS_CACHE_SIZE = 256
+    """Maximal number of stylesheets cached by :py:meth:`to_css`"""
+
     def __init__(self):
         self.cache = NoCache()
+        self.css_cache = csscache.NoCSSCache()
+        self.ep_index = EntryPointIndex()
+        self._css = {}
+        self._css_lock = threading.Lock()
 
     def set_cache(self, cache):
         """set cache"""
         log.debug('set cache: %s', str(cache))
         self.cache = cache
 
+    def set_css_cache(self, css_cache):
+        """set cache of CSS sources (see :py:mod:`.csscache`)"""
+        log.debug('set css cache: %s', str(css_cache))
+        self.css_cache = css_cache
+
+    def set_ep_index(self, ep_index):
+        """set index of the fonts from entry points (see :py:mod:`.entrypoints`)"""
+        log.debug('set entry point index: %s', ep_index.fname)
+        self.ep_index = ep_index
+
     def add_font(self, font):
         """Add :py:class:`.font.Font` object to *this* stack.
 
@@ -44,12 +75,19 @@ class FontStack:
           :py:class:`font <.font.Font>`) is released if the added font is
           detected as an alias.
 
+        The descriptors (:py:meth:`.font.Font.descriptors`) of an existing
+        font are updated.  A new font or alias changes the version of the font
+        catalog (see :py:func:`.font.touch_catalog`).
         """
 
         session = fontlib_session()
         p_obj = font.get_persistent_object(session)
 
         if p_obj:
+            if font.descriptors() and p_obj.descriptors() != font.descriptors():
+                # e.g. the font has been added by a release without descriptors
+                p_obj.set_descriptors(font.descriptors())
+                touch_catalog()
             if p_obj.match_name(font.name):
                 log.info(
                     "Font with identical origin and font name already exists,"
@@ -60,11 +98,13 @@ class FontStack:
                 alias = FontAlias(alias_name = font.name)
                 event.emit('FontStack.add_alias', alias, font)
                 p_obj.aliases.append(alias)
+                touch_catalog()
 
         else:
             event.emit('FontStack.add_font', font)
             log.debug("add font-family: %s", font)
             session.add(font)
+            touch_catalog()
 
         self.cache.add_url(font.origin)
 
@@ -90,7 +130,7 @@ class FontStack:
 
         """
         event.emit('FontStack.load_entry_point', ep_name)
-        for font in Font.from_entry_point(ep_name):
+        for font in Font.from_entry_point(ep_name, self.ep_index):
             self.add_font(font)
 
     def load_css(self, css_url):
@@ -104,10 +144,15 @@ class FontStack:
         - ``FontStack.load_css`` (:py:obj:`css_url <str>`) is released each time
           function is called.
 
+        The CSS is recorded as a registered source of the workspace (see
+        :py:func:`.sources.register_source`).
         """
         event.emit('FontStack.load_css', css_url)
-        for font in Font.from_css(css_url):
+        fonts = []
+        for font in Font.from_css(css_url, self.css_cache):
             self.add_font(font)
+            fonts.append(font)
+        sources.register_source(css_url, fonts)
 
     def list_fonts(self, name=None):
         """Return generator of :py:class:`.font.Font` objects selected by ``name``.
@@ -120,6 +165,71 @@ class FontStack:
             if name is None or font.match_name(name):
                 yield font
 
+    def family_fonts(self, families):
+        """Returns the fonts of the font ``families``, a list of ``(<family>,
+        <font>)`` tuples in the order of the families.
+
+        A font registered by an alias is returned with the alias as family
+        name.  The aliases and formats of the fonts are loaded eager.  Needs an
+        active session (see :py:func:`.db.fontlib_scope`).
+
+        :param families: list of font family names (or aliases)
+        """
+        families = list(families)
+        session = fontlib_session()
+        fonts = session.query(Font).outerjoin(Font.aliases).filter(
+            or_(Font.name.in_(families), FontAlias.alias_name.in_(families))).options(
+                selectinload(Font.aliases), selectinload(Font.src_formats)).distinct().order_by(Font.id)
+        ret_val = []
+        for font in fonts:
+            for name in [font.name] + [alias.alias_name for alias in font.aliases]:
+                if name in families:
+                    ret_val.append((name, font))
+        ret_val.sort(key=lambda item: families.index(item[0]))
+        return ret_val
+
+    def to_css(self, families, formats=None, url_base=None):
+        """Returns a stylesheet (str) with the ``@font-face`` rules of the font
+        ``families``.
+
+        The rules are optimised by :py:func:`.css.font_face_css`: the fonts of
+        a family with the same unicode range are merged into one rule, its
+        ``src:`` list is ordered by the formats and the CSS is minified.  A font
+        registered by an alias is in the rule of the alias name (see
+        :py:meth:`family_fonts`).
+
+        The stylesheet is cached (in memory) by the arguments and the version
+        of the font catalog (see :py:func:`.font.catalog_version`), it is
+        generated again after a font has been added or removed.  Needs an
+        active session (see :py:func:`.db.fontlib_scope`).
+
+        :param families: list of font family names (or aliases)
+        :param formats: list of formats (e.g. ``['woff2', 'woff']``), most
+            preferred first, fonts in other formats are dropped (default: all
+            formats, see :py:obj:`.css.FONT_FORMAT_ORDER`)
+        :param str url_base: with ``None``, the ``src:`` URLs are the origins of
+            the fonts, otherwise the URL of a font is ``<url_base><font
+            ID><suffix>`` (see :py:attr:`.font.Font.suffix`)
+        """
+        families = tuple(families)
+        key = (families, None if formats is None else tuple(formats), url_base)
+        version = catalog_version()
+        cached = self._css.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        faces = []
+        for name, font in self.family_fonts(families):
+            url = font.origin if url_base is None else url_base + font.id + font.suffix
+            faces.append((name, url, font.format, font.unicode_range, font.descriptors()))
+        stylesheet = css.font_face_css(faces, formats)
+
+        with self._css_lock:
+            while len(self._css) >= self.CSS_CACHE_SIZE:
+                del self._css[next(iter(self._css))]
+            self._css[key] = (version, stylesheet)
+        return stylesheet
+
     @classmethod
     def get_fontstack(cls, config):
         """Get fonstack instance by configuration <config>.
@@ -133,10 +243,18 @@ class FontStack:
         cache_obj = cache_cls()
         cache_obj.init(config)
         stack.set_cache(cache_obj)
+
+        css_cache_cls = config.getfqnobj('fontstack', 'css cache', fallback=csscache.NoCSSCache)
+        log.info("get_fontstack: init css cache class %s", css_cache_cls)
+        css_cache_obj = css_cache_cls()
+        css_cache_obj.init(config)
+        stack.set_css_cache(css_cache_obj)
+
+        stack.set_ep_index(EntryPointIndex.from_config(config))
         return stack
 
     @classmethod
-    def init_fontstack(cls, config):
+    def init_fontstack(cls, config, force=False):
         """Init fonstack by configuration <config>.
 
         Register fonts from various resources into the fontlib database.
@@ -160,6 +278,12 @@ class FontStack:
         - ``fonts_woff``
         - ``fonts_woff2``
 
+        The sources are fetched, parsed and added in a pipeline, see
+        :py:class:`.ingest.IngestPipeline`.  Only the sources whose fingerprint
+        has been changed since the last init are processed, the fonts of
+        vanished sources are removed (see :py:mod:`.sources`).  With ``force``
+        all sources are processed.
+
         E.g. to include all fonts from the fonts-python_ project install::
 
             $ pip install font-amatic-sc font-caladea font-font-awesome \\
@@ -170,17 +294,42 @@ class FontStack:
 
         stack = cls.get_fontstack(config)
 
+        # fetch, parse and add the fonts of the changed sources in a pipeline
+        # (see fontlib.ingest and fontlib.sources)
+        return sources.sync_sources(
+            stack, ingest.IngestPipeline.from_config(stack, config), cls.get_sources(config)
+            , force=force)
+
+    @classmethod
+    def get_sources(cls, config):
+        """Returns the sources of the fonts configured in <config>, a list of
+        ``(<source type>, <value>)`` tuples (see
+        :py:meth:`.ingest.IngestPipeline.run`).
+
+        Beside the builtin fonts, each CSS file (``*.css``) in the folders of
+        ``[fontstack]css folders`` is a source.
+        """
+        ret_val = []
+
         # register font files from entry points
         for ep_name in config.getlist('fontstack', 'entry points'):
-            stack.load_entry_point(ep_name)
+            ret_val.append((ingest.SOURCE_ENTRY_POINT, ep_name))
 
         # register builtin fonts
         for name in config.getlist('fontstack', 'builtin fonts'):
             log.debug('register builtin font: %s', name)
             css_file = BUILTINS / name / name + ".css"
-            stack.load_css('file:' + css_file)
+            ret_val.append((ingest.SOURCE_CSS, 'file:' + css_file))
+
+        # register local CSS files
+        for folder in config.getlist('fontstack', 'css folders', fallback=[]):
+            folder = fspath.FSPath(folder).EXPANDUSER.EXPANDVARS.ABSPATH
+            for css_file in sorted(folder.glob('*.css')):
+                ret_val.append((ingest.SOURCE_CSS, 'file:' + css_file))
 
         # register google fonts
         base_url = config.get('google fonts', 'family base url')
         for family in config.getlist('google fonts', 'fonts'):
-            stack.load_css(base_url + family)
+            ret_val.append((ingest.SOURCE_CSS, base_url + family))
+
+        return ret_val
@@ -0,0 +1,170 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Garbage collection of orphaned fonts, DB rows and cache files.
+
+In a long-lived workspace, rows and files are left behind: fonts of sources
+which have been dropped from the configuration before the sources were recorded
+(see :py:mod:`.sources`), ``urlcache_blob`` rows of deleted fonts, BLOBs in the
+URL cache without a row and parsed rules in the CSS cache of outdated CSS.  The
+command::
+
+  fontlib gc --dry-run
+
+reports the garbage of the workspace, without ``--dry-run`` the garbage is
+deleted (see :py:func:`collect_garbage`).  The garbage is selected by a query
+of the IDs of each table and one scan of each cache folder, the rows are
+deleted in bulk.
+
+Orphans are:
+
+fonts
+  Only with ``--include-unsourced``: a font which is not provided by a recorded
+  source (table ``font_source``) and is not an item of the :py:mod:`.mirror`.
+  The CSS registered by ``fontlib google add``, ``fontlib css-parse
+  --register`` and the google fonts proxy is recorded as a source (see
+  :py:func:`.sources.register_source`), but fonts registered before (or by an
+  application which calls :py:meth:`.fontstack.FontStack.add_font`) have no
+  source.  As long as no source has been recorded, no font is an orphan.
+
+aliases, formats, BLOB rows
+  Rows of table ``font_alias``, ``font_src_format`` and ``urlcache_blob``
+  whose font does not exist.
+
+cache files
+  Files in the URL cache without a BLOB row, interrupted downloads (``.part``
+  files older than :py:obj:`PART_FILE_AGE`) and files in the CSS cache whose
+  content is not referred by a CSS source.
+
+"""
+
+__all__ = ['PART_FILE_AGE', 'find_garbage', 'collect_garbage']
+
+import os
+import json
+import time
+import logging
+
+from sqlalchemy import select
+
+from .db import fontlib_session
+from .font import Font
+from .font import FontAlias
+from .font import FontSrcFormat
+from .urlcache import URLBlob
+from .csscache import CSSSource
+from .mirror import MirrorItem
+from .sources import FontSource
+from .sources import delete_fonts
+
+log = logging.getLogger(__name__)
+
+PART_FILE_AGE = 3600
+"""Age (seconds) of a ``.part`` file in the URL cache, when the download is
+considered as interrupted"""
+
+def _scan(folder, keep, part_age=None):
+    """Scan ``folder`` for files whose name is not in ``keep``, returns a list
+    of ``(path, size)`` tuples."""
+    garbage = []
+    if folder is None or not os.path.isdir(folder):
+        return garbage
+    now = time.time()
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False) or entry.name in keep:
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if part_age is not None and entry.name.endswith(('.part', '.tmp')):
+                if now - stat.st_mtime < part_age:
+                    # download in progress
+                    continue
+            garbage.append((entry.path, stat.st_size))
+    return garbage
+
+def find_garbage(stack, include_unsourced=False, part_age=PART_FILE_AGE):
+    """Find the garbage of the workspace.
+
+    Needs an active session (see :py:func:`.db.fontlib_scope`).
+
+    :param stack: :py:class:`.fontstack.FontStack` object of the workspace
+    :param bool include_unsourced: select the fonts which are not provided by
+        a recorded source as garbage (default: no font is garbage)
+    :return: dictionary with the sets of the orphaned font IDs (``fonts``),
+        the IDs of the fonts which are kept (``live``) and the lists of
+        orphaned files (``cache files`` and ``css cache files``)
+    """
+    session = fontlib_session()
+    all_fonts = set(session.scalars(select(Font.id)))
+
+    orphans = set()
+    sources = session.query(FontSource.font_ids).all()
+    if sources and include_unsourced:
+        claimed = set(session.scalars(
+            select(Font.id).where(Font.origin.in_(
+                select(MirrorItem.url).where(MirrorItem.kind == MirrorItem.KIND_BLOB)))))
+        for (font_ids,) in sources:
+            claimed.update(json.loads(font_ids or '[]'))
+        orphans = all_fonts - claimed
+    live = all_fonts - orphans
+
+    blob_ids = set(session.scalars(select(URLBlob.id)))
+    cache_root = getattr(stack.cache, 'root', None)
+    cache_files = _scan(cache_root, blob_ids & live, part_age)
+
+    css_root = getattr(stack.css_cache, 'root', None)
+    css_keep = set()
+    if css_root is not None:
+        css_keep = {
+            stack.css_cache.fname_by_hash(content_hash).BASENAME
+            for content_hash in session.scalars(select(CSSSource.content_hash)) if content_hash }
+    css_cache_files = _scan(css_root, css_keep, part_age)
+
+    return {
+        'fonts': orphans
+        , 'live': live
+        , 'cache files': cache_files
+        , 'css cache files': css_cache_files
+    }
+
+def collect_garbage(stack, dry_run=False, include_unsourced=False, part_age=PART_FILE_AGE):
+    """Find (see :py:func:`find_garbage`) and delete the garbage of the
+    workspace.
+
+    Needs an active session (see :py:func:`.db.fontlib_scope`).
+
+    :param stack: :py:class:`.fontstack.FontStack` object of the workspace
+    :param bool dry_run: only report, don't delete the garbage
+    :param bool include_unsourced: delete the fonts which are not provided by
+        a recorded source (see :py:func:`find_garbage`)
+    :return: dictionary with statistics of the (deleted) garbage
+    """
+    session = fontlib_session()
+    garbage = find_garbage(stack, include_unsourced=include_unsourced, part_age=part_age)
+    live = garbage['live']
+
+    # rows of the fonts and orphaned rows: the IDs of the tables are compared to
+    # the IDs of the fonts which are kept
+    stats = {'dry run': dry_run, 'fonts': len(garbage['fonts'])}
+    for name, table in (('aliases', FontAlias), ('src formats', FontSrcFormat), ('blobs', URLBlob)):
+        stats[name] = sum(1 for font_id in session.scalars(select(table.id)) if font_id not in live)
+    stats['cache files'] = len(garbage['cache files'])
+    stats['cache bytes'] = sum(size for _, size in garbage['cache files'])
+    stats['css cache files'] = len(garbage['css cache files'])
+    stats['css cache bytes'] = sum(size for _, size in garbage['css cache files'])
+
+    if dry_run:
+        log.info("gc (dry run): %s", stats)
+        return stats
+
+    delete_fonts(garbage['fonts'])
+    font_ids = select(Font.id)
+    for table in (FontAlias, FontSrcFormat, URLBlob):
+        session.query(table).filter(table.id.not_in(font_ids)).delete(synchronize_session=False)
+    session.expire_all()
+
+    for path, _ in garbage['cache files'] + garbage['css cache files']:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    log.info("gc: %s", stats)
+    return stats
@@ -2,6 +2,12 @@
 """The :py:obj:`fontlib.googlefont` module serves stuff to manage fonts from
 `fonts.google.com <https://www.google.com/fonts>`__
 
+The metadata of all google font families (:py:obj:`GOOGLE_METADATA_FONTS`) is
+indexed in the table ``google_font_family`` (:py:class:`GoogleFontFamily`) of
+the workspace.  The index is updated when it is older than ``[google fonts]
+metadata ttl`` seconds and the metadata has been modified at the origin (see
+:py:func:`update_font_index`).
+
 """
 
 __all__ = [
@@ -9,11 +15,32 @@ __all__ = [
     , 'GOOGLE_FONT_FORMATS'
     , 'is_google_font_url'
     , 'read_google_font_css'
+    , 'iter_google_font_css'
+    , 'google_font_css_requests'
+    , 'split_google_css_url'
+    , 'google_family_name'
+    , 'batch_google_css_urls'
+    , 'GoogleFontFamily'
+    , 'GoogleMetadata'
+    , 'iter_family_metadata'
+    , 'update_font_index'
+    , 'font_map'
 ]
 
+import re
+import json
+import time
+import codecs
 import logging
+import itertools
 import urllib.parse
-import requests
+
+from sqlalchemy import Column, String, Integer, Float, Boolean, Text
+
+from .db import FontLibSchema
+from .db import TableUtilsMixIn
+from .db import fontlib_session
+from .transport import get_transport
 
 log = logging.getLogger(__name__)
 
@@ -70,25 +97,290 @@ def read_google_font_css(url, format_list=None):
         A list with the formats to fetch (default: ``['woff2', 'ttf', 'svg']``)
 
     :rtype: bytes
-    :return: CSS loaded from URL (request.content)
+    :return: CSS loaded from URL (concatenated responses of all formats)
     """
+    return b''.join(iter_google_font_css(url, format_list))
+
+def iter_google_font_css(url, format_list=None, chunksize=65536):
+    """Stream stylesheet's (CSS) content from ``url``
+
+    For each format in ``format_list`` the CSS is requested (by the
+    ``User-Agent`` of this format) and the response is streamed in chunks of
+    ``chunksize`` bytes.  The responses are streamed one after the other.
 
+    :type url: str
+    :param url: URL of the google CSS, see :py:func:`read_google_font_css`
+
+    :type format_list: list
+    :param format_list:
+        A list with the formats to fetch (default: ``['woff2', 'ttf', 'svg']``)
+
+    :rtype: generator of bytes
+    :return: chunks of the CSS loaded from URL
+    """
+
+    for _font_format, headers in google_font_css_requests(url, format_list):
+        log.debug("request: %s | User-Agent: %s" , url, headers['User-Agent'])
+        with get_transport().get(url, headers=headers, timeout=30) as resp:
+            yield from resp.iter_content(chunksize)
+        # the responses are concatenated
+        yield b'\n'
+
+def google_font_css_requests(url, format_list=None):
+    """Returns the requests needed to read the CSS of all formats from ``url``.
+
+    :rtype: list
+    :return: ``[(<font format>, <request headers>), ...]``
+
+    """
     if not is_google_font_url(url):
         raise ConnectionError(f'{url} is not a google font url matching {GOOGLE_FONTS_HOST}')
 
     if format_list is None:
         format_list = GOOGLE_FONT_FORMATS
 
-    content = b''
+    return [
+        (font_format, {'User-Agent': GOOGLE_USER_AGENTS[font_format]})
+        for font_format in format_list ]
+
+
+def split_google_css_url(url):
+    """Split a google CSS URL which requests a single font family.
+
+    :rtype: tuple
+    :return: ``(<base url>, <family>)`` where ``<family>`` is the (not
+        unquoted) value of the ``family`` argument, or ``None`` if ``url``
+        requests more than one family or has other arguments.
+    """
+    if not is_google_font_url(url):
+        return None
+    base_url, sep, family = url.partition('?family=')
+    if not sep or not family or '|' in family or '&' in family or '%7C' in family.upper():
+        return None
+    return base_url + sep, family
+
+def google_family_name(family):
+    """Name of the font family from the value of a ``family`` argument (e.g.
+    ``Roboto+Slab:400,700`` --> ``Roboto Slab``)"""
+    return urllib.parse.unquote_plus(family).split(':')[0].strip()
+
+def batch_google_css_urls(urls, max_length=2000):
+    """Group google CSS URLs of single font families into multi-family requests.
+
+    The google fonts API serves the ``@font-face`` rules of several families in
+    one stylesheet (``family=A|B|C``).  Consecutive URLs with the same base are
+    joined as long as the length of the joined URL does not exceed
+    ``max_length``.  A family is only once in a batch (the rules of a batch are
+    split back by the name of the family), a URL of a family which is already
+    in the batch starts a new batch.  URLs which can't be joined (see
+    :py:func:`split_google_css_url`) are returned in a batch of their own.  The
+    order of the URLs is kept.
+
+    :rtype: list
+    :return: ``[(<batch url>, [<url>, ...]), ...]``
+    """
+    batches = []
+    batch = None
+    for url in urls:
+        split = split_google_css_url(url)
+        if split is None:
+            batches.append((url, [url]))
+            batch = None
+            continue
+        base_url, family = split
+        name = google_family_name(family).lower()
+        if (batch is not None
+                and batch[3] == base_url
+                and name not in batch[2]
+                and len(batch[0]) + 1 + len(family) <= max_length):
+            batch[0] += '|' + family
+            batch[1].append(url)
+            batch[2].add(name)
+            continue
+        batch = [base_url + family, [url], {name}, base_url]
+        batches.append(batch)
+    return [(batch[0], batch[1]) for batch in batches]
+
+class GoogleFontFamily(FontLibSchema, TableUtilsMixIn):  # pylint: disable=too-few-public-methods
+    """Index of the font families from :py:obj:`GOOGLE_METADATA_FONTS`"""
+
+    __tablename__ = 'google_font_family'
+
+    family = Column(String(255), primary_key=True)
+    """Name of the font family"""
+
+    category = Column(String(80))
+    """Category of the family (e.g. ``Sans Serif``, ``Handwriting``)"""
+
+    noto = Column(Boolean)
+    """The family is (``True``) or is not (``False``) a noto font"""
+
+    popularity = Column(Integer)
+    """Popularity rank of the family (``1`` is the most popular)"""
+
+    subsets = Column(Text)
+    """Comma separated list of the unicode subsets (e.g. ``latin,latin-ext``)"""
+
+    variants = Column(Text)
+    """Comma separated list of the variants (e.g. ``400,400i,700``)"""
+
+    def __repr__(self):
+        # pylint: disable=consider-using-f-string
+        return "<GoogleFontFamily %(family)s (%(category)s)>" % self.__dict__
+
+
+class GoogleMetadata(FontLibSchema, TableUtilsMixIn):  # pylint: disable=too-few-public-methods
+    """State of the metadata document the :py:class:`GoogleFontFamily` index
+    has been build from"""
+
+    __tablename__ = 'google_metadata'
+
+    url = Column(String(1024), primary_key=True)
+    """URL of the metadata document"""
+
+    etag = Column(String(255))
+    """``ETag`` of the last response"""
+
+    last_modified = Column(String(80))
+    """``Last-Modified`` of the last response"""
+
+    fetched = Column(Float)
+    """Time (seconds since the epoch) of the last fetch or revalidation"""
+
+    families = Column(Integer)
+    """Number of indexed families"""
+
+
+_FAMILY_LIST_RE = re.compile(r'"familyMetadataList"\s*:\s*\[')
+_ITEM_SEP_RE = re.compile(r'[\s,]*')
+
+def iter_family_metadata(byte_chunks):
+    """Parse the items of list ``familyMetadataList`` incrementally from the
+    chunks (bytes) of the metadata document.
+
+    Only one item (and the chunk it is in) is hold in memory, the document is
+    never decoded as a whole.
+
+    :rtype: generator of dict
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    in_list = False
+
+    for chunk in itertools.chain(byte_chunks, [None]):
+        eof = chunk is None
+        buf += text_decoder.decode(b'' if eof else chunk, final=eof)
+        pos = 0
+
+        if not in_list:
+            match = _FAMILY_LIST_RE.search(buf)
+            if match is None:
+                if eof:
+                    raise ValueError('metadata: missing list familyMetadataList')
+                # the name of the list may span over chunks
+                buf = buf[-64:]
+                continue
+            in_list = True
+            pos = match.end()
+
+        while True:
+            pos = _ITEM_SEP_RE.match(buf, pos).end()
+            if buf[pos:pos+1] == ']':
+                return
+            try:
+                item, pos_end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # incomplete item, read next chunk
+                if eof:
+                    raise
+                break
+            yield item
+            pos = pos_end
+
+        buf = buf[pos:]
+
+    raise ValueError('metadata: unterminated list familyMetadataList')
+
+def _family_row(item):
+    return {
+        'family':       item['family']
+        , 'category':   item.get('category')
+        , 'noto':       bool(item.get('isNoto'))
+        , 'popularity': item.get('popularity')
+        , 'subsets':    ','.join(item.get('subsets') or [])
+        , 'variants':   ','.join(item.get('fonts') or {})
+    }
+
+def update_font_index(cfg, force=False):
+    """Update the index of google font families (:py:class:`GoogleFontFamily`).
+
+    Within ``[google fonts] metadata ttl`` seconds the index is not updated.
+    Otherwise the metadata (``[google fonts] metadata url``) is revalidated by a
+    conditional request and only if it has been modified, the index is rebuild
+    from the streamed metadata.  If the origin is not available, a existing
+    index is used.
+
+    Needs an active session (see :py:func:`.db.fontlib_scope`).
+
+    :param bool force: ignore TTL and validators of the index
+    :rtype: bool
+    :return: ``True`` if the index has been rebuild
+    """
+    session = fontlib_session()
+    url = cfg.get('google fonts', 'metadata url', fallback=GOOGLE_METADATA_FONTS)
+    ttl = cfg.getfloat('google fonts', 'metadata ttl', fallback=86400)
+    meta = session.query(GoogleMetadata).get(url)
+
     headers = {}
+    if meta is not None and not force:
+        if time.time() - meta.fetched < ttl:
+            return False
+        if meta.etag:
+            headers['If-None-Match'] = meta.etag
+        if meta.last_modified:
+            headers['If-Modified-Since'] = meta.last_modified
 
-    for font_format in format_list:
-        headers['User-Agent'] = GOOGLE_USER_AGENTS[font_format]
-        log.debug("request: %s | User-Agent: %s" , url, headers['User-Agent'])
-        resp = requests.get(url, headers=headers, timeout=30)
-        content += resp.content
-    return content
+    try:
+        resp = get_transport().get(url, headers=headers, timeout=30)
+    except OSError as exc:
+        if meta is None:
+            raise
+        log.warning("google: can't revalidate metadata, use index from %s (%s)"
+                    , time.ctime(meta.fetched), exc)
+        return False
+
+    with resp:
+        if resp.status == 304:
+            log.debug("google: metadata not modified %s", url)
+            meta.fetched = time.time()
+            return False
+        if not resp.ok:
+            raise ConnectionError(f'HTTP {resp.status} : {url}')
 
+        log.debug("google: rebuild index of font families from %s", url)
+        session.query(GoogleFontFamily).delete()
+        seen = set()
+        batch = []
+        for item in iter_family_metadata(resp.iter_content(65536)):
+            if item['family'] in seen:
+                log.error('google: duplicate font-family-name: %s', item['family'])
+                continue
+            seen.add(item['family'])
+            batch.append(_family_row(item))
+            if len(batch) >= 500:
+                session.bulk_insert_mappings(GoogleFontFamily, batch)
+                batch = []
+        session.bulk_insert_mappings(GoogleFontFamily, batch)
+
+        if meta is None:
+            meta = GoogleMetadata(url=url)
+            session.add(meta)
+        meta.etag = resp.headers.get('ETag')
+        meta.last_modified = resp.headers.get('Last-Modified')
+        meta.fetched = time.time()
+        meta.families = len(seen)
+    return True
 
 def font_map(cfg):
     """Return a dictionary of font families from ``fonts.googleapis.com``.
@@ -99,6 +391,9 @@ def font_map(cfg):
             'category':    <str: category name>,
             'noto':        <bool: is noto font>,
             'css_url':     <str: URL>,
+            'popularity':  <int: popularity rank>,
+            'subsets':     <list: unicode subsets>,
+            'variants':    <list: variants>,
     }
 
     ``<str: category name>``:
@@ -114,21 +409,50 @@ def font_map(cfg):
 
     .. _noto font: https://en.wikipedia.org/wiki/Noto_fonts
 
+    With an active session (see :py:func:`.db.fontlib_scope`), the map is build
+    from the index of the workspace (see :py:func:`update_font_index`).
+
     """
     family_map = {}
     base_url = cfg.get('google fonts', 'family base url')
-    with requests.get(GOOGLE_METADATA_FONTS, timeout=30) as resp:
-        if not resp.ok:
-            raise ConnectionError(f'HTTP {resp.status_code} : {GOOGLE_METADATA_FONTS}')
-        family_list = resp.json()['familyMetadataList']
-        for item in family_list:
-            family = item['family']
-            if family in family_map:
-                log.error('google: duplicate font-family-name: %s', family)
-
-            family_map[family] = {
-                'category':   item['category'],
-                'noto':       item['isNoto'],
-                'css_url':    base_url + urllib.parse.quote(family)
-            }
+
+    def add(row):
+        row['css_url'] = base_url + urllib.parse.quote(row['family'])
+        family_map[row.pop('family')] = row
+
+    session = fontlib_session()
+    if session is None:
+        # without DB (e.g. build of the documentation) the metadata is read
+        # from origin
+        url = cfg.get('google fonts', 'metadata url', fallback=GOOGLE_METADATA_FONTS)
+        with get_transport().get(url, timeout=30) as resp:
+            if not resp.ok:
+                raise ConnectionError(f'HTTP {resp.status} : {url}')
+            for item in iter_family_metadata(resp.iter_content(65536)):
+                if item['family'] in family_map:
+                    log.error('google: duplicate font-family-name: %s', item['family'])
+                add({
+                    'family':       item['family']
+                    , 'category':   item.get('category')
+                    , 'noto':       bool(item.get('isNoto'))
+                    , 'popularity': item.get('popularity')
+                    , 'subsets':    list(item.get('subsets') or [])
+                    , 'variants':   list(item.get('fonts') or {})
+                })
+        return family_map
+
+    update_font_index(cfg)
+    columns = (
+        GoogleFontFamily.family, GoogleFontFamily.category, GoogleFontFamily.noto
+        , GoogleFontFamily.popularity, GoogleFontFamily.subsets, GoogleFontFamily.variants )
+    for family, category, noto, popularity, subsets, variants in (
+            session.query(*columns).order_by(GoogleFontFamily.family)):
+        add({
+            'family':       family
+            , 'category':   category
+            , 'noto':       noto
+            , 'popularity': popularity
+            , 'subsets':    subsets.split(',') if subsets else []
+            , 'variants':   variants.split(',') if variants else []
+        })
     return family_map
@@ -0,0 +1,391 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Pipelined ingestion of fonts into a :py:class:`.fontstack.FontStack`.
+
+Registering fonts from many sources (e.g. hundreds of google font families) is
+dominated by the latency of the requests when the sources are processed one
+after the other.  The :py:class:`IngestPipeline` processes the sources in
+stages:
+
+fetch
+  A pool of threads reads the sources: a CSS is revalidated in the CSS cache
+  (:py:meth:`.csscache.CSSCache.revalidate`) or fetched from its origin, the
+  fonts of an entry point are loaded.
+
+parse
+  The fetched CSS is parsed in a pool of processes.
+
+The CSS of google font families which are not fresh in the CSS cache are
+requested in batches (``family=A|B|C``, see
+:py:func:`.googlefont.batch_google_css_urls`), the rules of a batch are split
+back per family.
+
+write
+  A single writer (the calling thread, it owns the session) consumes the fetched
+  & parsed sources from a bounded queue and adds the fonts to the stack.  The
+  sources are written in the order they are passed to :py:meth:`IngestPipeline.run`.
+
+The pipeline is configured in section ``[ingest]`` of the configuration:
+
+.. code-block:: ini
+
+   [ingest]
+   fetch workers = 8
+   parse processes = 2
+   queue size = 32
+
+   [google fonts]
+   batch url length = 2000
+
+"""
+
+__all__ = [
+    'SOURCE_CSS'
+    , 'SOURCE_ENTRY_POINT'
+    , 'IngestPipeline'
+    , 'parse_css_records'
+]
+
+import json
+import queue
+import itertools
+import collections
+import hashlib
+import logging
+import threading
+import concurrent.futures
+
+from . import event
+from .css import FontFaceRule
+from .css import FontFaceRecord
+from .css import iter_css_blocks
+from .csscache import fetch_css
+from .googlefont import batch_google_css_urls
+from .googlefont import split_google_css_url
+from .googlefont import google_family_name
+from .font import Font
+
+log = logging.getLogger(__name__)
+
+SOURCE_CSS = 'css'
+"""Source type of a CSS (stylesheet) URL"""
+
+SOURCE_ENTRY_POINT = 'entry point'
+"""Source type of a python entry point (e.g. ``fonts_ttf``)"""
+
+_SOURCE_CSS_BATCH = 'css batch'
+
+# number of @font-face blocks sent to a parse process at once and maximal
+# number of these batches (of one CSS) in the parse stage
+_PARSE_BATCH_SIZE = 256
+_PARSE_BATCHES = 4
+
+def parse_css_records(css_url, css_blocks):
+    """Parse the blocks of ``@font-face`` rules (see
+    :py:func:`.css.iter_css_blocks`) of the CSS at ``css_url``, returns a list
+    of records (see :py:meth:`.css.FontFaceRule.record`).
+
+    This function is called in the processes of the parse stage.
+    """
+    records = []
+    for css_block in css_blocks:
+        rule = FontFaceRule(css_url=css_url)
+        rule.parse_css_block(css_block)
+        records.append(rule.record())
+    return records
+
+
+class IngestPipeline:
+    """Staged (fetch, parse, write) ingestion of font sources.
+
+    :param stack: :py:class:`.fontstack.FontStack` the fonts are added to
+    :param int fetch_workers: number of threads in the fetch stage
+    :param int parse_processes: number of processes in the parse stage, with
+        ``0`` the CSS is parsed in the threads of the fetch stage
+    :param int queue_size: maximal number of sources which are fetched (or
+        parsed) but not yet written
+    :param int batch_url_length: maximal length of a URL which requests a
+        batch of google font families, with ``0`` the families are requested
+        one by one
+
+    Usage::
+
+        pipeline = IngestPipeline.from_config(stack, config)
+        with db.fontlib_scope():
+            pipeline.run([
+                (SOURCE_ENTRY_POINT, 'fonts_ttf')
+                , (SOURCE_CSS, 'https://fonts.googleapis.com/css?family=Cute+Font')
+            ])
+
+    """
+
+    def __init__(
+            self, stack, fetch_workers=8, parse_processes=2, queue_size=32
+            , batch_url_length=2000):
+        self.stack = stack
+        self.fetch_workers = max(1, fetch_workers)
+        self.parse_processes = max(0, parse_processes)
+        self.queue_size = max(1, queue_size)
+        self.batch_url_length = max(0, batch_url_length)
+        self._parse_pool = None
+        self._on_css = None
+        self._on_source = None
+        self._known = {}
+
+    @classmethod
+    def from_config(cls, stack, config):
+        """Get pipeline instance by configuration ``config``."""
+        return cls(
+            stack
+            , fetch_workers = config.getint('ingest', 'fetch workers', fallback=8)
+            , parse_processes = config.getint('ingest', 'parse processes', fallback=2)
+            , queue_size = config.getint('ingest', 'queue size', fallback=32)
+            , batch_url_length = config.getint('google fonts', 'batch url length', fallback=2000)
+        )
+
+    def run(self, sources, on_css=None, on_source=None, known=None):
+        """Add the fonts from ``sources`` to the stack.
+
+        Needs an active session (see :py:func:`.db.fontlib_scope`).
+
+        :param sources: list of ``(<source type>, <value>)`` tuples, source type
+            is :py:obj:`SOURCE_CSS` (value is the URL) or
+            :py:obj:`SOURCE_ENTRY_POINT` (value is the name of the entry point)
+        :param on_css: optional callback ``on_css(css_url, rules)``, called in
+            the writer thread after the fonts of a CSS source have been added
+        :param on_source: optional callback ``on_source(src_type, value, fonts,
+            state)``, called in the writer thread after a source has been
+            written, ``fonts`` is the list of :py:class:`.font.Font` objects
+            from the source and ``state`` the cache state of a CSS source (see
+            :py:meth:`.csscache.CSSCache.lookup`, ``None`` for an entry point)
+        :param dict known: optional map of CSS URLs to the content hash of the
+            CSS, whose fonts are already in the stack: the fonts of a CSS source
+            whose content has not been changed are not added again
+
+        :py:func:`.event.emit`: ``FontStack.load_css`` and
+        ``FontStack.load_entry_point`` are released when the writer starts to
+        add the fonts of a source (see :py:meth:`.fontstack.FontStack.load_css`).
+        """
+        sources = list(sources)
+        if not sources:
+            return
+        self._on_css = on_css
+        self._on_source = on_source
+        self._known = known or {}
+        for src_type, _value in sources:
+            if src_type not in (SOURCE_CSS, SOURCE_ENTRY_POINT):
+                raise ValueError(f"unknown source type: {src_type}")
+
+        # the session is only used in this (the writer) thread, the cache state
+        # of the CSS sources is looked up before the pipeline starts
+        css_cache = self.stack.css_cache
+        states = {
+            value: css_cache.lookup(value)
+            for src_type, value in sources if src_type == SOURCE_CSS }
+
+        if self.batch_url_length:
+            sources = self._batch_sources(sources, states)
+
+        if self.parse_processes and len(states) > 1:
+            self._parse_pool = concurrent.futures.ProcessPoolExecutor(self.parse_processes)
+            # spawn the worker processes before any thread of the pipeline is
+            # started
+            self._parse_pool.submit(int).result()
+
+        fetch_pool = concurrent.futures.ThreadPoolExecutor(
+            self.fetch_workers, thread_name_prefix='fontlib-fetch')
+        pending = queue.Queue(self.queue_size)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pending.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def producer():
+            for src_type, value in sources:
+                if src_type == SOURCE_CSS:
+                    future = fetch_pool.submit(self.fetch_css_source, value, states[value])
+                elif src_type == _SOURCE_CSS_BATCH:
+                    future = fetch_pool.submit(self._fetch_css_batch, *value, states)
+                else:
+                    future = fetch_pool.submit(self._fetch_entry_point, value)
+                if not put((src_type, value, future)):
+                    future.cancel()
+                    return
+            put(None)
+
+        producer_thread = threading.Thread(
+            target=producer, name='fontlib-ingest', daemon=True)
+        producer_thread.start()
+
+        try:
+            while True:
+                item = pending.get()
+                if item is None:
+                    break
+                self._write(*item)
+        finally:
+            stop.set()
+            # unblock the producer & cancel what is not yet fetched
+            while True:
+                try:
+                    item = pending.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[2].cancel()
+            producer_thread.join()
+            fetch_pool.shutdown(cancel_futures=True)
+            if self._parse_pool is not None:
+                self._parse_pool.shutdown(cancel_futures=True)
+                self._parse_pool = None
+            self._on_css = None
+            self._on_source = None
+            self._known = {}
+
+    def _batch_sources(self, sources, states):
+        """Join consecutive google CSS sources which are not fresh in the cache
+        into batches, the order of the sources is kept."""
+        css_cache = self.stack.css_cache
+        ret_val = []
+        run = []
+
+        def flush():
+            for batch_url, batch in batch_google_css_urls(run, self.batch_url_length):
+                if len(batch) > 1:
+                    log.debug("ingest: batch of %s families: %s", len(batch), batch_url)
+                    ret_val.append((_SOURCE_CSS_BATCH, (batch_url, batch)))
+                else:
+                    ret_val.append((SOURCE_CSS, batch[0]))
+            run.clear()
+
+        for src_type, value in sources:
+            if (src_type == SOURCE_CSS
+                    and split_google_css_url(value) is not None
+                    and not css_cache.is_fresh(value, states[value])):
+                run.append(value)
+                continue
+            flush()
+            ret_val.append((src_type, value))
+        flush()
+        return ret_val
+
+    def fetch_css_source(self, css_url, state):
+        """Fetch (and parse) stage of a CSS source, does not use the DB.
+
+        :param dict state: cache state of the CSS (see
+            :py:meth:`.csscache.CSSCache.lookup`)
+        :return: tuple ``(rules, state, fetched)``, the arguments of
+            :py:meth:`write_css_source`
+        """
+        rules = self.stack.css_cache.revalidate(css_url, state)
+        if rules is not None:
+            return rules, state, False
+
+        log.debug("ingest: fetch %s", css_url)
+        prefetched = state.get('prefetched') if state else None
+        state = {}
+        records = self._parse_css(css_url, fetch_css(css_url, state, prefetched))
+        return [FontFaceRecord(css_url, record) for record in records], state, True
+
+    def _parse_css(self, css_url, byte_chunks):
+        """The CSS is streamed, the blocks of the rules are picked out in the
+        fetch thread and parsed in batches by the processes of the parse stage.
+        Only a bounded number of blocks is held in memory."""
+        css_blocks = iter_css_blocks(byte_chunks, FontFaceRule.rule_name)
+        if self._parse_pool is None:
+            return parse_css_records(css_url, css_blocks)
+        records = []
+        pending = collections.deque()
+        while True:
+            batch = list(itertools.islice(css_blocks, _PARSE_BATCH_SIZE))
+            if not batch:
+                break
+            pending.append(self._parse_pool.submit(parse_css_records, css_url, batch))
+            if len(pending) >= _PARSE_BATCHES:
+                records.extend(pending.popleft().result())
+        for future in pending:
+            records.extend(future.result())
+        return records
+
+    def _fetch_css_batch(self, batch_url, css_urls, states):
+        """fetch (and parse) stage of a batch of google CSS sources, the rules
+        are split back per family (source)"""
+        log.debug("ingest: fetch batch %s", batch_url)
+        batch_state = {}
+        try:
+            batch_records = self._parse_css(batch_url, fetch_css(batch_url, batch_state))
+        except ConnectionError as exc:
+            # google answers with a error when one of the families is unknown
+            log.warning("ingest: batch request failed (%s), request families one by one", exc)
+            return [self.fetch_css_source(url, states[url]) for url in css_urls]
+
+        records_of = {}
+        for url in css_urls:
+            family = google_family_name(split_google_css_url(url)[1])
+            records_of[family.lower()] = []
+        for record in batch_records:
+            records = records_of.get(record[0].lower())
+            if records is None:
+                log.warning("ingest: font-family %s not requested in batch %s", record[0], batch_url)
+                continue
+            records.append(record)
+
+        results = []
+        for url in css_urls:
+            records = records_of[google_family_name(split_google_css_url(url)[1]).lower()]
+            state = {
+                'validators': {}
+                , 'content_hash': hashlib.sha1(
+                    json.dumps(records, separators=(',', ':')).encode('utf-8')).hexdigest()
+                , 'fetched': batch_state['fetched']
+            }
+            results.append(([FontFaceRecord(url, record) for record in records], state, True))
+        return results
+
+    def _fetch_entry_point(self, ep_name):
+        """fetch stage of an entry point"""
+        log.debug("ingest: load entry point %s", ep_name)
+        return list(Font.from_entry_point(ep_name, self.stack.ep_index))
+
+    def _write(self, src_type, value, future):
+        """write stage"""
+        if src_type == SOURCE_ENTRY_POINT:
+            fonts = future.result()
+            event.emit('FontStack.load_entry_point', value)
+            for font in fonts:
+                self.stack.add_font(font)
+            if self._on_source is not None:
+                self._on_source(src_type, value, fonts, None)
+            return
+
+        if src_type == _SOURCE_CSS_BATCH:
+            for css_url, result in zip(value[1], future.result()):
+                self.write_css_source(css_url, *result)
+            return
+
+        self.write_css_source(value, *future.result())
+
+    def write_css_source(self, css_url, rules, state, fetched):
+        """Write stage of a CSS source, needs an active session.  Returns the
+        fonts of the CSS."""
+        event.emit('FontStack.load_css', css_url)
+        fonts = [Font.from_at_rule(rule, css_url) for rule in rules]
+        if self._known.get(css_url) == state['content_hash']:
+            log.debug("ingest: content of %s not changed, fonts already added", css_url)
+        else:
+            for font in fonts:
+                self.stack.add_font(font)
+        if fetched:
+            self.stack.css_cache.update(css_url, state, rules)
+        elif state.get('dirty'):
+            self.stack.css_cache.update(css_url, state)
+        if self._on_css is not None:
+            self._on_css(css_url, rules)
+        if self._on_source is not None:
+            self._on_source(SOURCE_CSS, css_url, fonts, state)
+        return fonts
@@ -0,0 +1,254 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Resumable mirror of the google fonts catalog into the workspace.
+
+The :py:class:`GoogleMirror` registers the font families of the google fonts
+catalog (see :py:func:`.googlefont.font_map`) and downloads their BLOBs into
+the URL cache of the workspace, e.g. to use the fonts in air-gapped builds::
+
+  fontlib google mirror            # mirror the whole catalog
+  fontlib google mirror 'Roboto.*'
+
+The work queue of the mirror is persisted in table ``mirror_item``
+(:py:class:`MirrorItem`), one item for the CSS of each family and one item for
+each BLOB.  Progress is committed in chunks, an interrupted mirror resumes
+where it stopped:
+
+- The CSS of a family is fetched by the :py:class:`.ingest.IngestPipeline`
+  (concurrent and batched).  A family that has been mirrored and is still
+  fresh in the CSS cache is skipped, otherwise the CSS is revalidated (see
+  :py:mod:`.csscache`), only new or modified CSS is fetched.
+
+- BLOBs are downloaded concurrently, a BLOB which is already cached is skipped.
+
+"""
+
+__all__ = ['MirrorItem', 'GoogleMirror']
+
+import time
+import logging
+import concurrent.futures
+
+from sqlalchemy import Column, String, Integer, Float, Text
+
+from .db import FontLibSchema
+from .db import TableUtilsMixIn
+from .db import fontlib_session
+from .font import Font
+from .googlefont import font_map
+from .ingest import IngestPipeline
+from .ingest import SOURCE_CSS
+from .urlcache import URLBlob
+from .urlcache import NoCache
+from .urlcache import fetch_url
+
+log = logging.getLogger(__name__)
+
+class MirrorItem(FontLibSchema, TableUtilsMixIn):  # pylint: disable=too-few-public-methods
+    """A item in the work queue of the :py:class:`GoogleMirror`"""
+
+    __tablename__ = 'mirror_item'
+
+    KIND_CSS  = 'css'
+    KIND_BLOB = 'blob'
+
+    STATE_PENDING = 'pending'
+    STATE_DONE    = 'done'
+    STATE_FAILED  = 'failed'
+
+    url = Column(String(1024), primary_key=True)
+    """URL of the CSS or the BLOB"""
+
+    kind = Column(String(8), nullable=False)
+    """Kind of the item: ``css`` or ``blob``"""
+
+    family = Column(String(255))
+    """Name of the font family the item belongs to"""
+
+    state = Column(String(8), nullable=False)
+    """State of the item: ``pending``, ``done`` or ``failed``"""
+
+    size = Column(Integer)
+    """Size of the downloaded BLOB in bytes"""
+
+    error = Column(Text)
+    """Error message of a failed item"""
+
+    updated = Column(Float)
+    """Time (seconds since the epoch) of the last update"""
+
+    def __repr__(self):
+        # pylint: disable=consider-using-f-string
+        return "<MirrorItem %(kind)s %(state)s %(url)s>" % self.__dict__
+
+
+class GoogleMirror:
+    """Mirror of google font families into a workspace.
+
+    :param config: :py:class:`.config.Config` object of the workspace
+    :param stack: :py:class:`.fontstack.FontStack` object of the workspace, it
+        needs a URL cache (e.g. :py:class:`.urlcache.SimpleURLCache`)
+    :param int workers: number of concurrent requests (default: ``[ingest]
+        fetch workers``)
+    :param int chunk_size: number of items which are committed at once
+
+    """
+
+    def __init__(self, config, stack, workers=None, chunk_size=50):
+        self.config = config
+        self.stack = stack
+        self.workers = workers or config.getint('ingest', 'fetch workers', fallback=8)
+        self.chunk_size = chunk_size
+        self._blob_urls = set()
+
+    def run(self, condition=None):
+        """Mirror families which names match regular expression ``condition``
+        (default: all families).
+
+        Needs an active session (see :py:func:`.db.fontlib_scope`), the progress
+        is committed in chunks.
+
+        :return: dictionary with statistics and the throughput of the mirror
+        """
+        if isinstance(self.stack.cache, NoCache):
+            raise ValueError("mirror needs a URL cache, see [fontstack]cache")
+
+        start = time.time()
+        stats = {}
+        session = fontlib_session()
+
+        families = {
+            name: item['css_url']
+            for name, item in font_map(self.config).items()
+            if condition is None or condition.search(name) }
+        stats['families'] = len(families)
+
+        css_urls = self.enqueue_css(families)
+        session.commit()
+        stats['css'] = {'queued': len(css_urls), 'skipped': len(families) - len(css_urls)}
+        self.mirror_css(css_urls)
+        stats['blobs'] = self.mirror_blobs()
+
+        stats['seconds'] = round(time.time() - start, 3)
+        _ = max(stats['seconds'], 0.001)
+        stats['bytes_per_second'] = round(stats['blobs']['bytes'] / _)
+        stats['blobs_per_second'] = round(stats['blobs']['downloaded'] / _, 1)
+        return stats
+
+    def enqueue_css(self, families):
+        """Add the CSS of the ``families`` (dict ``name: css_url``) to the work
+        queue, returns the list of the CSS URLs to fetch."""
+        session = fontlib_session()
+        css_cache = self.stack.css_cache
+        items = {
+            item.url: item
+            for item in session.query(MirrorItem).filter(MirrorItem.kind == MirrorItem.KIND_CSS) }
+
+        css_urls = []
+        for family, css_url in families.items():
+            item = items.get(css_url)
+            if item is None:
+                item = MirrorItem(url=css_url, kind=MirrorItem.KIND_CSS, family=family)
+                session.add(item)
+            elif (item.state == MirrorItem.STATE_DONE
+                  and css_cache.is_fresh(css_url, css_cache.lookup(css_url))):
+                continue
+            item.state = MirrorItem.STATE_PENDING
+            item.updated = time.time()
+            css_urls.append(css_url)
+        return css_urls
+
+    def mirror_css(self, css_urls):
+        """Fetch the CSS and register the fonts of ``css_urls``, the BLOBs of the
+        fonts are added to the work queue."""
+        session = fontlib_session()
+        self._blob_urls = {
+            url for (url,) in session.query(MirrorItem.url).filter(
+                MirrorItem.kind == MirrorItem.KIND_BLOB) }
+        families = dict(
+            session.query(MirrorItem.url, MirrorItem.family).filter(
+                MirrorItem.kind == MirrorItem.KIND_CSS))
+
+        def on_css(css_url, rules):
+            item = session.query(MirrorItem).get(css_url)
+            item.state = MirrorItem.STATE_DONE
+            item.updated = time.time()
+            for rule in rules:
+                origin = Font.from_at_rule(rule, css_url).origin
+                if origin in self._blob_urls:
+                    continue
+                self._blob_urls.add(origin)
+                session.add(MirrorItem(
+                    url = origin, kind = MirrorItem.KIND_BLOB
+                    , family = families.get(css_url)
+                    , state = MirrorItem.STATE_PENDING, updated = time.time()))
+
+        pipeline = IngestPipeline.from_config(self.stack, self.config)
+        pipeline.fetch_workers = self.workers
+        for i in range(0, len(css_urls), self.chunk_size):
+            chunk = css_urls[i:i + self.chunk_size]
+            log.info("mirror: CSS %s-%s of %s", i + 1, i + len(chunk), len(css_urls))
+            pipeline.run([(SOURCE_CSS, url) for url in chunk], on_css=on_css)
+            session.commit()
+
+    def mirror_blobs(self):
+        """Download the BLOBs in the work queue which are not yet cached."""
+        session = fontlib_session()
+        cache = self.stack.cache
+        stats = {'downloaded': 0, 'bytes': 0, 'failed': 0, 'cached': 0}
+
+        todo = []
+        query = session.query(MirrorItem, URLBlob).join(
+            URLBlob, URLBlob.origin == MirrorItem.url).filter(
+                MirrorItem.kind == MirrorItem.KIND_BLOB)
+        for item, blob in query:
+            cache_file = cache.fname_by_blob(blob)
+            if blob.state == URLBlob.STATE_CACHED and cache_file.EXISTS:
+                if item.state != MirrorItem.STATE_DONE:
+                    item.state = MirrorItem.STATE_DONE
+                stats['cached'] += 1
+                continue
+            todo.append((item.url, cache_file))
+        session.commit()
+        log.info("mirror: %s BLOBs to download, %s already cached", len(todo), stats['cached'])
+
+        items = []
+        blobs = []
+
+        def commit():
+            # bulk updates, the objects of the session are not touched
+            session.bulk_update_mappings(MirrorItem, items)
+            session.bulk_update_mappings(URLBlob, blobs)
+            session.commit()
+            items.clear()
+            blobs.clear()
+
+        pool = concurrent.futures.ThreadPoolExecutor(
+            self.workers, thread_name_prefix='fontlib-mirror')
+        try:
+            futures = {
+                pool.submit(fetch_url, origin, cache_file): origin
+                for origin, cache_file in todo }
+            for future in concurrent.futures.as_completed(futures):
+                origin = futures[future]
+                item = {'url': origin, 'updated': time.time()}
+                try:
+                    item['size'] = future.result()
+                except Exception as exc:  # pylint: disable=broad-except
+                    log.error("mirror: download of %s failed: %s", origin, exc)
+                    item['state'] = MirrorItem.STATE_FAILED
+                    item['error'] = str(exc)
+                    stats['failed'] += 1
+                else:
+                    item['state'] = MirrorItem.STATE_DONE
+                    item['error'] = None
+                    blobs.append({'origin': origin, 'state': URLBlob.STATE_CACHED})
+                    stats['downloaded'] += 1
+                    stats['bytes'] += item['size']
+                items.append(item)
+                if len(items) >= self.chunk_size:
+                    commit()
+        finally:
+            # on interrupt, don't wait for the queued downloads
+            pool.shutdown(cancel_futures=True)
+            commit()
+        return stats
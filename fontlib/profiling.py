@@ -0,0 +1,111 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Profiling of fontlib's (command line) functions.
+
+The profilers are wrapped around a function call, the results are written into
+a folder (e.g. ``<workspace>/profile``).  The basename of the result files is
+build from a name (e.g. the name of the CLI command) and a timestamp::
+
+    <dest>/<name>-<timestamp>.pstats      # cpu: binary pstats
+    <dest>/<name>-<timestamp>.tracemalloc # mem: tracemalloc snapshot
+    <dest>/<name>-<timestamp>.txt         # cpu & mem: top-N summary
+
+Use :py:mod:`pstats` to inspect a ``.pstats`` file::
+
+    $ python -m pstats ~/.fontlib/profile/list-20230220-120000.pstats
+
+A ``.tracemalloc`` snapshot can be loaded by
+:py:meth:`tracemalloc.Snapshot.load`.
+
+"""
+
+__all__ = ['PROFILE_MODES', 'profile_call', 'cpu_profile', 'mem_profile']
+
+import io
+import time
+import logging
+import pstats
+import cProfile
+import tracemalloc
+
+log = logging.getLogger(__name__)
+
+PROFILE_MODES = ['cpu', 'mem']
+"""Available profile modes"""
+
+def profile_call(mode, func, args, dest, name, top=25):
+    """Call ``func(args)`` with profiler ``mode`` and write results into ``dest``.
+
+    :param str mode: one of :py:obj:`PROFILE_MODES`
+    :param func: the function to profile, called with argument ``args``
+    :param fspath.fspath.FSPath dest: folder where the results are stored, or a
+        callable returning the folder (evaluated after ``func(args)`` returned)
+    :param str name: name used as prefix of the result files
+    :param int top: number of top entries in the summary
+
+    :return: ``(ret_val, [<result file>, ...])``, ``ret_val`` is the return
+        value of ``func(args)``
+
+    """
+    if mode == 'cpu':
+        profiler = cpu_profile
+    elif mode == 'mem':
+        profiler = mem_profile
+    else:
+        raise ValueError(f"unknown profile mode: {mode}")
+    return profiler(func, args, dest, name, top)
+
+def _out_base(dest, name):
+    if callable(dest):
+        dest = dest()
+    dest.makedirs()
+    return dest / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}"
+
+def cpu_profile(func, args, dest, name, top=25):
+    """Call ``func(args)`` in :py:class:`cProfile.Profile` (see :py:func:`profile_call`)."""
+
+    profiler = cProfile.Profile()
+    try:
+        ret_val = profiler.runcall(func, args)
+    finally:
+        out_base = _out_base(dest, name)
+        pstats_file = out_base + '.pstats'
+        profiler.dump_stats(pstats_file)
+
+        summary = io.StringIO()
+        stats = pstats.Stats(profiler, stream=summary)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+        summary_file = out_base + '.txt'
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            f.write(summary.getvalue())
+        log.info("cpu profile written to: %s", pstats_file)
+
+    return ret_val, [pstats_file, summary_file]
+
+def mem_profile(func, args, dest, name, top=25):
+    """Call ``func(args)`` traced by :py:mod:`tracemalloc` (see :py:func:`profile_call`)."""
+
+    tracemalloc.start(25)
+    try:
+        ret_val = func(args)
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        out_base = _out_base(dest, name)
+        snapshot_file = out_base + '.tracemalloc'
+        snapshot.dump(snapshot_file)
+
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+        summary_file = out_base + '.txt'
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            f.write(f"current: {current} bytes / peak: {peak} bytes\n\n")
+            f.write(f"top {top} allocations (by line)\n\n")
+            for stat in snapshot.statistics('lineno')[:top]:
+                f.write(f"{stat}\n")
+        log.info("mem profile written to: %s", snapshot_file)
+
+    return ret_val, [snapshot_file, summary_file]
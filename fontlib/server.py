@@ -0,0 +1,441 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""HTTP server for the fonts of a workspace.
+
+The command::
+
+  fontlib serve --port 8090
+
+serves the registered fonts from the URL cache of the workspace (see
+:py:class:`FontServer`), no further web server is needed in front of the
+fonts:
+
+``/fonts/<font ID>.<suffix>``
+  The BLOB of the font.  A BLOB which is not yet cached is cached on the first
+  request (see :py:meth:`.urlcache.URLCache.cache_url`).  The file is sent by
+  :py:func:`os.sendfile` (zero-copy), the response has a strong ``ETag``
+  (derived from the BLOB ID) and is ``immutable``.  ``If-None-Match`` and
+  ``Range`` requests (a single range) are supported.  If the BLOB can't be
+  cached (e.g. the origin is not available), the answer is ``502``.
+
+``/css/<font family>.css``
+  Stylesheet with the ``@font-face`` rules of the family, the ``src:`` URLs
+  refer to the ``/fonts/`` of the server.
+
+``/css?family=...`` and ``/css2?family=...`` (proxy mode)
+  With ``--proxy`` the server answers requests of the google fonts API, a
+  client only needs to replace the host ``fonts.googleapis.com`` by the host
+  of the server.  The CSS of a request is registered by
+  :py:meth:`.fontstack.FontStack.load_css` when it is requested the first time
+  (or is no longer fresh in the CSS cache), the ``src:`` URLs of the rules are
+  rewritten to the ``/fonts/`` of the server.  Within the TTL of the CSS cache
+  a request is answered from the cache (see :py:meth:`FontServer.google_css`).
+  The registered CSS is recorded as a source of the workspace (see
+  :py:func:`.sources.register_source`), its fonts are not deleted by ``fontlib
+  gc``.  If the CSS can't be fetched from google, the answer is ``502``.
+
+The server is configured in section ``[serve]``:
+
+.. code-block:: ini
+
+   [serve]
+   host = 127.0.0.1
+   port = 8090
+   css max age = 86400
+   proxy = false
+
+"""
+
+__all__ = [
+    'FONTS_PATH'
+    , 'CSS_PATH'
+    , 'GOOGLE_API_PATHS'
+    , 'FontServer'
+    , 'font_mime_type'
+    , 'font_url'
+    , 'parse_range'
+]
+
+import os
+import time
+import hashlib
+import logging
+import threading
+import mimetypes
+import collections
+from urllib.parse import quote
+from urllib.parse import unquote
+from urllib.parse import urlsplit
+from http.server import ThreadingHTTPServer
+from http.server import BaseHTTPRequestHandler
+
+from .__pkginfo__ import version
+from .css import font_face_css
+from .csscache import NoCSSCache
+from .db import fontlib_scope
+from .db import fontlib_session
+from .font import Font
+from .googlefont import GOOGLE_FONTS_HOST
+from .mime import FontlibMimeTypes
+from .urlcache import NoCache
+from .utils import lazy_import
+
+requests = lazy_import('requests')
+
+log = logging.getLogger(__name__)
+
+FONTS_PATH = '/fonts/'
+"""URL path of the font BLOBs"""
+
+CSS_PATH = '/css/'
+"""URL path of the stylesheets of the font families"""
+
+GOOGLE_API_PATHS = ('/css', '/css2')
+"""URL paths of the google fonts API answered in proxy mode"""
+
+_MIME_TYPES = FontlibMimeTypes()
+
+_FileEntry = collections.namedtuple('_FileEntry', 'path etag mime_type')
+
+def font_mime_type(suffix):
+    """Returns the MIME type of a font file with ``suffix``, the font types are
+    taken from :py:mod:`.mime`."""
+    mime_type = _MIME_TYPES.types_map[True].get(suffix) or mimetypes.guess_type('x' + suffix)[0]
+    return mime_type or 'application/octet-stream'
+
+def font_url(font, url_base=''):
+    """Returns the URL of the BLOB of ``font`` on the :py:class:`FontServer`
+    (``url_base`` is prepended)."""
+    return url_base + FONTS_PATH + font.id + font.suffix
+
+def parse_range(value, size):
+    """Parse HTTP header ``Range`` (``value``) of a file with ``size`` bytes.
+
+    Only a single range is supported, ``None`` is returned if the whole file
+    has to be sent (no or multiple ranges).
+
+    :return: tuple ``(start, end)`` of the (inclusive) range
+    :raises ValueError: if the range is not satisfiable
+    """
+    if not value or not value.startswith('bytes=') or ',' in value:
+        return None
+    start, _, end = value[6:].strip().partition('-')
+    try:
+        if not start:
+            # suffix range: the last <end> bytes
+            length = int(end)
+            if length <= 0:
+                raise ValueError(value)
+            return max(0, size - length), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError as exc:
+        raise ValueError(f"invalid range: {value}") from exc
+    if start >= size or end < start:
+        raise ValueError(f"range not satisfiable: {value}")
+    return start, min(end, size - 1)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    server_version = f'fontlib/{version}'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        log.debug("%s - %s", self.address_string(), format % args)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self.handle_request(head=False)
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        self.handle_request(head=True)
+
+    def handle_request(self, head):
+        """Dispatch the request to the endpoint"""
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        try:
+            if path in GOOGLE_API_PATHS and self.server.proxy:
+                self.send_google_css(path, url.query, head)
+            elif path.startswith(FONTS_PATH):
+                self.send_font(path[len(FONTS_PATH):].split('.')[0], head)
+            elif path.startswith(CSS_PATH) and path.endswith('.css'):
+                self.send_css(path[len(CSS_PATH):-4], head)
+            else:
+                self.send_error(404)
+        except ConnectionError:
+            log.debug("connection closed by client: %s", self.path)
+
+    def send_font(self, font_id, head):
+        """Send the BLOB of font ``font_id``"""
+        try:
+            entry = self.server.file_entry(font_id)
+            fd = None
+            if entry is not None:
+                try:
+                    fd = os.open(entry.path, os.O_RDONLY)
+                except FileNotFoundError:
+                    # e.g. removed by 'fontlib gc'
+                    entry = self.server.file_entry(font_id, refresh=True)
+                    if entry is not None:
+                        fd = os.open(entry.path, os.O_RDONLY)
+        except OSError as exc:
+            # the BLOB can't be cached (e.g. the origin is not available)
+            log.warning("serve: font %s: %s", font_id, exc)
+            self.send_error(502, f"font {font_id} is not available")
+            return
+        if entry is None:
+            self.send_error(404)
+            return
+
+        with os.fdopen(fd, 'rb') as f:
+            size = os.fstat(fd).st_size
+            if entry.etag in self.headers.get('If-None-Match', ''):
+                self.send_response(304)
+                self.send_caching_headers(entry.etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            start, end = 0, size - 1
+            try:
+                _range = parse_range(self.headers.get('Range'), size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if _range is None or self.headers.get('If-Range', entry.etag) != entry.etag:
+                self.send_response(200)
+            else:
+                start, end = _range
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            self.send_header('Content-Type', entry.mime_type)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_caching_headers(entry.etag)
+            self.end_headers()
+            if not head:
+                self.send_file(f, start, end - start + 1)
+
+    def send_caching_headers(self, etag, max_age=31536000, immutable=True):
+        """Send headers ``ETag`` and ``Cache-Control``"""
+        self.send_header('ETag', etag)
+        cache_control = f'public, max-age={max_age}'
+        if immutable:
+            cache_control += ', immutable'
+        self.send_header('Cache-Control', cache_control)
+
+    def send_file(self, f, offset, count):
+        """Send ``count`` bytes from ``offset`` of file ``f`` (zero-copy by
+        :py:func:`os.sendfile` if available)."""
+        self.wfile.flush()
+        if hasattr(os, 'sendfile'):
+            sock = self.connection.fileno()
+            while count > 0:
+                sent = os.sendfile(sock, f.fileno(), offset, count)
+                if sent == 0:
+                    break
+                offset += sent
+                count -= sent
+            return
+        f.seek(offset)
+        while count > 0:
+            chunk = f.read(min(count, 65536))
+            if not chunk:
+                break
+            self.wfile.write(chunk)
+            count -= len(chunk)
+
+    def send_body(self, body, content_type, etag, max_age, head):
+        """Send ``body`` (bytes) with validator ``etag``"""
+        if etag in self.headers.get('If-None-Match', ''):
+            self.send_response(304)
+            body = b''
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_caching_headers(etag, max_age=max_age, immutable=False)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def send_css(self, family, head):
+        """Send the stylesheet of ``family``"""
+        body, etag = self.server.family_css(family)
+        if body is None:
+            self.send_error(404, f"unknown font family: {family}")
+            return
+        self.send_body(body, 'text/css; charset=utf-8', etag, self.server.css_max_age, head)
+
+    def send_google_css(self, path, query, head):
+        """Send the stylesheet of a google fonts API request"""
+        if 'family=' not in query:
+            self.send_error(400, "missing argument: family")
+            return
+        try:
+            body, etag = self.server.google_css(path, query)
+        except (OSError, requests.RequestException) as exc:
+            # e.g. HTTP error status of google or requests.ConnectionError
+            log.warning("proxy: %s", exc)
+            self.send_error(502, "google fonts API is not available")
+            return
+        self.send_body(body, 'text/css; charset=utf-8', etag, self.server.css_max_age, head)
+
+
+class FontServer(ThreadingHTTPServer):
+    """HTTP server of the fonts in the URL cache of ``stack`` (see
+    :py:mod:`.server`)::
+
+        stack = FontStack.get_fontstack(config)
+        with FontServer(stack, ('127.0.0.1', 8090)) as server:
+            server.serve_forever()
+
+    Each request is handled in a thread of its own, the DB is only accessed
+    when a font or a family is requested the first time.
+
+    :param stack: :py:class:`.fontstack.FontStack` object, needs a URL cache
+        (e.g. :py:class:`.urlcache.SimpleURLCache`)
+    :param server_address: ``(host, port)`` tuple
+    :param int css_max_age: seconds a stylesheet is cached (by the server and
+        the client)
+    :param bool proxy: answer the requests of the google fonts API (needs a
+        CSS cache, e.g. :py:class:`.csscache.SimpleCSSCache`)
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    CSS_CACHE_SIZE = 256
+    """Maximal number of stylesheets cached by :py:meth:`family_css` and
+    :py:meth:`google_css`"""
+
+    def __init__(self, stack, server_address, css_max_age=86400, proxy=False):
+        if isinstance(stack.cache, NoCache):
+            raise ValueError("serve needs a URL cache, see [fontstack]cache")
+        if proxy and isinstance(stack.css_cache, NoCSSCache):
+            raise ValueError("proxy needs a CSS cache, see [fontstack]css cache")
+        self.stack = stack
+        self.css_max_age = css_max_age
+        self.proxy = proxy
+        self._lock = threading.Lock()
+        # fonts are registered one after the other (the same font can be in
+        # the CSS of different requests)
+        self._register_lock = threading.Lock()
+        self._font_locks = collections.defaultdict(threading.Lock)
+        self._files = {}
+        self._css = {}
+        super().__init__(server_address, _Handler)
+
+    @classmethod
+    def from_config(cls, stack, config, host=None, port=None, proxy=None):
+        """Get server instance by configuration ``config``."""
+        if proxy is None:
+            proxy = config.getboolean('serve', 'proxy', fallback=False)
+        return cls(
+            stack
+            , (host or config.get('serve', 'host', fallback='127.0.0.1')
+               , port or config.getint('serve', 'port', fallback=8090))
+            , css_max_age = config.getint('serve', 'css max age', fallback=86400)
+            , proxy = proxy
+        )
+
+    @property
+    def url(self):
+        """Base URL of the server"""
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def file_entry(self, font_id, refresh=False):
+        """Returns the cached file of font ``font_id``, the BLOB is cached when
+        it is requested the first time.  Returns ``None`` if the font is
+        unknown.
+
+        :raises OSError: if the BLOB can't be cached (e.g. a
+            :py:class:`ConnectionError` of the download)
+        """
+        entry = self._files.get(font_id)
+        if entry is not None and not refresh:
+            return entry
+        with self._lock:
+            font_lock = self._font_locks[font_id]
+        # concurrent requests of the same font wait until it has been cached
+        with font_lock:
+            entry = self._files.get(font_id)
+            if entry is not None and not refresh:
+                return entry
+            with fontlib_scope():
+                font = fontlib_session().query(Font).get(font_id)
+                if font is None:
+                    return None
+                blob = self.stack.cache.cache_url(font.origin)
+                path = self.stack.cache.fname_by_blob(blob)
+                entry = _FileEntry(str(path), f'"{blob.id}"', font_mime_type(font.suffix))
+            self._files[font_id] = entry
+            return entry
+
+    def family_css(self, family):
+        """Returns tuple ``(css, etag)`` of the stylesheet of ``family``
+        (``(None, None)`` if the family is unknown)."""
+        cached = self._css.get(family)
+        if cached is not None and time.time() - cached[2] < self.css_max_age:
+            return cached[:2]
+        with fontlib_scope():
+            css = self.stack.to_css([family], url_base=FONTS_PATH)
+        if not css:
+            return None, None
+        body = css.encode('utf-8')
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self._cache_css(family, body, etag)
+        return body, etag
+
+    def google_css(self, path, query):
+        """Returns tuple ``(css, etag)`` of the stylesheet of a google fonts
+        API request (``path`` is one of :py:obj:`GOOGLE_API_PATHS`).
+
+        The request is a CSS source ``https://fonts.googleapis.com<path>?<query>``
+        which is registered (see :py:meth:`.fontstack.FontStack.load_css`) if it
+        is not fresh in the CSS cache.  The rules are taken from the CSS cache,
+        the ``src:`` URLs refer to the fonts of this server.
+
+        :raises OSError: if the CSS can't be fetched from google (e.g. a
+            :py:class:`ConnectionError` or a ``requests.RequestException``)
+        """
+        css_url = f'https://{GOOGLE_FONTS_HOST}{path}?{query}'
+        cached = self._css.get(css_url)
+        if cached is not None and time.time() - cached[2] < self.css_max_age:
+            return cached[:2]
+
+        css_cache = self.stack.css_cache
+        with self._register_lock:
+            with fontlib_scope():
+                if not css_cache.is_fresh(css_url, css_cache.lookup(css_url)):
+                    log.info("proxy: register %s", css_url)
+                    self.stack.load_css(css_url)
+        with fontlib_scope():
+            rules = list(css_cache.at_rules(css_url))
+
+        faces = []
+        for rule in rules:
+            font = Font.from_at_rule(rule, css_url)
+            faces.append((
+                rule.font_family(), font_url(font), font.format, rule.unicode_range()
+                , rule.descriptors()))
+        body = font_face_css(faces).encode('utf-8')
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self._cache_css(css_url, body, etag)
+        return body, etag
+
+    def _cache_css(self, key, body, etag):
+        # the oldest stylesheet is dropped when the cache is full
+        with self._lock:
+            self._css.pop(key, None)
+            while len(self._css) >= self.CSS_CACHE_SIZE:
+                del self._css[next(iter(self._css))]
+            self._css[key] = (body, etag, time.time())
+
+    @staticmethod
+    def css_path(family):
+        """Returns URL path of the stylesheet of ``family``"""
+        return CSS_PATH + quote(family) + '.css'
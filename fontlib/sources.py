@@ -0,0 +1,285 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Fingerprints of the font sources of a workspace.
+
+The sources of a workspace (see :py:meth:`.fontstack.FontStack.init_fontstack`)
+rarely change between two runs of ``fontlib workspace init``.  For each source,
+a fingerprint and the IDs of its fonts are recorded in table ``font_source``
+(:py:class:`FontSource`):
+
+entry point
+  The fingerprint of the distributions (name and version) and the font files
+  (name, size and modification time) of the entry point (see
+  :py:meth:`.entrypoints.EntryPointIndex.fingerprint`).
+
+``file:`` CSS (e.g. the builtin fonts)
+  Size and modification time of the CSS file.
+
+``http:`` and ``https:`` CSS (e.g. a google font family)
+  The hash of the CSS content in the CSS cache (see
+  :py:attr:`.csscache.CSSSource.content_hash`).  Within the TTL of the CSS
+  cache the source is not requested, otherwise it is revalidated and the fonts
+  are only added when the content has been changed.
+
+Only the sources with a changed (or unknown) fingerprint are passed to the
+:py:class:`.ingest.IngestPipeline` (see :py:func:`sync_sources`).  The fonts
+of a source which is no longer configured or has been vanished (e.g. the font
+package of an entry point has been removed) are deleted in bulk.  A font which
+is also registered by another source is not deleted.  A configured source
+without fonts is recorded with an empty fingerprint.
+
+The fonts of a CSS which is registered outside of the configured sources (e.g.
+by ``fontlib google add``, ``fontlib css-parse --register`` or the google fonts
+proxy of the :py:mod:`.server`) are recorded as a source of type
+:py:obj:`SOURCE_REGISTERED` (see :py:func:`register_source`).  These sources
+are not synced, their fonts are kept.
+
+"""
+
+__all__ = [
+    'FontSource'
+    , 'SOURCE_REGISTERED'
+    , 'source_fingerprint'
+    , 'register_source'
+    , 'sync_sources'
+    , 'delete_fonts'
+]
+
+import os
+import json
+import time
+import hashlib
+import logging
+from urllib.parse import urlparse
+
+from sqlalchemy import Column, String, Float, Text
+
+from .db import FontLibSchema
+from .db import TableUtilsMixIn
+from .db import fontlib_session
+from .font import Font
+from .font import FontAlias
+from .font import FontSrcFormat
+from .font import touch_catalog
+from .urlcache import URLBlob
+from .ingest import SOURCE_CSS
+from .ingest import SOURCE_ENTRY_POINT
+
+log = logging.getLogger(__name__)
+
+# maximal number of bound parameters in a DELETE .. WHERE .. IN (..)
+_CHUNK_SIZE = 500
+
+SOURCE_REGISTERED = 'registered'
+"""Type of a source (:py:attr:`FontSource.src_type`) whose fonts have been
+registered outside of the configured sources (see :py:func:`register_source`)"""
+
+class FontSource(FontLibSchema, TableUtilsMixIn):  # pylint: disable=too-few-public-methods
+    """A source of fonts in the workspace (see :py:func:`sync_sources`)"""
+
+    __tablename__ = 'font_source'
+
+    src_type = Column(String(80), primary_key=True)
+    """Type of the source (:py:obj:`.ingest.SOURCE_CSS`,
+    :py:obj:`.ingest.SOURCE_ENTRY_POINT` or :py:obj:`SOURCE_REGISTERED`)"""
+
+    value = Column(String(1024), primary_key=True)
+    """URL of the CSS or name of the entry point"""
+
+    fingerprint = Column(String(40))
+    """Fingerprint of the source when its fonts were added"""
+
+    font_ids = Column(Text)
+    """JSON list with the IDs of the fonts from the source"""
+
+    updated = Column(Float)
+    """Time (seconds since the epoch) when the fonts were added"""
+
+    def __repr__(self):
+        # pylint: disable=consider-using-f-string
+        return "<FontSource %(src_type)s: %(value)s (%(fingerprint)s)>" % self.__dict__
+
+
+def _file_fingerprint(fname):
+    try:
+        stat = os.stat(fname)
+    except OSError:
+        return None
+    return hashlib.sha1(f"{fname}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8')).hexdigest()
+
+def source_fingerprint(stack, src_type, value):
+    """Returns the current fingerprint of a source, without reading the source
+    from its origin.
+
+    Needs an active session (see :py:func:`.db.fontlib_scope`).
+
+    :param stack: :py:class:`.fontstack.FontStack` object (the entry point
+        index and the CSS cache of the stack are used)
+    :return: the fingerprint, an empty string if the source has been vanished
+        or ``None`` if the fingerprint is unknown (a ``http:`` CSS which is not
+        fresh in the CSS cache)
+    """
+    if src_type == SOURCE_ENTRY_POINT:
+        if not stack.ep_index.font_files(value):
+            return ''
+        return stack.ep_index.fingerprint(value)
+
+    url = urlparse(value)
+    if url.scheme == 'file':
+        return _file_fingerprint(url.path) or ''
+
+    state = stack.css_cache.lookup(value)
+    if stack.css_cache.is_fresh(value, state):
+        return state['content_hash']
+    return None
+
+def register_source(css_url, fonts):
+    """Record the ``fonts`` of a CSS which has been registered outside of the
+    configured sources (a :py:obj:`SOURCE_REGISTERED` source).
+
+    Needs an active session (see :py:func:`.db.fontlib_scope`).  The fonts are
+    added to the fonts recorded by a previous registration of the CSS, they
+    are not deleted by :py:func:`sync_sources` and they are not an orphan of
+    the :py:mod:`.garbage` collection.
+
+    :param str css_url: URL of the CSS
+    :param fonts: list of :py:class:`.font.Font` objects from the CSS
+    """
+    session = fontlib_session()
+    obj = session.query(FontSource).get((SOURCE_REGISTERED, css_url))
+    font_ids = set(json.loads(obj.font_ids or '[]')) if obj is not None else set()
+    font_ids.update(font.id for font in fonts)
+    session.merge(FontSource(
+        src_type = SOURCE_REGISTERED
+        , value = css_url
+        , fingerprint = None
+        , font_ids = json.dumps(sorted(font_ids))
+        , updated = time.time()))
+
+def delete_fonts(font_ids):
+    """Delete fonts (and their aliases, formats and BLOB entries) with the IDs
+    ``font_ids`` by bulk deletes.
+
+    Needs an active session (see :py:func:`.db.fontlib_scope`).  The files of
+    the BLOBs in the URL cache are not removed.  The version of the font
+    catalog is changed (see :py:func:`.font.touch_catalog`).
+
+    :return: number of deleted fonts
+    """
+    session = fontlib_session()
+    font_ids = sorted(font_ids)
+    count = 0
+    for i in range(0, len(font_ids), _CHUNK_SIZE):
+        chunk = font_ids[i:i + _CHUNK_SIZE]
+        for table in (FontAlias, FontSrcFormat, URLBlob):
+            session.query(table).filter(table.id.in_(chunk)).delete(synchronize_session=False)
+        count += session.query(Font).filter(Font.id.in_(chunk)).delete(synchronize_session=False)
+    session.expire_all()
+    if count:
+        touch_catalog()
+    return count
+
+def sync_sources(stack, pipeline, sources, force=False):
+    """Add the fonts of the changed ``sources`` to the stack and remove the
+    fonts of vanished sources.
+
+    Needs an active session (see :py:func:`.db.fontlib_scope`).
+
+    :param stack: :py:class:`.fontstack.FontStack` object
+    :param pipeline: :py:class:`.ingest.IngestPipeline` object of the stack
+    :param sources: list of ``(<source type>, <value>)`` tuples (see
+        :py:meth:`.ingest.IngestPipeline.run`), all sources of the workspace
+    :param bool force: process all sources, regardless of their fingerprint
+    :return: dictionary with statistics
+    """
+    # pylint: disable=too-many-locals
+    session = fontlib_session()
+    sources = list(dict.fromkeys(sources))
+    recorded = {
+        (obj.src_type, obj.value): obj
+        for obj in session.query(FontSource).filter(FontSource.src_type != SOURCE_REGISTERED) }
+
+    todo = []
+    empty = []
+    fingerprints = {}
+    vanished = [key for key in recorded if key not in sources]
+    for key in sources:
+        fingerprint = source_fingerprint(stack, *key)
+        obj = recorded.get(key)
+        if fingerprint == '':
+            if obj is None:
+                # a new source without fonts (e.g. an entry point without font
+                # files) is recorded without being processed
+                log.debug("source without fonts: %s %s", *key)
+                empty.append(key)
+            elif obj.fingerprint != '':
+                log.info("source vanished: %s %s", *key)
+                vanished.append(key)
+            continue
+        if not force and obj is not None and fingerprint and obj.fingerprint == fingerprint:
+            log.debug("source not changed: %s %s", *key)
+            continue
+        fingerprints[key] = fingerprint
+        todo.append(key)
+
+    old_ids = {}
+    new_ids = {}
+    known = {}
+    for key in todo:
+        obj = recorded.get(key)
+        old_ids[key] = set(json.loads(obj.font_ids or '[]')) if obj is not None else set()
+        if key[0] == SOURCE_CSS and obj is not None and not force:
+            known[key[1]] = obj.fingerprint
+
+    def on_source(src_type, value, fonts, state):
+        key = (src_type, value)
+        fingerprint = fingerprints.get(key)
+        if state is not None and urlparse(value).scheme != 'file':
+            fingerprint = state['content_hash']
+        new_ids[key] = sorted({font.id for font in fonts})
+        session.merge(FontSource(
+            src_type = src_type
+            , value = value
+            , fingerprint = fingerprint
+            , font_ids = json.dumps(new_ids[key])
+            , updated = time.time()))
+
+    pipeline.run(todo, on_source=on_source, known=known)
+    for src_type, value in empty:
+        session.add(FontSource(
+            src_type = src_type
+            , value = value
+            , fingerprint = ''
+            , font_ids = '[]'
+            , updated = time.time()))
+
+    # fonts which are no longer provided by a source, a vanished source which
+    # is still configured is recorded without fonts
+    drop = set()
+    for key in vanished:
+        obj = recorded[key]
+        drop.update(json.loads(obj.font_ids or '[]'))
+        if key in sources:
+            obj.fingerprint = ''
+            obj.font_ids = '[]'
+            obj.updated = time.time()
+        else:
+            session.delete(obj)
+    for key, ids in old_ids.items():
+        drop.update(ids - set(new_ids.get(key, ())))
+
+    # a font which is still registered by a source is not deleted
+    if drop:
+        session.flush()
+        for obj in session.query(FontSource):
+            drop.difference_update(json.loads(obj.font_ids or '[]'))
+    removed = delete_fonts(drop) if drop else 0
+
+    stats = {
+        'sources': len(sources)
+        , 'unchanged': len(sources) - len(todo) - len(empty) - len(set(vanished) & set(sources))
+        , 'processed': len(todo) + len(empty)
+        , 'vanished': len(vanished)
+        , 'fonts removed': removed
+    }
+    log.info("sync sources: %s", stats)
+    return stats
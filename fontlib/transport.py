@@ -0,0 +1,307 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Pluggable transport layer for fontlib's HTTP (and ``file:``) requests.
+
+All requests of fontlib (CSS, google's metadata & font BLOBs) are send by the
+*active* transport (see :py:func:`get_transport`).  The transport is selected
+in the ``[transport]`` section of the configuration:
+
+.. code-block:: ini
+
+   [transport]
+   mode = live | record | replay
+   archive = %(workspace)s/transport
+   replay timing = false
+
+``live`` (:py:class:`LiveTransport`)
+  Requests are send to the origin, nothing is recorded.
+
+``record`` (:py:class:`RecordTransport`)
+  Requests are send to the origin, the responses (and their timing) are
+  recorded in the archive.
+
+``replay`` (:py:class:`ReplayTransport`)
+  Responses are taken from the archive, a request which has not been recorded
+  raises a :py:class:`ConnectionError`.  With ``replay timing = true``, the
+  recorded response time is simulated.
+
+Only ``http:`` and ``https:`` requests are recorded & replayed, other URLs
+(e.g. ``file:``) are always read from the origin.
+
+"""
+
+__all__ = [
+    'TRANSPORT_MODES'
+    , 'Response'
+    , 'Transport'
+    , 'LiveTransport'
+    , 'RecordTransport'
+    , 'ReplayTransport'
+    , 'init_transport'
+    , 'get_transport'
+    , 'set_transport'
+]
+
+import json
+import time
+import hashlib
+import logging
+from urllib.parse import urlparse
+from urllib.request import urlopen
+
+from fspath import FSPath
+
+from .utils import lazy_import
+
+# requests is only needed when a HTTP request is send
+requests = lazy_import('requests')
+
+log = logging.getLogger(__name__)
+
+TRANSPORT_MODES = ['live', 'record', 'replay']
+"""Available transport modes (``[transport]:mode``)"""
+
+ACTIVE_TRANSPORT = None
+"""Active :py:class:`Transport` object of the application (see
+:py:func:`get_transport`)"""
+
+RECORD_HEADERS = ['User-Agent', 'Accept']
+"""Request headers which are a part of the key of a recorded response (google
+fonts API serves different CSS, depending on the ``User-Agent``)"""
+
+def init_transport(config):
+    """Init :py:obj:`ACTIVE_TRANSPORT` from config section ``[transport]``."""
+    mode = config.get('transport', 'mode', fallback='live')
+    if mode == 'live':
+        transport = LiveTransport()
+    else:
+        archive = config.getpath('transport', 'archive')
+        if mode == 'record':
+            transport = RecordTransport(archive)
+        elif mode == 'replay':
+            transport = ReplayTransport(
+                archive, timing=config.getboolean('transport', 'replay timing', fallback=False))
+        else:
+            raise ValueError(f"unknown transport mode: {mode}")
+    log.debug("init_transport: %s", transport)
+    set_transport(transport)
+    return transport
+
+def get_transport():
+    """Returns *active* :py:obj:`ACTIVE_TRANSPORT` (default: :py:class:`LiveTransport`)"""
+    global ACTIVE_TRANSPORT  # pylint: disable=global-statement
+    if ACTIVE_TRANSPORT is None:
+        ACTIVE_TRANSPORT = LiveTransport()
+    return ACTIVE_TRANSPORT
+
+def set_transport(transport):
+    """Set *active* :py:obj:`ACTIVE_TRANSPORT`"""
+    global ACTIVE_TRANSPORT  # pylint: disable=global-statement
+    ACTIVE_TRANSPORT = transport
+
+
+class Response:
+    """Response of a :py:class:`Transport` request.
+
+    :param str url: URL of the request
+    :param int status: HTTP status code (``200`` for ``file:`` URLs)
+    :param headers: response headers
+    :param chunks: iterator over the chunks of the response body
+    :param float elapsed: response time in seconds (until headers are received)
+
+    """
+
+    def __init__(self, url, status, headers, chunks, elapsed=0.0, close=None):
+        self.url = url
+        self.status = status
+        self.headers = requests.structures.CaseInsensitiveDict(headers or {})
+        self.elapsed = elapsed
+        self._chunks = chunks
+        self._content = None
+        self._close = close
+
+    @property
+    def ok(self):  # pylint: disable=invalid-name
+        """``True`` if status is less than 400"""
+        return self.status < 400
+
+    @property
+    def content(self):
+        """Content of the response (bytes)"""
+        if self._content is None:
+            self._content = b''.join(self._chunks(1048576))
+        return self._content
+
+    def iter_content(self, chunksize=1048576):
+        """Iterate over the response body in chunks of ``chunksize`` bytes."""
+        if self._content is not None:
+            for i in range(0, len(self._content), chunksize):
+                yield self._content[i:i+chunksize]
+            return
+        yield from self._chunks(chunksize)
+
+    def json(self):
+        """Decode JSON content of the response"""
+        return json.loads(self.content)
+
+    def close(self):
+        """Release resources of the response"""
+        if self._close is not None:
+            self._close()
+            self._close = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Transport:
+    """Abstract transport"""
+
+    def get(self, url, headers=None, timeout=30):
+        """Send a GET request to ``url``, returns a :py:class:`Response`."""
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}>"
+
+
+class LiveTransport(Transport):
+    """Requests are send to the origin.
+
+    ``http:`` and ``https:`` URLs are requested by :py:mod:`requests`, all other
+    URLs by :py:func:`urllib.request.urlopen`.
+
+    """
+
+    def get(self, url, headers=None, timeout=30):
+        start = time.perf_counter()
+
+        if urlparse(url).scheme in ('http', 'https'):
+            resp = requests.get(url, headers=headers, timeout=timeout, stream=True)
+            return Response(
+                url, resp.status_code, resp.headers
+                , lambda chunksize: resp.iter_content(chunksize)
+                , elapsed = time.perf_counter() - start
+                , close = resp.close )
+
+        handle = urlopen(url, timeout=timeout)  # pylint: disable=consider-using-with
+
+        def chunks(chunksize):
+            while 1:
+                chunk = handle.read(chunksize)
+                if not chunk:
+                    break
+                yield chunk
+
+        return Response(
+            url, 200, dict(handle.headers.items()), chunks
+            , elapsed = time.perf_counter() - start
+            , close = handle.close )
+
+
+class _Archive:
+    """Folder with recorded responses.
+
+    Each response is stored in two files, the key is a hash of the URL and the
+    :py:obj:`RECORD_HEADERS`::
+
+        <archive>/<key>.json  # URL, request headers, status, response headers, elapsed
+        <archive>/<key>.body  # response body
+
+    """
+
+    def __init__(self, folder):
+        self.folder = FSPath(folder)
+
+    @staticmethod
+    def key(url, headers):
+        """Key of the request"""
+        headers = requests.structures.CaseInsensitiveDict(headers or {})
+        _ = [url] + [f"{h}: {headers.get(h, '')}" for h in RECORD_HEADERS]
+        return hashlib.sha1('\n'.join(_).encode('utf-8')).hexdigest()
+
+    def save(self, url, headers, resp):
+        """Record response ``resp`` of a request to ``url``"""
+        self.folder.makedirs()
+        key = self.key(url, headers)
+        with open(self.folder / key + '.body', 'wb') as f:
+            f.write(resp.content)
+        # the recorded body is already decoded
+        resp_headers = requests.structures.CaseInsensitiveDict(resp.headers)
+        for name in ('Content-Encoding', 'Transfer-Encoding'):
+            resp_headers.pop(name, None)
+        resp_headers['Content-Length'] = str(len(resp.content))
+        with open(self.folder / key + '.json', 'w', encoding='utf-8') as f:
+            json.dump({
+                'url': url
+                , 'request headers': dict(headers or {})
+                , 'status': resp.status
+                , 'headers': dict(resp_headers)
+                , 'elapsed': resp.elapsed
+            }, f, indent=1)
+
+    def load(self, url, headers):
+        """Returns recorded meta data and file name of the body or ``(None, None)``"""
+        key = self.key(url, headers)
+        meta_file = self.folder / key + '.json'
+        if not meta_file.EXISTS:
+            return None, None
+        with open(meta_file, encoding='utf-8') as f:
+            return json.load(f), self.folder / key + '.body'
+
+
+class RecordTransport(LiveTransport):
+    """Requests are send to the origin, responses are recorded in ``archive``."""
+
+    def __init__(self, archive):
+        self.archive = _Archive(archive)
+
+    def get(self, url, headers=None, timeout=30):
+        resp = super().get(url, headers=headers, timeout=timeout)
+        if urlparse(url).scheme in ('http', 'https'):
+            with resp:
+                log.debug("record: %s", url)
+                self.archive.save(url, headers, resp)
+        return resp
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.archive.folder}>"
+
+
+class ReplayTransport(LiveTransport):
+    """Responses are replayed from ``archive``.
+
+    :param archive: folder of the recorded responses
+    :param bool timing: simulate recorded response time
+
+    """
+
+    def __init__(self, archive, timing=False):
+        self.archive = _Archive(archive)
+        self.timing = timing
+
+    def get(self, url, headers=None, timeout=30):
+        if urlparse(url).scheme not in ('http', 'https'):
+            return super().get(url, headers=headers, timeout=timeout)
+
+        meta, body_file = self.archive.load(url, headers)
+        if meta is None:
+            raise ConnectionError(f'replay: no recorded response for {url}')
+        log.debug("replay: %s", url)
+        if self.timing:
+            time.sleep(meta['elapsed'])
+
+        def chunks(chunksize):
+            with open(body_file, 'rb') as f:
+                while 1:
+                    chunk = f.read(chunksize)
+                    if not chunk:
+                        break
+                    yield chunk
+
+        return Response(url, meta['status'], meta['headers'], chunks, elapsed=meta['elapsed'])
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.archive.folder}>"
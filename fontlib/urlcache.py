@@ -6,16 +6,17 @@
 __all__ = [
     'URLBlob'
     , 'download_blob'
+    , 'fetch_url'
     , 'URLCache'
     , 'NoCache'
     , 'SimpleURLCache'
 ]
 
+import os
 import logging
 import base64
 import hashlib
 from urllib.parse import urlparse
-from urllib.request import urlopen
 from sqlalchemy import Column, String
 from sqlalchemy.schema import ForeignKey
 from sqlalchemy.orm import relationship
@@ -27,6 +28,7 @@ from . import event
 from .db import FontLibSchema
 from .db import TableUtilsMixIn
 from .db import fontlib_session
+from .transport import get_transport
 
 log = logging.getLogger(__name__)
 
@@ -82,6 +84,9 @@ class URLBlob(FontLibSchema, TableUtilsMixIn):  # pylint: disable=too-few-public
 def download_blob(blob, cache_file, chunksize=1048576):
     """Download blob.origin into cache_file.
 
+    The BLOB is requested by the active transport (see
+    :py:func:`.transport.get_transport`).
+
     :param fspath.fspath.FSPath cache_file: local filename
     :param .urlcache.URLBlob blob: URL from blob.origin
     :param int chunkize: The default chunksize is 1048576 bytes.
@@ -96,26 +101,54 @@ def download_blob(blob, cache_file, chunksize=1048576):
 
     """
 
-    with urlopen(blob.origin) as d:
+    with get_transport().get(blob.origin) as d:
+        if not d.ok:
+            raise ConnectionError(f'HTTP {d.status} : {blob.origin}')
         with open(cache_file, "wb") as f:
             max_bytes  = int(d.headers.get("Content-Length", 0))
             down_bytes = 0
             if chunksize is None:
-                chunksize = max_bytes // 100
-            while 1:
-                x = d.read(chunksize)
-                if not bool(len(x)):
-                    event.emit(
-                        'urlcache.download.tick'
-                        , blob.origin, blob.font.name, blob.font.format
-                        , cache_file, down_bytes, -1)
-                    break
+                chunksize = max_bytes // 100 or 1048576
+            for x in d.iter_content(chunksize):
                 f.write(x)
                 down_bytes += len(x)
                 event.emit(
                     'urlcache.download.tick'
                     , blob.origin, blob.font.name, blob.font.format
                     , cache_file, down_bytes, max_bytes)
+            event.emit(
+                'urlcache.download.tick'
+                , blob.origin, blob.font.name, blob.font.format
+                , cache_file, down_bytes, -1)
+
+
+def fetch_url(origin, dest_file, chunksize=1048576):
+    """Download ``origin`` into ``dest_file``, returns the number of bytes.
+
+    Unlike :py:func:`download_blob`, no events are released and no DB object is
+    needed, the function can be called from any thread.  The response is written
+    into a ``.part`` file which replaces ``dest_file`` when the download is
+    complete, a failed or interrupted download never leaves a truncated
+    ``dest_file`` (the ``.part`` file is removed).
+
+    """
+    part_file = dest_file + '.part'
+    size = 0
+    try:
+        with get_transport().get(origin) as resp:
+            if not resp.ok:
+                raise ConnectionError(f'HTTP {resp.status} : {origin}')
+            with open(part_file, "wb") as f:
+                for chunk in resp.iter_content(chunksize):
+                    f.write(chunk)
+                    size += len(chunk)
+    except BaseException:
+        # also on KeyboardInterrupt: don't leave the truncated part file behind
+        if os.path.exists(part_file):
+            os.remove(part_file)
+        raise
+    os.replace(part_file, dest_file)
+    return size
 
 
 class URLCache:
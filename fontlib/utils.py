@@ -5,8 +5,23 @@
 # pylint: disable=too-few-public-methods
 __all__ = [
     'lazy_property'
+    , 'lazy_import'
+    , 'LazyModule'
+    , 'parse_size'
+    , 'write_file'
+    , 'write_precompressed'
     , ]
 
+import os
+import re
+import sys
+import gzip
+import logging
+import tempfile
+import importlib
+
+log = logging.getLogger(__name__)
+
 class lazy_property:  # pylint: disable=invalid-name
     """A @property that is only evaluated once."""
 
@@ -20,3 +35,116 @@ class lazy_property:  # pylint: disable=invalid-name
         value = self._deferred(obj)
         setattr(obj, self._deferred.__name__, value)
         return value
+
+class LazyModule:
+    """Proxy of a module which is imported on first attribute access (see
+    :py:func:`lazy_import`).
+
+    The module is imported by :py:func:`importlib.import_module`, which is
+    thread-safe (the first access may happen in any thread).
+    """
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def __getattr__(self, attr):
+        module = self.__dict__['_module']
+        if module is None:
+            module = importlib.import_module(self.__dict__['_name'])
+            self.__dict__['_module'] = module
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return f"<lazy module {self.__dict__['_name']!r}>"
+
+def lazy_import(name):
+    """Import module ``name`` lazy.
+
+    Returns a :py:class:`LazyModule`, the module is imported when the first
+    attribute of the module is accessed.  Heavy dependencies (e.g. SQLAlchemy_
+    or requests_) and subsystems are imported lazy to keep the start of the
+    command line (and the shell completion) fast::
+
+        db = lazy_import('fontlib.db')
+        ...
+        with db.fontlib_scope():  # fontlib.db is imported here
+            ...
+
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+_SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*$', re.I)
+_SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024**2, 'g': 1024**3, 't': 1024**4}
+
+def parse_size(value):
+    """Parse a size (e.g. ``1500``, ``200M`` or ``1.5GiB``), returns bytes (int)."""
+    match = _SIZE_RE.match(str(value))
+    if match is None:
+        raise ValueError(f"invalid size: {value}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()])
+
+# umask of the process, mode of the files written by write_file()
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def write_file(fname, content):
+    """Write ``content`` (bytes) atomically into file ``fname``.
+
+    A file with the same content is not touched.  The content is written to a
+    temporary file with a unique name in the folder of ``fname``
+    (:py:func:`tempfile.mkstemp`), concurrent calls don't interfere.  Returns
+    ``True`` if the file has been written.
+    """
+    fname = str(fname)
+    try:
+        with open(fname, 'rb') as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+    fd, tmp_file = tempfile.mkstemp(
+        dir=os.path.dirname(fname) or '.', prefix='.' + os.path.basename(fname) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        # mkstemp creates the file with mode 0600
+        os.chmod(tmp_file, 0o666 & ~_UMASK)
+        os.replace(tmp_file, fname)
+    finally:
+        if os.path.lexists(tmp_file):
+            os.remove(tmp_file)
+    return True
+
+def write_precompressed(fname, content):
+    """Write ``content`` (bytes) into file ``fname`` and the precompressed
+    variants ``<fname>.gz`` (gzip) and ``<fname>.br`` (brotli_).
+
+    A web server delivers the variants without compressing the content on each
+    request (e.g. nginx ``gzip_static`` and ``brotli_static``).  The brotli
+    variant needs the optional package brotli_ (``pip install
+    fontlib[compress]``), without, only the gzip variant is written.  The
+    files are written by :py:func:`write_file`.
+
+    :return: dictionary with the size of each file written (``{<fname>:
+        <bytes>}``), files with unchanged content are not in.
+
+    .. _brotli: https://pypi.org/project/Brotli/
+    """
+    fname = str(fname)
+    variants = [(fname, content)]
+    variants.append((fname + '.gz', gzip.compress(content, compresslevel=9, mtime=0)))
+    try:
+        import brotli  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        log.warning("brotli is not installed, %s.br is not written", fname)
+    else:
+        variants.append((fname + '.br', brotli.compress(content, quality=11)))
+    ret_val = {}
+    for name, data in variants:
+        if write_file(name, data):
+            ret_val[name] = len(data)
+    return ret_val
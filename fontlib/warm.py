@@ -0,0 +1,184 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Warm the URL cache of a workspace.
+
+After a workspace has been inited, the BLOBs of the fonts from remote origins
+(e.g. google fonts) are not cached until they are requested the first time.
+:py:func:`warm_cache` prefetches the BLOBs of the registered fonts, ordered by
+a policy, until a byte or count budget is reached::
+
+  fontlib cache warm --max-bytes 200M
+
+The policy is a list of criteria, the BLOBs are sorted by the first criterion,
+then by the second and so on:
+
+``families``
+  fonts of the families configured in ``[google fonts] fonts`` first (in the
+  configured order)
+
+``popularity``
+  popularity rank of the font family in the google fonts catalog (see
+  :py:class:`.googlefont.GoogleFontFamily`)
+
+``format``
+  preferred font format, the order of the formats is configured in ``[cache
+  warm] formats``
+
+.. code-block:: ini
+
+   [cache warm]
+   policy = families, popularity, format
+   formats = woff2, woff, truetype, opentype, svg
+   max bytes = 0
+   max count = 0
+
+"""
+
+__all__ = ['WARM_POLICIES', 'parse_size', 'warm_candidates', 'warm_cache']
+
+import time
+import logging
+import concurrent.futures
+
+from .utils import lazy_import
+from .utils import parse_size
+
+# the DB models are imported lazy, the command line reads WARM_POLICIES without
+# importing SQLAlchemy
+
+db = lazy_import('fontlib.db')
+font = lazy_import('fontlib.font')
+googlefont = lazy_import('fontlib.googlefont')
+urlcache = lazy_import('fontlib.urlcache')
+
+log = logging.getLogger(__name__)
+
+WARM_POLICIES = ['families', 'popularity', 'format']
+"""Available criteria of the warm policy"""
+
+def warm_candidates(config, policy=None, formats=None):
+    """Returns the remote BLOBs of the registered fonts ordered by the ``policy``.
+
+    Needs an active session (see :py:func:`.db.fontlib_scope`).
+
+    :param list policy: list of criteria (see :py:obj:`WARM_POLICIES`), default
+        is ``[cache warm] policy``
+    :param list formats: preferred font formats, default is ``[cache warm]
+        formats``
+    :rtype: list
+    :return: list of :py:class:`.urlcache.URLBlob` objects
+    """
+    session = db.fontlib_session()
+    if policy is None:
+        policy = config.getlist('cache warm', 'policy', fallback=WARM_POLICIES)
+    for criterion in policy:
+        if criterion not in WARM_POLICIES:
+            raise ValueError(f"unknown warm policy: {criterion}")
+    if formats is None:
+        formats = config.getlist('cache warm', 'formats', fallback=[])
+    formats = [font.guess_format(fmt) for fmt in formats]
+    families = config.getlist('google fonts', 'fonts', fallback=[])
+
+    # one row for each src format of a font, keep the preferred format
+    candidates = {}
+    URLBlob, Font = urlcache.URLBlob, font.Font
+    FontSrcFormat, GoogleFontFamily = font.FontSrcFormat, googlefont.GoogleFontFamily
+    query = session.query(
+        URLBlob, Font.name, FontSrcFormat.src_format, GoogleFontFamily.popularity
+    ).join(Font, Font.id == URLBlob.id).outerjoin(
+        FontSrcFormat, FontSrcFormat.id == Font.id).outerjoin(
+            GoogleFontFamily, GoogleFontFamily.family == Font.name).filter(
+                URLBlob.state == URLBlob.STATE_REMOTE)
+
+    for blob, name, src_format, popularity in query:
+        fmt = font.guess_format(src_format)
+        key = {
+            'families': families.index(name) if name in families else len(families)
+            , 'popularity': popularity if popularity is not None else float('inf')
+            , 'format': formats.index(fmt) if fmt in formats else len(formats)
+        }
+        key = tuple(key[criterion] for criterion in policy) + (name or '', blob.origin)
+        if blob.origin not in candidates or key < candidates[blob.origin][0]:
+            candidates[blob.origin] = (key, blob)
+
+    return [blob for _key, blob in sorted(candidates.values(), key=lambda x: x[0])]
+
+def warm_cache(
+        config, stack, max_bytes=None, max_count=None, workers=None
+        , policy=None, formats=None):
+    """Prefetch remote BLOBs into the URL cache of the ``stack``.
+
+    Needs an active session (see :py:func:`.db.fontlib_scope`).  The BLOBs (see
+    :py:func:`warm_candidates`) are downloaded concurrently until the budget is
+    reached.  A download is only started if it is expected (by the average
+    size of the downloaded BLOBs) to fit into the byte budget.
+
+    :param int max_bytes: byte budget, ``0`` is unlimited (default: ``[cache
+        warm] max bytes``)
+    :param int max_count: maximal number of BLOBs, ``0`` is unlimited (default:
+        ``[cache warm] max count``)
+    :param int workers: number of concurrent downloads (default: ``[ingest]
+        fetch workers``)
+    :return: dictionary with statistics of the warm up
+    """
+    if isinstance(stack.cache, urlcache.NoCache):
+        raise ValueError("cache warm needs a URL cache, see [fontstack]cache")
+
+    session = db.fontlib_session()
+    if max_bytes is None:
+        max_bytes = parse_size(config.get('cache warm', 'max bytes', fallback='0'))
+    if max_count is None:
+        max_count = config.getint('cache warm', 'max count', fallback=0)
+    if workers is None:
+        workers = config.getint('ingest', 'fetch workers', fallback=8)
+
+    start = time.time()
+    candidates = warm_candidates(config, policy=policy, formats=formats)
+    stats = {'candidates': len(candidates), 'downloaded': 0, 'bytes': 0, 'failed': 0}
+    log.info("cache warm: %s candidates, budget %s bytes / %s BLOBs"
+             , len(candidates), max_bytes or '--', max_count or '--')
+
+    def exhausted():
+        if max_count and stats['downloaded'] + len(running) >= max_count:
+            return True
+        if max_bytes:
+            if not stats['downloaded']:
+                # size of the BLOBs is unknown, start with one download
+                return bool(running) or stats['bytes'] >= max_bytes
+            # estimate size of the running downloads by the average size
+            average = stats['bytes'] / stats['downloaded']
+            return stats['bytes'] + (len(running) + 1) * average > max_bytes
+        return False
+
+    todo = iter(candidates)
+    running = {}
+    cached = []
+    pool = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix='fontlib-warm')
+    try:
+        while True:
+            while len(running) < workers and not exhausted():
+                blob = next(todo, None)
+                if blob is None:
+                    break
+                future = pool.submit(urlcache.fetch_url, blob.origin, stack.cache.fname_by_blob(blob))
+                running[future] = blob.origin
+            if not running:
+                break
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                origin = running.pop(future)
+                try:
+                    stats['bytes'] += future.result()
+                except Exception as exc:  # pylint: disable=broad-except
+                    log.error("cache warm: download of %s failed: %s", origin, exc)
+                    stats['failed'] += 1
+                    continue
+                stats['downloaded'] += 1
+                cached.append({'origin': origin, 'state': urlcache.URLBlob.STATE_CACHED})
+    finally:
+        pool.shutdown(cancel_futures=True)
+        session.bulk_update_mappings(urlcache.URLBlob, cached)
+
+    stats['seconds'] = round(time.time() - start, 3)
+    stats['bytes_per_second'] = round(stats['bytes'] / max(stats['seconds'], 0.001))
+    return stats
@@ -0,0 +1,242 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Keep the fonts of a workspace in sync with its sources.
+
+The command::
+
+  fontlib workspace watch
+
+is a long-running mode of ``fontlib workspace init``: it watches the folders of
+the local sources and applies changes incrementally (see
+:py:func:`.sources.sync_sources`):
+
+- the folders of the ``file:`` CSS sources (builtin fonts and
+  ``[fontstack]css folders``), a new, changed or removed CSS file is loaded or
+  its fonts are removed,
+
+- the folders of :py:obj:`sys.path` with distributions (see
+  :py:func:`.entrypoints.site_folders`), a font package which has been
+  installed, updated or removed (``pip install font-*``) changes the fonts of
+  the entry points.
+
+On Linux the folders are watched by inotify_ (by :py:mod:`ctypes`, no further
+requirements), otherwise (or with ``backend = poll``) the folders are polled.
+A bulk of changes (e.g. a ``pip install``) is collected until no further change
+is seen for the ``settle time``:
+
+.. code-block:: ini
+
+   [workspace watch]
+   backend = auto
+   poll interval = 2
+   settle time = 1
+
+.. _inotify: https://man7.org/linux/man-pages/man7/inotify.7.html
+
+"""
+
+__all__ = ['InotifyWatcher', 'PollWatcher', 'get_watcher', 'watch_paths', 'watch_workspace']
+
+import os
+import time
+import select
+import ctypes
+import ctypes.util
+import logging
+import importlib
+import threading
+from urllib.parse import urlparse
+
+from . import db
+from .entrypoints import site_folders
+from .fontstack import FontStack
+from .ingest import IngestPipeline
+from .ingest import SOURCE_CSS
+from .ingest import SOURCE_ENTRY_POINT
+from .sources import sync_sources
+
+log = logging.getLogger(__name__)
+
+def watch_paths(config, sources):
+    """Returns the sorted list of folders to watch for ``sources`` (see
+    :py:meth:`.fontstack.FontStack.get_sources`)."""
+    paths = set()
+    for src_type, value in sources:
+        if src_type == SOURCE_CSS and urlparse(value).scheme == 'file':
+            paths.add(os.path.dirname(urlparse(value).path))
+    for folder in config.getlist('fontstack', 'css folders', fallback=[]):
+        paths.add(os.path.abspath(os.path.expandvars(os.path.expanduser(folder))))
+    if any(src_type == SOURCE_ENTRY_POINT for src_type, _ in sources):
+        paths.update(os.path.abspath(folder) for folder in site_folders())
+    return sorted(path for path in paths if os.path.isdir(path))
+
+
+class PollWatcher:
+    """Watch folders by polling the state (modification time) of the folders
+    and the CSS files in.
+
+    :param float interval: seconds between two polls
+    """
+
+    def __init__(self, interval=2):
+        self.interval = interval
+        self.paths = []
+        self._snapshot = None
+
+    def set_paths(self, paths):
+        """Set the folders to watch"""
+        self.paths = list(paths)
+        self._snapshot = self.snapshot()
+
+    def snapshot(self):
+        """Returns the state of the watched folders"""
+        state = {}
+        for path in self.paths:
+            try:
+                state[path] = os.stat(path).st_mtime_ns
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.name.endswith('.css'):
+                            stat = entry.stat()
+                            state[entry.path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                state[path] = None
+        return state
+
+    def wait(self, timeout=None):
+        """Wait (at most ``timeout`` seconds) for a change, returns ``True`` if
+        a folder has been changed."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            sleep = self.interval
+            if deadline is not None:
+                sleep = min(sleep, max(0, deadline - time.monotonic()))
+            time.sleep(sleep)
+            snapshot = self.snapshot()
+            if snapshot != self._snapshot:
+                self._snapshot = snapshot
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def close(self):
+        """Release resources of the watcher"""
+
+
+class InotifyWatcher:
+    """Watch folders by inotify_ (Linux)."""
+
+    # pylint: disable=invalid-name
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    MASK = (
+        IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+        | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is None:
+            raise OSError("inotify: libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError("inotify is not supported")
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches = {}
+        self.paths = []
+
+    def set_paths(self, paths):
+        """Set the folders to watch"""
+        self.paths = list(paths)
+        for path in set(self._watches) - set(self.paths):
+            self._libc.inotify_rm_watch(self._fd, self._watches.pop(path))
+        for path in self.paths:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self.MASK)
+            if wd < 0:
+                log.warning("inotify: can't watch %s (errno %s)", path, ctypes.get_errno())
+                continue
+            self._watches[path] = wd
+
+    def wait(self, timeout=None):
+        """Wait (at most ``timeout`` seconds) for a change, returns ``True`` if
+        a folder has been changed."""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return False
+        # the events are not evaluated, drain the queue
+        while True:
+            try:
+                if not os.read(self._fd, 65536):
+                    break
+            except BlockingIOError:
+                break
+        return True
+
+    def close(self):
+        """Release resources of the watcher"""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def get_watcher(config):
+    """Get watcher by the configuration ``[workspace watch]``, with backend
+    ``auto`` the :py:class:`InotifyWatcher` is used if inotify is available."""
+    backend = config.get('workspace watch', 'backend', fallback='auto')
+    interval = config.getfloat('workspace watch', 'poll interval', fallback=2)
+    if backend in ('auto', 'inotify'):
+        try:
+            return InotifyWatcher()
+        except OSError as exc:
+            if backend == 'inotify':
+                raise
+            log.info("watch: inotify not available (%s), poll folders", exc)
+    elif backend != 'poll':
+        raise ValueError(f"unknown watch backend: {backend}")
+    return PollWatcher(interval)
+
+def watch_workspace(config, on_sync=None, stop=None):
+    """Sync the fonts of the workspace with its sources, each time a source has
+    been changed (see :py:mod:`.watch`).
+
+    The function returns when the event ``stop`` is set (or never).  The
+    changes are synced in a :py:func:`.db.fontlib_scope` of its own.
+
+    :param config: :py:class:`.config.Config` object of the workspace
+    :param on_sync: optional callback ``on_sync(stats)``, called with the
+        statistics of each sync (see :py:func:`.sources.sync_sources`)
+    :param threading.Event stop: optional event to stop watching
+    """
+    stop = stop or threading.Event()
+    settle = config.getfloat('workspace watch', 'settle time', fallback=1)
+    stack = FontStack.get_fontstack(config)
+    pipeline = IngestPipeline.from_config(stack, config)
+    watcher = get_watcher(config)
+    log.info("watch: %s", watcher.__class__.__name__)
+
+    try:
+        while not stop.is_set():
+            # new distributions & CSS files are seen by the import system
+            importlib.invalidate_caches()
+            sources = FontStack.get_sources(config)
+            watcher.set_paths(watch_paths(config, sources))
+            with db.fontlib_scope():
+                stats = sync_sources(stack, pipeline, sources)
+            if on_sync is not None:
+                on_sync(stats)
+
+            while not stop.is_set():
+                if watcher.wait(timeout=1):
+                    break
+            # wait until the changes have settled
+            while not stop.is_set() and watcher.wait(timeout=settle):
+                pass
+    finally:
+        watcher.close()
@@ -36,7 +36,7 @@ setup(
     , keywords         = PKG.keywords
     , project_urls     = PKG.project_urls
 
-    , packages         = PKG.packages
+    , packages         = PKG.get_packages()
     , py_modules       = PKG.py_modules
 
     , install_requires = PKG.install_requires
@@ -52,6 +52,8 @@ setup(
         # - https://setuptools.readthedocs.io/en/latest/setuptools.html#declaring-extras-optional-features-with-their-own-dependencies
         'develop' : PKG.develop_requires
         , 'test'  : PKG.test_requires
+        , 'async' : PKG.async_requires
+        , 'compress' : PKG.compress_requires
     }
 
 )
@@ -0,0 +1,32 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Fixtures of the fontlib tests (pytest_).
+
+Run the tests by::
+
+    $ python -m pytest tests
+
+.. _pytest: https://docs.pytest.org
+
+"""
+
+import pytest
+
+from fontlib import db
+from fontlib import event
+from fontlib.config import init_cfg
+from fontlib.config import get_cfg
+
+@pytest.fixture
+def config(tmp_path):
+    """A fontlib environment with a temporary workspace and a SQLite file DB
+    (the threads of the ingest pipeline and the server need their own
+    connections)."""
+    init_cfg()
+    cfg = get_cfg()
+    cfg.set('DEFAULT', 'workspace', str(tmp_path / 'workspace'))
+    cfg.set('DEFAULT', 'fontlib_db', 'sqlite:///' + str(tmp_path / 'fontlib.db'))
+    if not event.dispatcher_inited():
+        event.init_dispatcher(event.Event)
+    db.fontlib_init(cfg)
+    yield cfg
+    db.FONTLIB_ENGINE.dispose()
@@ -0,0 +1,43 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Tests of :py:mod:`fontlib.bundle`."""
+
+import os
+import json
+import concurrent.futures
+
+from fontlib import db
+from fontlib.bundle import MANIFEST_FILE
+from fontlib.bundle import bundle_fonts
+from fontlib.bundle import link_file
+from fontlib.fontstack import FontStack
+
+def test_link_file_concurrent(tmp_path):
+    src = tmp_path / 'src.woff2'
+    src.write_bytes(b'x' * 100)
+    dest = tmp_path / 'dest'
+    dest.mkdir()
+    with concurrent.futures.ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: link_file(src, dest / 'a.woff2'), range(64)))
+    assert set(results) <= {'linked', 'copied'}
+    assert os.listdir(dest) == ['a.woff2']
+    assert (dest / 'a.woff2').read_bytes() == b'x' * 100
+
+def test_bundle_css_references_all_fonts(config, tmp_path):
+    for name in ('a400', 'a700'):
+        (tmp_path / (name + '.woff2')).write_bytes(name.encode('utf-8'))
+    (tmp_path / 'a.css').write_text(
+        # two weights without a font-weight descriptor
+        "@font-face { font-family: 'A'; src: url(a400.woff2) format('woff2'); }\n"
+        "@font-face { font-family: 'A'; src: url(a700.woff2) format('woff2'); }\n")
+    stack = FontStack.get_fontstack(config)
+    dest = tmp_path / 'static'
+    with db.fontlib_scope():
+        stack.load_css('file:' + str(tmp_path / 'a.css'))
+        stats = bundle_fonts(config, stack, ['A'], dest)
+    assert (stats['fonts'], stats['failed']) == (2, 0)
+
+    manifest = json.loads((dest / MANIFEST_FILE).read_text())
+    css = (dest / manifest['css']).read_text()
+    assert css.count('@font-face') == 2
+    for entry in manifest['fonts']:
+        assert f"url({entry['file']})" in css
@@ -0,0 +1,42 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Tests of the command line (:py:mod:`fontlib.cli`).
+
+The commands are run in a python subprocess, the global state of the command
+line (config, logging, event dispatcher) is not shared with the tests.
+"""
+
+import sys
+import subprocess
+
+# the subsystem of a command is replaced by a stub, which prints its name
+STUB = """
+import sys
+from fontlib import %(module)s
+def stub(*args, **kwargs):
+    print('STUB: %(module)s.%(func)s')
+%(module)s.%(func)s = stub
+from fontlib.cli import main
+sys.argv = ['fontlib'] + sys.argv[1:]
+sys.exit(main())
+"""
+
+def run_cli(workspace, module, func, *argv):
+    """Run the command line with the stub of ``<module>.<func>``, returns the
+    completed process."""
+    code = STUB % {'module': module, 'func': func}
+    return subprocess.run(
+        [sys.executable, '-c', code, '-w', str(workspace)] + list(argv)
+        , capture_output=True, text=True, timeout=60, check=False)
+
+def test_workspace_watch(tmp_path):
+    proc = run_cli(tmp_path, 'watch', 'watch_workspace', 'workspace', 'watch')
+    assert proc.returncode == 0, proc.stderr
+    assert 'STUB: watch.watch_workspace' in proc.stdout
+
+def test_profile(tmp_path):
+    proc = run_cli(tmp_path, 'watch', 'watch_workspace', '--profile', 'workspace', 'watch')
+    assert proc.returncode == 0, proc.stderr
+    assert 'STUB: watch.watch_workspace' in proc.stdout
+    # results are written to the workspace given by -w
+    assert len(list((tmp_path / 'profile').glob('workspace-*.pstats'))) == 1
+    assert 'cpu profile: ' in proc.stderr
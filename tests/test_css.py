@@ -0,0 +1,59 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Tests of :py:mod:`fontlib.css`."""
+
+from fontlib import db
+from fontlib.css import font_face_css
+from fontlib.css import prescan_at_rules
+from fontlib.fontstack import FontStack
+
+def test_merge_formats_of_a_face():
+    css = font_face_css([
+        ('A', 'a.ttf', 'truetype', '', {})
+        , ('A', 'a.woff2', 'woff2', '', {})
+    ])
+    assert css == "@font-face{font-family:'A';src:url(a.woff2) format('woff2'),url(a.ttf) format('truetype')}\n"
+
+def test_faces_without_descriptors():
+    # two weights of a family without a font-weight descriptor are not merged
+    css = font_face_css([
+        ('A', 'a400.woff2', 'woff2', '', {})
+        , ('A', 'a400.ttf', 'truetype', '', {})
+        , ('A', 'a700.woff2', 'woff2', '', {})
+        , ('A', 'a700.ttf', 'truetype', '', {})
+    ])
+    assert css.splitlines() == [
+        "@font-face{font-family:'A';src:url(a400.woff2) format('woff2'),url(a400.ttf) format('truetype')}"
+        , "@font-face{font-family:'A';src:url(a700.woff2) format('woff2'),url(a700.ttf) format('truetype')}"
+    ]
+
+def test_formats():
+    css = font_face_css([
+        ('A', 'a.ttf', 'truetype', 'U+0-FF', {'font-weight': '700'})
+        , ('A', 'a.woff2', 'woff2', 'U+0-FF', {'font-weight': '700'})
+    ], formats=['woff2'])
+    assert css == "@font-face{font-family:'A';font-weight:700;src:url(a.woff2) format('woff2');unicode-range:U+0-FF}\n"
+
+def test_to_css_descriptors(config, tmp_path):
+    (tmp_path / 'a.css').write_text(
+        "@font-face { font-family: 'A'; font-weight: 400; src: url(a400.woff2) format('woff2'); }\n"
+        "@font-face { font-family: 'A'; font-weight: 700; font-style: italic;"
+        " src: url(a700i.woff2) format('woff2'); }\n")
+    stack = FontStack.get_fontstack(config)
+    with db.fontlib_scope():
+        stack.load_css('file:' + str(tmp_path / 'a.css'))
+        css = stack.to_css(['A'], url_base='/fonts/')
+    # the rules of a family are ordered by the font IDs
+    assert sorted(line.split(';src:')[0] for line in css.splitlines()) == [
+        "@font-face{font-family:'A';font-style:italic;font-weight:700"
+        , "@font-face{font-family:'A';font-weight:400"
+    ]
+
+def test_prescan_comment_in_front_of_block():
+    css = ("@font-face /* c */ { font-family: 'A' }\n"
+           "@font-face/* { */\n{ font-family: 'B' }\n"
+           "/* @font-face { font-family: 'C' } */")
+    blocks = [" font-family: 'A' ", " font-family: 'B' "]
+    assert list(prescan_at_rules(css, 'font-face')) == blocks
+    # the stream is cut at each position
+    for i in range(1, len(css)):
+        assert list(prescan_at_rules([css[:i], css[i:]], 'font-face')) == blocks, i
@@ -0,0 +1,42 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Tests of :py:mod:`fontlib.csscache`."""
+
+from fontlib import db
+from fontlib import transport
+from fontlib.csscache import SimpleCSSCache
+
+class CSSOrigin(transport.Transport):
+    """Answers each request by the CSS of ``version``, the ``ETag`` is the
+    version, the requests are counted."""
+
+    version = 1
+    requests = 0
+
+    def get(self, url, headers=None, timeout=30):
+        self.requests += 1
+        etag = f'"{self.version}"'
+        if (headers or {}).get('If-None-Match') == etag:
+            return transport.Response(url, 304, {'ETag': etag}, lambda chunksize: iter([]))
+        css = (f"@font-face {{ font-family: 'A{self.version}';"
+               f" src: url(a.woff2) format('woff2'); }}")
+        return transport.Response(url, 200, {'ETag': etag}, lambda chunksize: iter([css.encode('utf-8')]))
+
+def test_revalidate_modified(config, monkeypatch):
+    origin = CSSOrigin()
+    monkeypatch.setattr(transport, 'ACTIVE_TRANSPORT', origin)
+    config.set('css cache', 'ttl', '0')
+    cache = SimpleCSSCache()
+    cache.init(config)
+    css_url = 'https://example.org/a.css'
+
+    with db.fontlib_scope():
+        assert [rule.font_family() for rule in cache.at_rules(css_url)] == ['A1']
+        assert origin.requests == 1
+        # not modified
+        assert [rule.font_family() for rule in cache.at_rules(css_url)] == ['A1']
+        assert origin.requests == 2
+        # the content of the revalidation is parsed, not requested again
+        origin.version = 2
+        assert [rule.font_family() for rule in cache.at_rules(css_url)] == ['A2']
+        assert origin.requests == 3
+        assert cache.lookup(css_url)['validators'] == {'': {'etag': '"2"', 'last-modified': None}}
@@ -0,0 +1,22 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Tests of :py:mod:`fontlib.db`."""
+
+from sqlalchemy import create_engine
+from sqlalchemy import inspect
+from sqlalchemy import text
+
+from fontlib import db
+
+def test_init_schema_adds_columns(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'fontlib.db'))
+    with engine.begin() as conn:
+        # table 'font' of a release without the descriptors
+        conn.execute(text(
+            "CREATE TABLE font (id VARCHAR(22) PRIMARY KEY, origin VARCHAR(1024) NOT NULL UNIQUE"
+            ", name VARCHAR(80), unicode_range VARCHAR(4098))"))
+    with engine.begin() as conn:
+        assert db.init_schema(conn)
+    columns = {col['name'] for col in inspect(engine).get_columns('font')}
+    assert {'font_style', 'font_weight', 'font_stretch'} <= columns
+    with engine.begin() as conn:
+        assert not db.init_schema(conn)
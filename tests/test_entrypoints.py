@@ -0,0 +1,19 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Tests of :py:mod:`fontlib.entrypoints`."""
+
+from fontlib import entrypoints
+
+def test_fingerprint_of_changed_font_file(tmp_path, monkeypatch):
+    font_file = tmp_path / 'A.ttf'
+    font_file.write_bytes(b'0' * 10)
+    monkeypatch.setattr(
+        entrypoints, 'scan_entry_points', lambda group: ([['A', str(font_file)]], 'dists'))
+
+    index = entrypoints.EntryPointIndex(str(tmp_path / 'entry_points.json'))
+    fingerprint = index.fingerprint('fonts_ttf')
+    assert index.fingerprint('fonts_ttf') == fingerprint
+
+    # the font file is changed in place, the site folders are unchanged
+    font_file.write_bytes(b'0' * 20)
+    assert index.fingerprint('fonts_ttf') != fingerprint
+    assert entrypoints.EntryPointIndex(index.fname).fingerprint('fonts_ttf') != fingerprint
@@ -0,0 +1,42 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Tests of :py:mod:`fontlib.garbage`."""
+
+from fontlib import db
+from fontlib.font import Font
+from fontlib.fontstack import FontStack
+from fontlib.ingest import IngestPipeline
+from fontlib.ingest import SOURCE_CSS
+from fontlib.sources import sync_sources
+from fontlib.garbage import collect_garbage
+
+FACE = "@font-face { font-family: '%s'; src: url(%s) format('woff2'); }\n"
+
+def _names():
+    with db.fontlib_scope() as session:
+        return sorted(font.name for font in session.query(Font))
+
+def test_unsourced_fonts(config, tmp_path):
+    (tmp_path / 'a.css').write_text(FACE % ('A', 'a.woff2'))
+    (tmp_path / 'b.css').write_text(FACE % ('B', 'b.woff2'))
+    source = (SOURCE_CSS, 'file:' + str(tmp_path / 'a.css'))
+    stack = FontStack.get_fontstack(config)
+    with db.fontlib_scope():
+        sync_sources(stack, IngestPipeline(stack, parse_processes=0), [source])
+        # registered outside of the configured sources
+        stack.load_css('file:' + str(tmp_path / 'b.css'))
+        stack.add_font(Font('http://example.org/c.woff2', name='C'))
+    assert _names() == ['A', 'B', 'C']
+
+    with db.fontlib_scope():
+        assert collect_garbage(stack)['fonts'] == 0
+    assert _names() == ['A', 'B', 'C']
+
+    with db.fontlib_scope():
+        assert collect_garbage(stack, include_unsourced=True)['fonts'] == 1
+    assert _names() == ['A', 'B']
+
+    # the registered CSS is not a vanished source
+    with db.fontlib_scope():
+        stats = sync_sources(stack, IngestPipeline(stack, parse_processes=0), [source])
+    assert (stats['vanished'], stats['fonts removed']) == (0, 0)
+    assert _names() == ['A', 'B']
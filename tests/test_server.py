@@ -0,0 +1,147 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Tests of :py:mod:`fontlib.server`."""
+
+import threading
+import http.client
+
+import pytest
+import requests
+
+from fontlib import db
+from fontlib import transport
+from fontlib.font import Font
+from fontlib.fontstack import FontStack
+from fontlib.garbage import collect_garbage
+from fontlib.server import FontServer
+from fontlib.server import font_url
+from fontlib.server import parse_range
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range('bytes=0-9', 100) == (0, 9)
+    assert parse_range('bytes=90-', 100) == (90, 99)
+    assert parse_range('bytes=90-200', 100) == (90, 99)
+
+def test_parse_range_suffix():
+    # the last <n> bytes
+    assert parse_range('bytes=-10', 100) == (90, 99)
+    assert parse_range('bytes=-200', 100) == (0, 99)
+
+def test_parse_range_not_satisfiable():
+    # the handler answers 416
+    with pytest.raises(ValueError):
+        parse_range('bytes=100-', 100)
+    with pytest.raises(ValueError):
+        parse_range('bytes=20-10', 100)
+    with pytest.raises(ValueError):
+        parse_range('bytes=-0', 100)
+
+def test_parse_range_multiple_ranges():
+    # multiple ranges are not supported, the whole file is sent
+    assert parse_range('bytes=0-9,20-29', 100) is None
+
+def _serve(srv):
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+@pytest.fixture
+def server(config, tmp_path):
+    """A :py:class:`FontServer` of a font from a ``file:`` CSS and a font whose
+    origin does not exist, yields ``(server, font, missing font)``."""
+    (tmp_path / 'a.woff2').write_bytes(b'x' * 100)
+    (tmp_path / 'a.css').write_text(
+        "@font-face { font-family: 'A'; src: url(a.woff2) format('woff2'); }")
+    stack = FontStack.get_fontstack(config)
+    with db.fontlib_scope():
+        stack.load_css('file:' + str(tmp_path / 'a.css'))
+        stack.add_font(Font('file:' + str(tmp_path / 'missing.woff2'), name='Missing'))
+        font, missing = [font_url(font) for font in sorted(stack.list_fonts(), key=lambda f: f.name)]
+    with FontServer(stack, ('127.0.0.1', 0)) as srv:
+        _serve(srv)
+        yield srv, font, missing
+        srv.shutdown()
+
+def _get(srv, path, **headers):
+    conn = http.client.HTTPConnection(*srv.server_address[:2], timeout=10)
+    try:
+        conn.request('GET', path, headers=headers)
+        resp = conn.getresponse()
+        return resp.status, dict(resp.getheaders()), resp.read()
+    finally:
+        conn.close()
+
+def test_if_none_match(server):
+    srv, font, _ = server
+    status, headers, body = _get(srv, font)
+    assert (status, len(body)) == (200, 100)
+    status, headers, body = _get(srv, font, **{'If-None-Match': headers['ETag']})
+    assert (status, body) == (304, b'')
+
+def test_range(server):
+    srv, font, _ = server
+    status, headers, body = _get(srv, font, Range='bytes=-10')
+    assert (status, headers['Content-Range'], len(body)) == (206, 'bytes 90-99/100', 10)
+    status, headers, body = _get(srv, font, Range='bytes=100-')
+    assert (status, headers['Content-Range']) == (416, 'bytes */100')
+    status, headers, body = _get(srv, font, Range='bytes=0-9,20-29')
+    assert (status, len(body)) == (200, 100)
+
+def test_origin_not_available(server):
+    srv, _, missing = server
+    status, _, _ = _get(srv, missing)
+    assert status == 502
+    status, _, _ = _get(srv, '/fonts/unknown.woff2')
+    assert status == 404
+
+
+class GoogleStandIn(transport.Transport):
+    """Answers the requests of the google fonts API, with ``available = False``
+    a ``requests.ConnectionError`` is raised."""
+
+    available = True
+
+    def get(self, url, headers=None, timeout=30):
+        if not self.available:
+            raise requests.ConnectionError(f"connection refused: {url}")
+        family = url.split('family=')[1]
+        css = (f"@font-face {{ font-family: '{family}';"
+               f" src: url(https://fonts.gstatic.com/s/{family}.woff2) format('woff2'); }}")
+        return transport.Response(url, 200, {}, lambda chunksize: iter([css.encode('utf-8')]))
+
+@pytest.fixture
+def proxy(config, monkeypatch):
+    """A :py:class:`FontServer` in proxy mode, the google fonts API is answered
+    by :py:class:`GoogleStandIn`, yields ``(server, stand-in)``."""
+    google = GoogleStandIn()
+    monkeypatch.setattr(transport, 'ACTIVE_TRANSPORT', google)
+    stack = FontStack.get_fontstack(config)
+    with FontServer(stack, ('127.0.0.1', 0), proxy=True) as srv:
+        _serve(srv)
+        yield srv, google
+        srv.shutdown()
+
+def test_proxy(proxy):
+    srv, _ = proxy
+    status, _, body = _get(srv, '/css?family=A')
+    assert status == 200
+    assert b"font-family:'A'" in body and b'/fonts/' in body
+
+    # the fonts of the proxy are recorded in a source, gc keeps them
+    stack = srv.stack
+    with db.fontlib_scope():
+        assert collect_garbage(stack, include_unsourced=True)['fonts'] == 0
+        assert [font.name for font in stack.list_fonts()] == ['A']
+
+def test_proxy_not_available(proxy):
+    srv, google = proxy
+    google.available = False
+    status, _, _ = _get(srv, '/css?family=A')
+    assert status == 502
+
+def test_css_cache_size(proxy, monkeypatch):
+    srv, _ = proxy
+    monkeypatch.setattr(FontServer, 'CSS_CACHE_SIZE', 2)
+    for family in 'ABC':
+        assert _get(srv, '/css?family=' + family)[0] == 200
+    assert len(srv._css) == 2  # pylint: disable=protected-access
@@ -0,0 +1,93 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Tests of :py:mod:`fontlib.sources`."""
+
+import pytest
+
+from fontlib import db
+from fontlib.font import Font
+from fontlib.font import FontAlias
+from fontlib.fontstack import FontStack
+from fontlib.ingest import IngestPipeline
+from fontlib.ingest import SOURCE_CSS
+from fontlib.ingest import SOURCE_ENTRY_POINT
+from fontlib.sources import sync_sources
+from fontlib.sources import delete_fonts
+
+FACE = "@font-face { font-family: '%s'; src: url(%s) format('woff2'); }\n"
+
+@pytest.fixture
+def css_files(tmp_path):
+    """Two CSS sources, ``shared.woff2`` is a font of both sources."""
+    folder = tmp_path / 'css'
+    folder.mkdir()
+    (folder / 'a.css').write_text(FACE % ('A', 'a.woff2') + FACE % ('A', 'shared.woff2'))
+    (folder / 'b.css').write_text(FACE % ('B', 'b.woff2') + FACE % ('B', 'shared.woff2'))
+    return folder
+
+def _sync(config, sources, force=False):
+    with db.fontlib_scope():
+        stack = FontStack.get_fontstack(config)
+        return sync_sources(stack, IngestPipeline(stack, parse_processes=0), sources, force=force)
+
+def _origins():
+    with db.fontlib_scope() as session:
+        return sorted(font.origin.rsplit('/', 1)[-1] for font in session.query(Font))
+
+def _source(folder, name):
+    return (SOURCE_CSS, 'file:' + str(folder / name))
+
+def test_unchanged_source_is_skipped(config, css_files):
+    sources = [_source(css_files, 'a.css'), _source(css_files, 'b.css')]
+    stats = _sync(config, sources)
+    assert (stats['processed'], stats['unchanged']) == (2, 0)
+    assert _origins() == ['a.woff2', 'b.woff2', 'shared.woff2']
+
+    stats = _sync(config, sources)
+    assert (stats['processed'], stats['unchanged']) == (0, 2)
+
+    stats = _sync(config, sources, force=True)
+    assert (stats['processed'], stats['unchanged']) == (2, 0)
+
+def test_vanished_source(config, css_files):
+    sources = [_source(css_files, 'a.css'), _source(css_files, 'b.css')]
+    _sync(config, sources)
+
+    # b.css is no longer configured: its fonts are deleted, the font of both
+    # sources is kept
+    stats = _sync(config, sources[:1])
+    assert stats['vanished'] == 1
+    assert stats['fonts removed'] == 1
+    assert _origins() == ['a.woff2', 'shared.woff2']
+
+    # a.css has been removed from the file system
+    (css_files / 'a.css').unlink()
+    stats = _sync(config, sources[:1])
+    assert stats['vanished'] == 1
+    assert stats['fonts removed'] == 2
+    assert not _origins()
+
+def test_delete_fonts(config, css_files):
+    _sync(config, [_source(css_files, 'a.css'), _source(css_files, 'b.css')])
+    with db.fontlib_scope() as session:
+        shared = [font.id for font in session.query(Font) if font.origin.endswith('shared.woff2')]
+        assert len(shared) == 1
+        assert session.query(FontAlias).filter(FontAlias.id == shared[0]).count() == 1
+        assert delete_fonts(shared) == 1
+        assert session.query(FontAlias).filter(FontAlias.id == shared[0]).count() == 0
+    assert _origins() == ['a.woff2', 'b.woff2']
+
+def test_source_without_fonts(config, css_files):
+    sources = [_source(css_files, 'a.css'), (SOURCE_ENTRY_POINT, 'fonts_none')]
+    # a new entry point without font files is processed like any other new
+    # source, on the next run it is unchanged
+    stats = _sync(config, sources)
+    assert (stats['processed'], stats['unchanged'], stats['vanished']) == (2, 0, 0)
+    stats = _sync(config, sources)
+    assert (stats['processed'], stats['unchanged'], stats['vanished']) == (0, 2, 0)
+
+    # a.css vanished, on the next run it is unchanged
+    (css_files / 'a.css').unlink()
+    stats = _sync(config, sources)
+    assert (stats['processed'], stats['unchanged'], stats['vanished']) == (0, 1, 1)
+    stats = _sync(config, sources)
+    assert (stats['processed'], stats['unchanged'], stats['vanished']) == (0, 2, 0)